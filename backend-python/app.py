@@ -1,152 +1,329 @@
 import datetime
 import time
-from flask import Flask, request, jsonify
+APP_IMPORT_STARTED = time.perf_counter()
+from flask import Flask, Request, request, jsonify, g, Response, url_for
 from flask_cors import CORS
-import os
-import cv2
-import torch
-import torch.nn.functional as F
-import torchvision.transforms as transforms
-from efficientnet_pytorch import EfficientNet
-import numpy as np
-import requests
+from werkzeug.datastructures import FileStorage
+import io
 import json
-import tensorflow as tf
-from src.Fingerprint import calculate_diabetes_risk
-from src.Retinal import calculate_diabetes_risk_from_eyes
-from src.SumDiabetes import manual_weighted_risk
-from typing import Optional
+import os
+import logging
+import threading
+from src.Screening import decode_eye_probs, decode_finger_probs, score_patient
+from src.Preprocess import REDUCED_DECODE, decode_eye, preprocess_signature, decode_finger, normalize_eye_batch, normalize_finger_batch, resize_eye, resize_finger
+from src.Observability import IMAGES, QUALITY_SKIPPED_IMAGES, REQUESTS, REQUEST_LATENCY, configure_logging, exposition_registry, observe_batch, observe_stage, register_stats, timed
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from src.InferenceBackend import default_thread_budget, model_version
+from src.ModelRegistry import LOADING_MODES, ModelRegistry
+from src.ModelWorkers import INFERENCE_MODES, WorkerModelRegistry
+from src.ImageIO import read_image_bytes
+from src.PredictionCache import PredictionCache
+from src.QualityGate import QualityGate
+from src.BatchScheduler import BatchQueueFull, BatchScheduler
+from src.Cascade import EYE_CASCADE_SIZE, EyeCascade, parse_stages
+from src.FirebaseWriter import FirebaseWriter, generate_push_id
+from src.JobStore import JobStore
+from src.ResultStore import ResultStore
+from src.Auth import request_token, verify_jwt
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from zoneinfo import ZoneInfo
 load_dotenv()
+configure_logging()
+logger = logging.getLogger("biotrace")
+
+class InMemoryUploadRequest(Request):
+    # werkzeug เก็บไฟล์ upload ใน SpooledTemporaryFile ที่ย้ายลงดิสก์เมื่อเกิน 500KB (ภาพ fundus ส่วนใหญ่)
+    # เก็บใน BytesIO แทน read_image_bytes จึงใช้ buffer ได้โดยไม่เขียนดิสก์และไม่ copy
+    # ขนาดรวมของ request จำกัดด้วย MAX_CONTENT_LENGTH (เกินตอบ 413)
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
 
 app = Flask(__name__)
+app.request_class = InMemoryUploadRequest
+app.config["MAX_CONTENT_LENGTH"] = int(os.environ.get("MAX_UPLOAD_MB", "200")) * 1024 * 1024
 CORS(app)
 
-stage_names_eye = [
-    "No DR - Healthy", # index 0 + 1 
-    "Mild DR - Early signs", # index 1 + 1
-    "Moderate DR - Some vision impact", # index 2 + 1
-    "Severe DR - High risk of vision loss", # index 3 + 1
-    "Proliferative DR - Advanced stage, possible blindness" # index 4 + 1
-]
-
-stage_names_finger = [
-        "A",    # index 0
-        "W",  # index 1
-        "L"    # index 2
-]
-
-fingerLabels = [
-    "Right Thumb",
-    "Right Index",
-    "Right Middle",
-    "Right Ring",
-    "Right Little",
-    "Left Thumb",
-    "Left Index",
-    "Left Middle",
-    "Left Ring",
-    "Left Little",
-]
-eyeLabels = ["Left Eye", "Right Eye"]
-
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-# ✅ Correct variant: EfficientNet-B4
-model_eye = EfficientNet.from_name('efficientnet-b4')
-model_eye._fc = torch.nn.Linear(model_eye._fc.in_features, 5)  # 5 classes
-model_eye.load_state_dict(torch.load("model/EyeAI.pth", map_location=device))
-model_eye.to(device)
-model_eye.eval()
-
-# Load TensorFlow model for finger
-model_finger = tf.keras.models.load_model("model/FingerAI.h5")
-
-FIREBASE_EYE_URL = os.environ.get("FIREBASE_URL") + "eye_results.json"
-FIREBASE_FINGER_URL = os.environ.get("FIREBASE_URL") + "fingerprint_results.json"
-FIREBASE_RESULT_URL = os.environ.get("FIREBASE_URL") + "results.json"
-
-transform_eye = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Normalize([0.485, 0.456, 0.406],
-                         [0.229, 0.224, 0.225])
-])
-
-def preprocess_image_eye(image_path):
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError("Cannot read eye image")
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image = cv2.resize(image, (456, 456))
-    return image
-
-def preprocess_image_finger(image_path):
-    image = cv2.imread(image_path)
-    if image is None:
-        raise ValueError("Cannot read finger image")
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image = cv2.resize(image, (150, 150))
-    image = image.astype(np.float32) / 255.0
-    return image
-
-def predict_eye(image_path):
-    img = preprocess_image_eye(image_path)
-    tensor = transform_eye(img).unsqueeze(0).to(device)
-    with torch.no_grad():
-        output = model_eye(tensor)
-        pred = torch.argmax(output, 1).item()
-        prob = F.softmax(output, dim=1).squeeze().cpu().numpy()
-    stage = pred + 1
-    confidence = float(prob[pred])
-    return stage, confidence
-
-def predict_finger(image_path):
-    img = preprocess_image_finger(image_path)
-    
-    # Debug input image info
-    print(f"[DEBUG] Finger image shape: {img.shape}, min: {img.min():.4f}, max: {img.max():.4f}, mean: {img.mean():.4f}")
-
-    input_tensor = np.expand_dims(img, axis=0)
-    
-    print(f"[DEBUG] Input tensor shape: {input_tensor.shape}")
-    
-    preds = model_finger.predict(input_tensor)
-    
-    print(f"[DEBUG] Model raw output (preds): {preds}")
-    
-    if np.isnan(preds).any():
-        raise ValueError("Model prediction contains NaN")
-    
-    pred = np.argmax(preds, axis=1)[0]
-    confidence = preds[0][pred]
-    
-    stage = stage_names_finger[pred]
-    
-    print(f"[DEBUG] Predicted index: {pred}")
-    print(f"[DEBUG] Mapped label: {stage} with confidence {confidence:.4f}")
-    
-    return stage, float(confidence)
-
-def save_and_predict(files, predict_func, firebase_url, userEmail):
-    os.makedirs('uploads', exist_ok=True)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    REQUESTS.labels(endpoint, str(response.status_code)).inc()
+    if "request_started" in g:
+        REQUEST_LATENCY.labels(endpoint).observe(time.perf_counter() - g.request_started)
+    return response
+
+# native = torch + tensorflow, onnxruntime = ไม่ import torch/tensorflow เลย
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "native")
+MODEL_PRECISION = os.environ.get("MODEL_PRECISION", "fp32")
+MODEL_DIR = os.environ.get("MODEL_DIR", "model")
+# แบ่ง core ให้ pipeline ตาและนิ้วที่รันพร้อมกัน ไม่ให้ torch กับ tf แย่ง core กัน
+default_eye_threads, default_finger_threads = default_thread_budget()
+EYE_NUM_THREADS = int(os.environ.get("EYE_NUM_THREADS", default_eye_threads))
+FINGER_NUM_THREADS = int(os.environ.get("FINGER_NUM_THREADS", default_finger_threads))
+# cascade ของโมเดลตา: stage 1 ที่ถูกกว่าตอบเองเมื่อ confidence >= EYE_CASCADE_THRESHOLD ที่เหลือส่งต่อให้ B4 ที่ 456x456
+# เลือก threshold ด้วย cascade_eval.py
+EYE_CASCADE = os.environ.get("EYE_CASCADE", "off")
+if EYE_CASCADE not in ("off", "on"):
+    raise ValueError(f"Unknown EYE_CASCADE '{EYE_CASCADE}', expected 'off' or 'on'")
+eye_cascade = EyeCascade(
+    threshold=float(os.environ.get("EYE_CASCADE_THRESHOLD", "0.9")),
+    size=int(os.environ.get("EYE_CASCADE_SIZE", EYE_CASCADE_SIZE)),
+    accept_stages=parse_stages(os.environ.get("EYE_CASCADE_STAGES", "")),
+) if EYE_CASCADE == "on" else None
+# background = โหลดโมเดลใน thread แยก (ค่าเริ่มต้น), eager = โหลดก่อน import เสร็จ, lazy = โหลดเมื่อ request แรกใช้
+# preload = ใช้กับ gunicorn (gunicorn.conf.py ตั้งให้เอง)
+MODEL_LOADING = os.environ.get("MODEL_LOADING", "background")
+if MODEL_LOADING not in LOADING_MODES:
+    raise ValueError(f"Unknown MODEL_LOADING '{MODEL_LOADING}', expected one of {LOADING_MODES}")
+MODEL_LOAD_TIMEOUT = float(os.environ.get("MODEL_LOAD_TIMEOUT", "300"))
+# inprocess = โหลดโมเดลใน web process, workers = โมเดลตาและนิ้วอยู่ใน process แยกของตัวเอง (src/ModelWorkers.py)
+# web process จึงไม่ import torch / tensorflow และ worker ที่ crash จะถูก restart โดยไม่ล้มทั้ง service
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "inprocess")
+if INFERENCE_MODE not in INFERENCE_MODES:
+    raise ValueError(f"Unknown INFERENCE_MODE '{INFERENCE_MODE}', expected one of {INFERENCE_MODES}")
+registry_options = dict(
+    model_dir=MODEL_DIR, precision=MODEL_PRECISION,
+    eye_threads=EYE_NUM_THREADS, finger_threads=FINGER_NUM_THREADS,
+    cascade_size=eye_cascade.size if eye_cascade is not None else None,
+    cascade_model=os.environ.get("EYE_CASCADE_MODEL") or None,
+    cascade_arch=os.environ.get("EYE_CASCADE_ARCH", "efficientnet-b0"),
+)
+if INFERENCE_MODE == "workers":
+    model_registry = WorkerModelRegistry(
+        INFERENCE_BACKEND, **registry_options, start_timeout=MODEL_LOAD_TIMEOUT,
+        call_timeout=float(os.environ.get("MODEL_WORKER_TIMEOUT", "120")),
+    )
+else:
+    model_registry = ModelRegistry(INFERENCE_BACKEND, **registry_options)
+
+FIREBASE_URL = os.environ.get("FIREBASE_URL")
+FIREBASE_EYE_NODE = "eye_results"
+FIREBASE_FINGER_NODE = "fingerprint_results"
+FIREBASE_RESULT_NODE = "results"
+
+# เขียน Firebase แบบ background (ไม่ block response) ถ้าไม่ได้ตั้ง FIREBASE_URL จะไม่เขียน
+firebase_writer = FirebaseWriter(
+    FIREBASE_URL,
+    spool_dir=os.environ.get("FIREBASE_SPOOL_DIR", "data/spool"),
+    timeout=float(os.environ.get("FIREBASE_TIMEOUT", "5")),
+    on_request=lambda seconds, ok: observe_stage("firebase", seconds, ok),
+) if FIREBASE_URL else None
+if firebase_writer is None:
+    logger.warning("FIREBASE_URL is not set, results will not be written to Firebase")
+
+def write_firebase(node, record):
+    """คืนค่า push id ของ record (None ถ้าไม่ได้เขียน Firebase)"""
+    if firebase_writer is not None:
+        return firebase_writer.write(node, record)
+    return None
+
+# สำเนาของผล /upload ใน SQLite ที่มี index ตาม userEmail (ตั้ง RESULT_STORE_PATH= ว่างเพื่อปิด)
+# import ผลเก่าจาก Firebase ด้วย import_results.py
+# ค่าเริ่มต้นอยู่ใน data/ ซึ่ง docker-compose mount เป็น volume เพื่อไม่ให้หายเมื่อ deploy ใหม่
+RESULT_STORE_PATH = os.environ.get("RESULT_STORE_PATH", "data/results.sqlite3")
+RESULT_HISTORY_MAX_LIMIT = 100
+result_store = ResultStore(RESULT_STORE_PATH) if RESULT_STORE_PATH else None
+# /results/<email> ต้องมี token เดียวกับที่ backend (Node) ออกให้ (JWT_SECRET = ค่า JWT ใน backend/.env)
+JWT_SECRET = os.environ.get("JWT_SECRET", "")
+if result_store is not None and not JWT_SECRET:
+    logger.warning("JWT_SECRET is not set, /results endpoints will answer 503")
+
+def store_result(key, record):
+    if result_store is None:
+        return
+    try:
+        with timed("result_store"):
+            result_store.add(key, record)
+    except Exception as e:
+        # Firebase ยังเป็นที่เก็บหลัก ไม่ทำให้ request ล้มเพราะ store ในเครื่อง
+        logger.exception("Cannot store result locally: %s", e)
+
+def run_eye_batch(images):
+    model_eye, _ = model_registry.get(timeout=MODEL_LOAD_TIMEOUT)
+    if eye_cascade is not None:
+        probs, _ = eye_cascade(images, model_registry.eye_stage1, model_eye)
+        return decode_eye_probs(probs)
+    # แปลงสี + normalize ทั้ง batch ครั้งเดียวลง buffer ที่ใช้ซ้ำ
+    with timed("normalize"):
+        batch = normalize_eye_batch(images)
+    with timed("inference_eye"):
+        return decode_eye_probs(model_eye(batch))
+
+def run_finger_batch(images):
+    _, model_finger = model_registry.get(timeout=MODEL_LOAD_TIMEOUT)
+    with timed("normalize"):
+        batch = normalize_finger_batch(images)
+    with timed("inference_finger"):
+        return decode_finger_probs(model_finger(batch))
+
+# รวมภาพจากหลาย request ที่เข้ามาพร้อมกันให้เป็น forward pass เดียวต่อโมเดล
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "1") == "1"
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", "5"))
+BATCH_QUEUE_SIZE = int(os.environ.get("BATCH_QUEUE_SIZE", "256"))
+
+eye_scheduler = BatchScheduler(
+    "eye", run_eye_batch,
+    max_batch_size=int(os.environ.get("EYE_BATCH_MAX_SIZE", "8")),
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_queue_size=BATCH_QUEUE_SIZE,
+    on_batch=lambda size, waits: observe_batch("eye", size, waits),
+) if BATCHING_ENABLED else None
+
+finger_scheduler = BatchScheduler(
+    "finger", run_finger_batch,
+    max_batch_size=int(os.environ.get("FINGER_BATCH_MAX_SIZE", "40")),
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    max_queue_size=BATCH_QUEUE_SIZE,
+    on_batch=lambda size, waits: observe_batch("finger", size, waits),
+) if BATCHING_ENABLED else None
+
+def run_scheduled(scheduler, model, run_batch, items):
+    if scheduler is None:
+        observe_batch(model, len(items), [])
+        outputs = run_batch(items)
+        for output in outputs:
+            if isinstance(output, Exception):
+                raise output
+        return outputs
+    futures = scheduler.submit_many(items)
+    return [future.result() for future in futures]
+
+# รัน pipeline ตาและนิ้วของ /upload พร้อมกัน: pipeline นิ้ว (เร็วกว่า) รันใน thread ของ request เอง
+# ส่งเฉพาะ pipeline ตาเข้า executor หนึ่ง thread ต่อ request จึงต้องมีอย่างน้อย WEB_THREADS + JOB_WORKERS thread
+# ไม่งั้น request ที่เกินจะรอ executor และ micro-batching รวม request ได้ไม่เกินจำนวน thread นี้
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS") or
+                       int(os.environ.get("WEB_THREADS", "4")) + int(os.environ.get("JOB_WORKERS", "2")))
+_pipeline_executor = None
+_pipeline_executor_pid = None
+
+def get_pipeline_executor():
+    # สร้าง executor ใหม่ใน process ใหม่ (thread ไม่ข้าม fork)
+    global _pipeline_executor, _pipeline_executor_pid
+    if _pipeline_executor_pid != os.getpid():
+        _pipeline_executor = ThreadPoolExecutor(max_workers=PIPELINE_WORKERS, thread_name_prefix="pipeline")
+        _pipeline_executor_pid = os.getpid()
+    return _pipeline_executor
+
+# cache ผลทำนายของภาพที่เคยอัปโหลดแล้ว (key = hash ของ bytes ภาพ + เวอร์ชันโมเดล)
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "4096"))
+PREDICTION_MODEL_VERSION = os.environ.get("MODEL_VERSION") or model_version(INFERENCE_BACKEND, MODEL_DIR, MODEL_PRECISION)
+# การตั้งค่า preprocess (REDUCED_DECODE) เปลี่ยน input ของโมเดล ผลจากค่าหนึ่งจึงใช้กับอีกค่าไม่ได้
+PREDICTION_MODEL_VERSION += "-" + preprocess_signature()
+if eye_cascade is not None:
+    # ผลของ cascade ต่างจาก B4 อย่างเดียว จึงไม่ใช้ cache ร่วมกัน
+    PREDICTION_MODEL_VERSION += "-" + eye_cascade.signature()
+prediction_cache = PredictionCache(
+    PREDICTION_MODEL_VERSION,
+    max_entries=PREDICTION_CACHE_SIZE,
+    disk_dir=os.environ.get("PREDICTION_CACHE_DIR") or None,
+    disk_ttl=float(os.environ.get("PREDICTION_CACHE_TTL", str(7 * 86400))),
+    disk_max_entries=int(os.environ.get("PREDICTION_CACHE_DISK_SIZE", "100000")),
+) if PREDICTION_CACHE_SIZE > 0 else None
+
+def predict_cached(kind, image_sources, predict_uncached):
+    if prediction_cache is None:
+        return predict_uncached(image_sources)
+    datas = [read_image_bytes(source) for source in image_sources]
+    return prediction_cache.get_or_compute_many(kind, datas, predict_uncached)
+
+def _decode_and_prepare(image_source, decode, prepare):
+    with timed("decode"):
+        image = decode(image_source)
+    with timed("preprocess"):
+        return prepare(image)
+
+def _decode_eye(image_source):
+    return decode_eye(image_source, REDUCED_DECODE)
+
+def _decode_finger(image_source):
+    return decode_finger(image_source, REDUCED_DECODE)
+
+def _predict_eye_uncached(image_sources):
+    # decode + resize ภาพตาทุกภาพ (BGR uint8) แล้วส่งเข้า batch ของ model_eye
+    images = [_decode_and_prepare(source, _decode_eye, resize_eye) for source in image_sources]
+    return run_scheduled(eye_scheduler, "eye", run_eye_batch, images)
+
+def predict_eye_batch(image_sources):
+    return predict_cached("eye", image_sources, _predict_eye_uncached)
+
+def predict_eye(image_source):
+    return predict_eye_batch([image_source])[0]
+
+def _predict_finger_uncached(image_sources):
+    # รวมภาพนิ้วทั้งหมดเป็น (N,150,150,3) แล้วเรียกโมเดลครั้งเดียว
+    images = [_decode_and_prepare(source, _decode_finger, resize_finger) for source in image_sources]
+    return run_scheduled(finger_scheduler, "finger", run_finger_batch, images)
+
+def predict_finger_batch(image_sources):
+    return predict_cached("finger", image_sources, _predict_finger_uncached)
+
+def predict_finger(image_source):
+    return predict_finger_batch([image_source])[0]
+
+# ตรวจคุณภาพภาพ (เบลอ, มืด / สว่างเกิน, ไม่ใช่ภาพ fundus / ลายนิ้วมือ) บนภาพย่อก่อนรันโมเดล
+# QUALITY_GATE=off|shadow|enforce, QUALITY_GATE_THRESHOLDS='{"eye_min_sharpness": 10}' แก้ค่า threshold ได้
+# ค่าเริ่มต้นของ threshold ปรับจากภาพสังเคราะห์เท่านั้น ต้องปรับกับภาพ fundus / ลายนิ้วมือจริงด้วย shadow ก่อนใช้ enforce
+quality_gate = QualityGate(
+    os.environ.get("QUALITY_GATE", "off"),
+    thresholds=json.loads(os.environ.get("QUALITY_GATE_THRESHOLDS") or "{}"),
+)
+
+def image_label(file):
+    return file.filename.split('_')[1] if '_' in file.filename else file.filename
+
+def read_uploads(files):
+    """อ่าน bytes ของแต่ละไฟล์ครั้งเดียว คืนค่า list ของ (ชื่อภาพ, bytes) ที่ quality gate, cache และ decode ใช้ร่วมกัน"""
+    return [(image_label(file), read_image_bytes(file)) for file in files]
+
+def check_quality(images_by_kind):
+    """
+    images_by_kind: {"eye": [(ชื่อภาพ, bytes), ...], "finger": [...]} จาก read_uploads
+    คืนค่า (body, 400) ที่บอกภาพและเหตุผลที่ไม่ผ่าน ถ้า QUALITY_GATE=enforce และมีภาพไม่ผ่าน ไม่งั้นคืนค่า None
+    """
+    if not quality_gate.enabled:
+        return None
+    rejected = []
+    for kind, images in images_by_kind.items():
+        for filename, data in images:
+            quality = quality_gate.check(kind, data)
+            if not quality["ok"]:
+                rejected.append({"kind": kind, "filename": filename, **quality})
+    if not rejected:
+        return None
+    if not quality_gate.enforcing:
+        logger.info("Quality gate (shadow) would reject: %s", [(r["filename"], r["reasons"]) for r in rejected])
+        return None
+    for kind, images in images_by_kind.items():
+        QUALITY_SKIPPED_IMAGES.labels(kind).inc(len(images))
+    logger.info("Quality gate rejected: %s", [(r["filename"], r["reasons"]) for r in rejected])
+    return {
+        'error': 'Image quality check failed',
+        'code': 'quality_rejected',
+        'rejected': rejected,
+    }, 400
+
+def save_and_predict(images, predict_batch_func, firebase_node, userEmail, on_result=None):
     results = []
 
-    for file in files:
-        filename = file.filename.split('_')[1]
-        save_path = os.path.join('uploads', filename)
-        file.save(save_path)
+    # images: list ของ (ชื่อภาพ, bytes) จาก read_uploads decode จาก bytes โดยตรง ไม่ต้องเขียนไฟล์ลง uploads/
+    filenames = [filename for filename, _ in images]
+    IMAGES.labels("finger" if 'fingerprint' in firebase_node else "eye").inc(len(images))
 
-        print(f"[INFO] Saved file {filename} at {save_path}")
+    try:
+        predictions = predict_batch_func([data for _, data in images])
+    except BatchQueueFull as e:
+        logger.warning("Prediction rejected for %s: %s", filenames, e)
+        return {'error': 'Server is busy, try again later'}, 503
+    except Exception as e:
+        logger.error("Prediction failed for %s: %s", filenames, e)
+        return {'error': str(e)}, 400
 
-        try:
-            stage, confidence = predict_func(save_path)
-            print(f"[INFO] Prediction for {filename}: {stage} ({confidence:.4f})")
-        except Exception as e:
-            os.remove(save_path)
-            print(f"[ERROR] Prediction failed for {filename}: {e}")
-            return {'error': str(e)}, 400
+    for filename, (stage, confidence) in zip(filenames, predictions):
+        logger.debug("Prediction for %s: %s (%.4f)", filename, stage, confidence)
 
         result = {
             "filename": filename,
@@ -157,8 +334,9 @@ def save_and_predict(files, predict_func, firebase_url, userEmail):
         }
 
         # เปลี่ยน key สำหรับ fingerprint ให้ตรงกับ React
-        if 'fingerprint' in firebase_url:
+        if 'fingerprint' in firebase_node:
             result["predicted_label"] = result.pop("prediction")
+        write_firebase(firebase_node, result)
 
         results.append({
             "filename": filename,
@@ -167,9 +345,8 @@ def save_and_predict(files, predict_func, firebase_url, userEmail):
             "userEmail": userEmail,
             "timestamp": datetime.datetime.now(ZoneInfo("Asia/Bangkok")).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
         })
-
-        os.remove(save_path)
-        print(f"[INFO] Removed file {filename}")
+        if on_result is not None:
+            on_result(results[-1])
 
     return results
 
@@ -179,10 +356,14 @@ def upload_eye():
         return jsonify({'error': 'No eye image files provided'}), 400
     user_email = request.form.get('userEmail')
     images = request.files.getlist('image')
-    print(f"[INFO] Eye images received: {[f.filename for f in images]}")
+    logger.info("Eye images received: %s", [f.filename for f in images])
     if len(images) == 0:
         return jsonify({'error': 'No eye image files provided'}), 400
-    results = save_and_predict(images, predict_eye, FIREBASE_EYE_URL,user_email)
+    images = read_uploads(images)
+    rejected = check_quality({"eye": images})
+    if rejected is not None:
+        return jsonify(rejected[0]), rejected[1]
+    results = save_and_predict(images, predict_eye_batch, FIREBASE_EYE_NODE,user_email)
     if isinstance(results, tuple):
         return jsonify(results[0]), results[1]
     return jsonify({"results": results})
@@ -193,101 +374,92 @@ def upload_finger():
         return jsonify({'error': 'No finger image files provided'}), 400
     images = request.files.getlist('image')
     user_email = request.form.get('userEmail')
-    print(f"[INFO] Finger images received: {[f.filename for f in images]}")
+    logger.info("Finger images received: %s", [f.filename for f in images])
     if len(images) == 0:
         return jsonify({'error': 'No finger image files provided'}), 400
-    results = save_and_predict(images, predict_finger, FIREBASE_FINGER_URL, user_email)
+    images = read_uploads(images)
+    rejected = check_quality({"finger": images})
+    if rejected is not None:
+        return jsonify(rejected[0]), rejected[1]
+    results = save_and_predict(images, predict_finger_batch, FIREBASE_FINGER_NODE, user_email)
     if isinstance(results, tuple):
         return jsonify(results[0]), results[1]
     return jsonify({"results": results})
 
-@app.route('/upload', methods=['POST'])
-def upload():
+def parse_screening_request():
+    """อ่าน form ของ /upload และ /jobs คืนค่า dict ของ argument ของ run_screening หรือ (error, status)"""
     if 'eye' not in request.files and 'finger' not in request.files:
-        return jsonify({'error': 'No image files provided for either eye or finger'}), 400
+        return {'error': 'No image files provided for either eye or finger'}, 400
 
-    user_email = request.form.get('userEmail')
-    gender = request.form.get('gender')
     age = 0
     try:
         age = int(request.form.get('age', 0))
     except ValueError:
-        return jsonify({'error': 'Invalid age provided'}), 400
+        return {'error': 'Invalid age provided'}, 400
+
+    return {
+        "eye_images": request.files.getlist('eye'),
+        "finger_images": request.files.getlist('finger'),
+        "user_email": request.form.get('userEmail'),
+        "gender": request.form.get('gender'),
+        "age": age,
+    }
 
+def run_screening(eye_images, finger_images, user_email, gender, age, on_result=None):
+    """
+    pipeline ของ /upload: ทำนายภาพตาและนิ้วพร้อมกัน รวมเป็นความเสี่ยง แล้วส่งผลไป Firebase
+    on_result(kind, result): callback เมื่อได้ผลของแต่ละภาพ (ใช้ส่ง event ของ /jobs)
+    คืนค่า (body, status)
+    """
     results_eye = []
     results_finger = []
 
-    # Process eye images
-    if 'eye' in request.files:
-        eye_images = request.files.getlist('eye')
-        if len(eye_images) > 0:
-            print(f"[INFO] Eye images received: {[f.filename for f in eye_images]}")
-            eye_results = save_and_predict(eye_images, predict_eye, FIREBASE_EYE_URL, user_email)
-            # error handling for eye results
-            if isinstance(eye_results, tuple):
-                return jsonify(eye_results[0]), eye_results[1]
-            results_eye = eye_results
-
-    # Process finger images
-    if 'finger' in request.files:
-        finger_images = request.files.getlist('finger')
+    # อ่านแต่ละภาพครั้งเดียว แล้วตรวจคุณภาพทุกภาพก่อน ถ้าไม่ผ่าน (enforce) ไม่ต้องรันโมเดลเลย
+    eye_uploads = read_uploads(eye_images)
+    finger_uploads = read_uploads(finger_images)
+    rejected = check_quality({"eye": eye_uploads, "finger": finger_uploads})
+    if rejected is not None:
+        return rejected
+
+    # Process eye and finger images concurrently: eye in the pipeline executor, finger on this thread
+    eye_future = None
+    eye_results = []
+    finger_results = []
+
+    if len(eye_images) > 0:
+        logger.info("Eye images received: %s", [f.filename for f in eye_images])
+        eye_args = (eye_uploads, predict_eye_batch, FIREBASE_EYE_NODE, user_email,
+                    on_result and (lambda result: on_result("eye", result)))
         if len(finger_images) > 0:
-            print(f"[INFO] Finger images received: {[f.filename for f in finger_images]}")
-            finger_results = save_and_predict(finger_images, predict_finger, FIREBASE_FINGER_URL, user_email)
-            # error handling for finger results
-            if isinstance(finger_results, tuple):
-                return jsonify(finger_results[0]), finger_results[1]
-            results_finger= finger_results
+            eye_future = get_pipeline_executor().submit(save_and_predict, *eye_args)
+        else:
+            eye_results = save_and_predict(*eye_args)
+
+    if len(finger_images) > 0:
+        logger.info("Finger images received: %s", [f.filename for f in finger_images])
+        finger_results = save_and_predict(finger_uploads, predict_finger_batch, FIREBASE_FINGER_NODE, user_email,
+                                          on_result and (lambda result: on_result("finger", result)))
+
+    if eye_future is not None:
+        eye_results = eye_future.result()
+
+    # error handling: eye error takes precedence, same as when the pipelines ran in sequence
+    if isinstance(eye_results, tuple):
+        return eye_results
+    results_eye = eye_results
+
+    if isinstance(finger_results, tuple):
+        return finger_results
+    results_finger = finger_results
     
     # age = 66
     # gender = 'หญิง'  # หรือ 'ชาย'
 
-    eye_risk = 0
-    finger_risk = 0
+    logger.debug("Eye results: %s", results_eye)
+    logger.debug("Finger results: %s", results_finger)
 
-    print(f"[INFO] Eye results: {results_eye}")
-    print(f"[INFO] Finger results: {results_finger}")
-
-    eye_left: Optional[dict] = next((r for r in results_eye if r["filename"] == eyeLabels[0]), None)
-    eye_right: Optional[dict] = next((r for r in results_eye if r["filename"] == eyeLabels[1]), None)
-    if eye_left and eye_right:
-        print(f"[INFO] Left Eye Prediction: {eye_left['prediction']}, Right Eye Prediction: {eye_right['prediction']}")
-        eye_risk = calculate_diabetes_risk_from_eyes(eye_left['prediction'], eye_right['prediction'], age, gender)
-    
-    finger_left_thumb: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[0]), None)
-    finger_left_index: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[1]), None)
-    finger_left_middle: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[2]), None)
-    finger_left_ring: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[3]), None)
-    finger_left_little: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[4]), None)
-    finger_right_thumb: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[5]), None)
-    finger_right_index: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[6]), None)
-    finger_right_middle: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[7]), None)
-    finger_right_ring: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[8]), None)
-    finger_right_little: Optional[dict] = next((r for r in results_finger if r["filename"] == fingerLabels[9]), None)
-
-    if (finger_left_thumb and finger_left_index and finger_left_middle and 
-        finger_left_ring and finger_left_little and finger_right_thumb and 
-        finger_right_index and finger_right_middle and finger_right_ring and 
-        finger_right_little):
-
-        fingers_input = {
-            'R1': finger_right_thumb['prediction'],
-            'R2': finger_right_index['prediction'],
-            'R3': finger_right_middle['prediction'],
-            'R4': finger_right_ring['prediction'],
-            'R5': finger_right_little['prediction'],
-            'L1': finger_left_thumb['prediction'],
-            'L2': finger_left_index['prediction'],
-            'L3': finger_left_middle['prediction'],
-            'L4': finger_left_ring['prediction'],
-            'L5': finger_left_little['prediction']
-        }
-        finger_risk = calculate_diabetes_risk(
-            fingers_input, gender, age
-        )
-    
-    # Combine results
-    result_risk = manual_weighted_risk(eye_risk, finger_risk)
+    with timed("risk"):
+        result_risk = score_patient(results_eye, results_finger, age, gender)
 
     result = {
         "prediction": result_risk['total_risk'],
@@ -297,15 +469,276 @@ def upload():
         "timestamp": datetime.datetime.now(ZoneInfo("Asia/Bangkok")).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
     }
 
-    # ส่งผลลัพธ์ไป Firebase
-    try:
-        response = requests.post(FIREBASE_RESULT_URL, data=json.dumps(result))
-    except Exception as e:
-        print(f"[ERROR] Firebase error")
+    # ส่งผลลัพธ์ไป Firebase (background writer, ไม่รอ Firebase ตอบ) และเก็บใน store ในเครื่องด้วย key เดียวกัน
+    key = write_firebase(FIREBASE_RESULT_NODE, result) or generate_push_id()
+    store_result(key, result)
 
-    return jsonify({"results": {
+    return {"results": {
         "result": result
-    }})
+    }}, 200
+
+@app.route('/upload', methods=['POST'])
+def upload():
+    screening = parse_screening_request()
+    if isinstance(screening, tuple):
+        return jsonify(screening[0]), screening[1]
+    body, status = run_screening(**screening)
+    return jsonify(body), status
+
+# async job: POST /jobs ตอบ 202 ทันที แล้วประมวลผลใน thread pool ที่จำกัดขนาด
+# ผลลัพธ์อ่านได้จาก GET /jobs/<id> (poll) หรือ GET /jobs/<id>/events (server-sent events)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "32"))
+JOB_EVENTS_POLL = float(os.environ.get("JOB_EVENTS_POLL", "0.25"))
+JOB_EVENTS_HEARTBEAT = 15.0
+job_store = JobStore(os.environ.get("JOB_STORE_PATH", "jobs.sqlite3"), ttl=float(os.environ.get("JOB_TTL", "3600")))
+_job_executor = None
+_job_executor_pid = None
+_jobs_lock = threading.Lock()
+_jobs_inflight = 0
+
+def get_job_executor():
+    global _job_executor, _job_executor_pid, _jobs_inflight
+    if _job_executor_pid != os.getpid():
+        _job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        _job_executor_pid = os.getpid()
+        _jobs_inflight = 0
+    return _job_executor
+
+def _reserve_job_slot():
+    global _jobs_inflight
+    with _jobs_lock:
+        if _jobs_inflight >= JOB_WORKERS + JOB_QUEUE_SIZE:
+            return False
+        _jobs_inflight += 1
+        return True
+
+def _release_job_slot():
+    global _jobs_inflight
+    with _jobs_lock:
+        _jobs_inflight -= 1
+
+def run_job(job_id, screening):
+    def on_result(kind, result):
+        job_store.add_event(job_id, "prediction", {"kind": kind, **result})
+
+    try:
+        job_store.set_state(job_id, "running")
+        job_store.add_event(job_id, "state", {"state": "running"})
+        with timed("job"):
+            body, status = run_screening(**screening, on_result=on_result)
+        if status == 200:
+            job_store.set_state(job_id, "done", result=body)
+            job_store.add_event(job_id, "result", body)
+        else:
+            job_store.set_state(job_id, "failed", error=body.get('error'))
+            job_store.add_event(job_id, "error", {**body, "status": status})
+    except Exception as e:
+        logger.exception("Job %s failed: %s", job_id, e)
+        job_store.set_state(job_id, "failed", error=str(e))
+        job_store.add_event(job_id, "error", {"error": str(e), "status": 500})
+    finally:
+        _release_job_slot()
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    screening = parse_screening_request()
+    if isinstance(screening, tuple):
+        return jsonify(screening[0]), screening[1]
+
+    # อ่าน bytes ของภาพก่อนตอบ 202 เพราะ stream ของ request ใช้ไม่ได้หลัง request จบ
+    for key in ("eye_images", "finger_images"):
+        screening[key] = [FileStorage(io.BytesIO(f.read()), filename=f.filename) for f in screening[key]]
+
+    executor = get_job_executor()
+    if not _reserve_job_slot():
+        return jsonify({'error': 'Job queue is full, try again later'}), 503, {"Retry-After": "5"}
+    try:
+        job_id = job_store.create()
+        job_store.add_event(job_id, "state", {"state": "queued"})
+        executor.submit(run_job, job_id, screening)
+    except Exception:
+        _release_job_slot()
+        raise
+
+    status_url = url_for('get_job', job_id=job_id)
+    return jsonify({
+        "job_id": job_id,
+        "state": "queued",
+        "status_url": status_url,
+        "events_url": url_for('job_events', job_id=job_id),
+    }), 202, {"Location": status_url}
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_store.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    job["predictions"] = [event["data"] for event in job_store.events(job_id, event_type="prediction")]
+    return jsonify(job)
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if job_store.get(job_id) is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    try:
+        last_seq = int(request.headers.get("Last-Event-ID") or request.args.get("after", 0))
+    except ValueError:
+        last_seq = 0
+
+    def stream(last_seq):
+        # poll SQLite แทนการรอใน process เดียวกัน เพราะ job อาจรันอยู่ใน worker อื่น
+        last_sent = time.monotonic()
+        while True:
+            events = job_store.events(job_id, after_seq=last_seq)
+            for event in events:
+                last_seq = event["seq"]
+                data = json.dumps(event["data"], ensure_ascii=False)
+                yield f"id: {event['seq']}\nevent: {event['type']}\ndata: {data}\n\n"
+                if event["type"] in ("result", "error"):
+                    return
+            if events:
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent > JOB_EVENTS_HEARTBEAT:
+                if job_store.get(job_id) is None:
+                    return
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(JOB_EVENTS_POLL)
+
+    return Response(stream(last_seq), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def authorize_results(email):
+    """
+    ตรวจ token แบบเดียวกับ verifyToken ของ backend (Node): ไม่มี token ตอบ 401, token ไม่ถูกต้องตอบ 403
+    อ่านได้เฉพาะผลของ email ตัวเอง ยกเว้น admin คืนค่า (body, status) ถ้าไม่อนุญาต ไม่งั้นคืนค่า None
+    """
+    if not JWT_SECRET:
+        return {'error': 'Result lookup is not configured'}, 503
+    token = request_token(request)
+    if not token:
+        return {'error': 'You are not authenticated!'}, 401
+    user = verify_jwt(token, JWT_SECRET)
+    if user is None:
+        return {'error': 'Token is not valid!'}, 403
+    if user.get("email") != email and not user.get("isAdmin"):
+        return {'error': 'You are not authorized!'}, 403
+    return None
+
+@app.route('/results/<email>/latest', methods=['GET'])
+def latest_result(email):
+    if result_store is None:
+        return jsonify({'error': 'Result store is disabled'}), 404
+    denied = authorize_results(email)
+    if denied is not None:
+        return jsonify(denied[0]), denied[1]
+    result = result_store.latest(email)
+    if result is None:
+        return jsonify({'error': 'No results for this user'}), 404
+    return jsonify({"result": result})
+
+@app.route('/results/<email>', methods=['GET'])
+def result_history(email):
+    # ?limit=20&before=<next_cursor ของหน้าก่อน>
+    if result_store is None:
+        return jsonify({'error': 'Result store is disabled'}), 404
+    denied = authorize_results(email)
+    if denied is not None:
+        return jsonify(denied[0]), denied[1]
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+    if not 1 <= limit <= RESULT_HISTORY_MAX_LIMIT:
+        return jsonify({'error': f'limit must be between 1 and {RESULT_HISTORY_MAX_LIMIT}'}), 400
+    results, next_cursor = result_store.history(email, limit=limit, before=request.args.get("before"))
+    return jsonify({
+        "results": results,
+        "next_cursor": next_cursor,
+        "next_url": url_for('result_history', email=email, limit=limit, before=next_cursor) if next_cursor else None,
+    })
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # liveness: process ยังตอบได้ (ไม่สนว่าโมเดลพร้อมหรือยัง)
+    return jsonify({"status": "ok"})
+
+# MODEL_LOADING=lazy: orchestrator ที่รอ /readyz จะไม่ส่ง request แรกมาให้ instance ที่ยังไม่พร้อม
+# /readyz จึงเริ่มโหลดใน background เอง (ครั้งเดียว lock นี้ไม่ถูกปล่อย)
+_lazy_loading_started = threading.Lock()
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # readiness: โมเดลโหลดและ warm-up เสร็จแล้ว ให้ orchestrator ส่ง traffic มาได้
+    if (MODEL_LOADING == "lazy" and model_registry.state == "not_started"
+            and _lazy_loading_started.acquire(blocking=False)):
+        model_registry.start_background()
+    status = model_registry.status()
+    status["timings_s"]["app_import"] = APP_IMPORT_SECONDS
+    return jsonify(status), (200 if model_registry.ready else 503)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(generate_latest(exposition_registry()), mimetype=CONTENT_TYPE_LATEST)
+
+@app.route('/batching-stats', methods=['GET'])
+def batching_stats():
+    return jsonify({
+        "enabled": BATCHING_ENABLED,
+        "schedulers": [scheduler.stats() for scheduler in (eye_scheduler, finger_scheduler) if scheduler is not None]
+    })
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        "enabled": prediction_cache is not None,
+        "cache": prediction_cache.stats() if prediction_cache is not None else None
+    })
+
+@app.route('/cascade-stats', methods=['GET'])
+def cascade_stats():
+    return jsonify({
+        "enabled": eye_cascade is not None,
+        "cascade": eye_cascade.stats() if eye_cascade is not None else None
+    })
+
+@app.route('/quality-stats', methods=['GET'])
+def quality_stats():
+    return jsonify(quality_gate.stats())
+
+@app.route('/firebase-stats', methods=['GET'])
+def firebase_stats():
+    return jsonify({
+        "enabled": firebase_writer is not None,
+        "writer": firebase_writer.stats() if firebase_writer is not None else None
+    })
+
+for scheduler in (eye_scheduler, finger_scheduler):
+    if scheduler is not None:
+        register_stats(f"batch_{scheduler.name}", scheduler.stats)
+if prediction_cache is not None:
+    register_stats("prediction_cache", prediction_cache.stats)
+if firebase_writer is not None:
+    register_stats("firebase_writer", firebase_writer.stats)
+if eye_cascade is not None:
+    register_stats("eye_cascade", eye_cascade.stats)
+if quality_gate.enabled:
+    register_stats("quality_gate", quality_gate.stats)
+register_stats("jobs", lambda: {"inflight": _jobs_inflight, **job_store.stats()})
+register_stats("models", lambda: {"ready": int(model_registry.ready), **model_registry.timings})
+if INFERENCE_MODE == "workers":
+    register_stats("model_workers", model_registry.stats)
+
+APP_IMPORT_SECONDS = round(time.perf_counter() - APP_IMPORT_STARTED, 3)
+
+if MODEL_LOADING == "eager":
+    model_registry.load()
+elif MODEL_LOADING == "background":
+    model_registry.start_background()
+elif MODEL_LOADING == "preload":
+    # gunicorn preload_app: worker โหลดส่วนที่เหลือใน post_fork (gunicorn.conf.py)
+    model_registry.preload()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
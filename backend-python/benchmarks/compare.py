@@ -0,0 +1,72 @@
+"""
+เทียบผล benchmark สองไฟล์ (จาก benchmarks.run) แล้วแจ้ง regression
+
+    python -m benchmarks.compare bench-baseline.json bench-current.json --threshold 0.10
+
+เทียบค่า median ของแต่ละ benchmark: ถ้าช้าลงเกิน threshold (สัดส่วน) ถือว่า regression และจบด้วย exit code 1
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold, metric="median_ms"):
+    """คืนค่า list ของ (name, baseline_ms, current_ms, change, status)"""
+    rows = []
+    base = baseline["benchmarks"]
+    cur = current["benchmarks"]
+    for name in sorted(set(base) | set(cur)):
+        if name not in cur:
+            rows.append((name, base[name][metric], None, None, "missing"))
+            continue
+        if name not in base:
+            rows.append((name, None, cur[name][metric], None, "new"))
+            continue
+        before, after = base[name][metric], cur[name][metric]
+        change = (after - before) / before if before > 0 else 0.0
+        if change > threshold:
+            status = "REGRESSION"
+        elif change < -threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, before, after, change, status))
+    return rows
+
+
+def format_ms(value):
+    return f"{value:10.3f}" if value is not None else f"{'-':>10s}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed slowdown of the median (0.10 = 10%%)")
+    parser.add_argument("--metric", default="median_ms", choices=["min_ms", "median_ms", "mean_ms", "p95_ms"])
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    for key in ("platform", "cpu_count", "versions"):
+        if baseline["metadata"].get(key) != current["metadata"].get(key):
+            print(f"warning: {key} differs between runs, results may not be comparable", file=sys.stderr)
+
+    rows = compare(baseline, current, args.threshold, args.metric)
+    print(f"{'benchmark':55s} {'baseline':>10s} {'current':>10s} {'change':>8s}  status")
+    for name, before, after, change, status in rows:
+        change_text = f"{100 * change:+7.1f}%" if change is not None else f"{'':8s}"
+        print(f"{name:55s} {format_ms(before)} {format_ms(after)} {change_text}  {status}")
+
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) above {100 * args.threshold:.0f}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
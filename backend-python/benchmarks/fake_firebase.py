@@ -0,0 +1,111 @@
+"""
+Firebase Realtime Database ปลอมสำหรับ load test (benchmarks/loadtest.py) ไม่เขียนข้อมูลออกนอกเครื่อง
+
+    python -m benchmarks.fake_firebase --port 9000 --latency 0.05 --error-rate 0.01
+    FIREBASE_URL=http://127.0.0.1:9000/ python app.py
+
+รับ PATCH / PUT / POST ที่ path ใด ๆ ที่ลงท้ายด้วย .json (แบบที่ FirebaseWriter ส่ง) ตอบ 200 โดยไม่เก็บ record
+--latency หน่วงทุก request, --error-rate สัดส่วน request ที่ตอบ --error-status (ค่าเริ่มต้น 503, ทดสอบ retry / spool ของ FirebaseWriter)
+record ที่มี key ต้องห้ามของ Firebase (. $ # [ ] /) ทำให้ทั้ง request ตอบ 400 เหมือน Firebase จริง
+GET /stats คืนจำนวน request และจำนวน record ที่ได้รับแยกตาม node บนสุด
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.FirebaseWriter import generate_push_id
+
+
+class FakeFirebaseHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    error_rate = 0.0
+    error_status = 503
+    counts = {"requests": 0, "errors": 0, "records": {}}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def invalid_keys(value):
+        if not isinstance(value, dict):
+            return False
+        return any(set(key) & set(".$#[]/") or FakeFirebaseHandler.invalid_keys(child) for key, child in value.items())
+
+    def write(self, method):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.latency:
+            time.sleep(self.latency)
+        failed = random.random() < self.error_rate
+        node = self.path.split("?")[0].strip("/").removesuffix(".json")
+        data = json.loads(body or b"null")
+        # multi-path PATCH: key ระดับบนใช้ / แยก path ได้ ตรวจเฉพาะข้างในแต่ละ record
+        records = list(data.values()) if method == "PATCH" and isinstance(data, dict) else [data]
+        rejected = not failed and any(self.invalid_keys(record) for record in records)
+        with self.lock:
+            self.counts["requests"] += 1
+            if failed or rejected:
+                self.counts["errors"] += 1
+            else:
+                # PATCH ที่ root: key คือ "<node>/<push id>" หนึ่ง key ต่อ record
+                paths = list(data) if method == "PATCH" and not node and isinstance(data, dict) else [node]
+                for path in paths:
+                    top = path.split("/")[0] or "/"
+                    self.counts["records"][top] = self.counts["records"].get(top, 0) + 1
+        if failed:
+            self.send_json({"error": "Service Unavailable"}, self.error_status)
+        elif rejected:
+            self.send_json({"error": "Invalid data; couldn't parse key beginning at 1:2."}, 400)
+        elif method == "POST":
+            self.send_json({"name": generate_push_id()})
+        else:
+            self.send_json(json.loads(body or b"null"))
+
+    def do_PATCH(self):
+        self.write("PATCH")
+
+    def do_PUT(self):
+        self.write("PUT")
+
+    def do_POST(self):
+        self.write("POST")
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.lock:
+                self.send_json(json.loads(json.dumps(self.counts)))
+        else:
+            self.send_json(None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Firebase Realtime Database for load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every write")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of writes answered with --error-status")
+    parser.add_argument("--error-status", type=int, default=503, help="Status of failed writes (e.g. 401 for an expired token)")
+    args = parser.parse_args()
+
+    FakeFirebaseHandler.latency = args.latency
+    FakeFirebaseHandler.error_rate = args.error_rate
+    FakeFirebaseHandler.error_status = args.error_status
+    server = ThreadingHTTPServer((args.host, args.port), FakeFirebaseHandler)
+    print(f"Fake Firebase listening on http://{args.host}:{args.port}/", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
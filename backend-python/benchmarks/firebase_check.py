@@ -0,0 +1,99 @@
+"""
+ตรวจ spool / replay ของ FirebaseWriter กับ Firebase ปลอม (benchmarks/fake_firebase.py) ภายใน process เดียว
+
+    python -m benchmarks.firebase_check
+
+1. Firebase ตอบ 503 ทุก request: record ต้องถูก spool ลงไฟล์
+2. ไฟล์ .replay-<pid> ของ process ที่ตายไปแล้วต้องถูกนำกลับมาส่ง
+3. Firebase กลับมาตอบ 200: record ทั้งหมด (รวมของ process ที่ตาย) ต้องถูกส่งครบและ spool ว่าง
+4. token ใช้ไม่ได้ (401): record ต้องถูก spool ไม่ใช่ทิ้ง
+5. record ที่ผิด (400) อยู่ใน PATCH เดียวกับ record อื่น: ทิ้งเฉพาะ record นั้น ที่เหลือส่งครบ
+6. close() ตอน Firebase ช้า: record ที่ยังอยู่ในคิวต้องถูก spool
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+from benchmarks.fake_firebase import FakeFirebaseHandler
+from src.FirebaseWriter import FirebaseWriter, generate_push_id
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def main():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFirebaseHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    spool_dir = tempfile.mkdtemp(prefix="firebase-spool-")
+    writer = FirebaseWriter(f"http://127.0.0.1:{server.server_port}/", spool_dir=spool_dir,
+                            linger_ms=10, max_retries=1, backoff=0.01, spool_retry_interval=0.5)
+
+    # 1. Firebase ล่ม
+    FakeFirebaseHandler.error_rate = 1.0
+    for i in range(20):
+        writer.write("eye_results", {"index": i})
+    assert writer.flush(), "writer queue did not drain"
+    assert wait_for(lambda: writer.stats()["spooled"] == 20), writer.stats()
+    print(f"spooled while down: {writer.stats()}")
+
+    # 2. ไฟล์ที่ process อื่น claim ไว้แล้วตาย
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    orphan = os.path.join(spool_dir, f"firebase-{dead.pid}.jsonl.replay-{dead.pid}")
+    with open(orphan, "w", encoding="utf-8") as f:
+        for i in range(5):
+            f.write(json.dumps({"path": f"fingerprint_results/{generate_push_id()}", "record": {"index": i}}) + "\n")
+
+    # 3. Firebase กลับมา
+    FakeFirebaseHandler.error_rate = 0.0
+    assert wait_for(lambda: writer.stats()["sent"] == 25), writer.stats()
+    assert not glob.glob(os.path.join(spool_dir, "*")), os.listdir(spool_dir)
+    with FakeFirebaseHandler.lock:
+        records = dict(FakeFirebaseHandler.counts["records"])
+    assert records == {"eye_results": 20, "fingerprint_results": 5}, records
+    print(f"replayed after recovery: {writer.stats()} records={records}")
+
+    # 4. token หมดอายุ
+    FakeFirebaseHandler.error_rate, FakeFirebaseHandler.error_status = 1.0, 401
+    writer.write("results", {"index": 0})
+    assert writer.flush(), "writer queue did not drain"
+    assert wait_for(lambda: writer.stats()["spooled"] == 21), writer.stats()
+    FakeFirebaseHandler.error_rate, FakeFirebaseHandler.error_status = 0.0, 503
+    assert wait_for(lambda: writer.stats()["sent"] == 26), writer.stats()
+    print(f"spooled on 401 and replayed: {writer.stats()}")
+
+    # 5. record ที่ผิดหนึ่งตัวในก้อนเดียวกับ record ที่ถูก
+    for i in range(4):
+        writer.write("results", {"index": i})
+    writer.write("results", {"bad.key": 1})
+    assert writer.flush(), "writer queue did not drain"
+    assert wait_for(lambda: writer.stats()["sent"] == 30 and writer.stats()["dropped"] == 1), writer.stats()
+    print(f"one bad record dropped, the rest sent: {writer.stats()}")
+
+    # 6. shutdown ระหว่างที่ Firebase ช้า
+    FakeFirebaseHandler.latency = 1.0
+    for i in range(writer.max_batch + 10):
+        writer.write("results", {"index": i})
+    writer.close(timeout=0.2)
+    spooled = sum(1 for path in glob.glob(os.path.join(spool_dir, "firebase-*.jsonl")) for _ in open(path))
+    assert spooled >= 10, (spooled, writer.stats())
+    print(f"close() spooled {spooled} queued records: {writer.stats()}")
+    FakeFirebaseHandler.latency = 0.0
+    print("OK")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+"""
+load test แบบ end-to-end ของ backend (app.py ผ่าน gunicorn) และ chatbot (machine-learning/chatbot.py)
+โดยใช้ Firebase ปลอม (benchmarks/fake_firebase.py), Ollama ปลอม (machine-learning/fake_ollama.py) และ stand-in models
+
+    cd backend-python
+    python -m benchmarks.loadtest --standin --duration 60 --output loadtest.json
+    python -m benchmarks.loadtest --standin --load upload=2x8 --load upload-eye=4 --load chat=10x16
+    python -m benchmarks.loadtest --model-dir model --load upload=0x4 --env INFERENCE_MODE=workers --env WEB_WORKERS=1
+
+--load <endpoint>=<rate>[x<concurrency>] (ใส่ซ้ำได้) endpoint: upload, upload-eye, upload-finger, chat
+  rate = request/วินาที แบบ Poisson (open loop: ส่งตามเวลาไม่ว่า server จะตอบทันหรือไม่)
+  latency นับจากเวลาที่ request ควรถูกส่ง จึงรวมเวลารอ client ที่ว่างด้วย (ไม่ซ่อนคิวตอน server ตามไม่ทัน)
+  rate = 0: closed loop, client <concurrency> ตัวส่ง request ถัดไปทันทีที่ได้คำตอบ
+  ไม่ระบุ --load = ทุก endpoint ที่ --rate / --concurrency
+เปิดเฉพาะ service ที่ endpoint ใช้ (ไม่มี chat = ไม่เปิด chatbot และ Ollama ปลอม)
+
+ผลต่อ endpoint: throughput (คำตอบที่สำเร็จ/วินาที), p50/p95/p99/max latency, error rate แยกตามสาเหตุ
+พร้อมสถิติของ Firebase / Ollama ปลอม และ /batching-stats, /cache-stats ของ service หลังจบ (รวมช่วง warm-up)
+ภาพสังเคราะห์มี --image-sets ชุดที่ต่างกัน prediction cache ถูกปิด ยกเว้นใช้ --cache
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.serving_sweep import BACKEND_DIR, free_port, upload_files
+from benchmarks.synthetic import fingerprint_jpegs, fundus_jpegs
+from src.Screening import eyeLabels, fingerLabels
+
+ML_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "machine-learning")
+
+BACKEND_ENDPOINTS = ("upload", "upload-eye", "upload-finger")
+ENDPOINTS = BACKEND_ENDPOINTS + ("chat",)
+
+CHAT_QUERIES = [
+    "What is Depaspace?",
+    "How do I find a job on Depaspace?",
+    "Can companies post projects?",
+    "How much does it cost to use the platform?",
+    "How do I contact support?",
+    "Which skills are most in demand?",
+    "How do I create a developer profile?",
+    "Is my personal data safe?",
+]
+
+
+def parse_loads(items, rate, concurrency):
+    """["upload=2x8", "chat=5"] -> {"upload": (2.0, 8), "chat": (5.0, concurrency)}"""
+    if not items:
+        return {endpoint: (rate, concurrency) for endpoint in ENDPOINTS}
+    loads = {}
+    for item in items:
+        endpoint, _, spec = item.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{endpoint}', expected one of {ENDPOINTS}")
+        load_rate, _, load_concurrency = spec.lower().partition("x")
+        loads[endpoint] = (float(load_rate or rate), int(load_concurrency or concurrency))
+    return loads
+
+
+class Workload:
+    """ข้อมูลของ request แต่ละประเภท หมุนเวียนตามลำดับ request"""
+
+    def __init__(self, image_sets, chat_unique=False):
+        self.upload = [upload_files(fundus_jpegs(len(eyeLabels), seed=100 + i),
+                                    fingerprint_jpegs(len(fingerLabels), seed=100 + i)) for i in range(image_sets)]
+        self.chat_unique = chat_unique
+
+    def request(self, endpoint, urls, i):
+        """คืนค่า (url, kwargs ของ requests.post) ของ request ที่ i"""
+        form = {"userEmail": f"load{i % 50}@example.com", "age": "60", "gender": "ชาย"}
+        files = self.upload[i % len(self.upload)]
+        if endpoint == "upload":
+            return f"{urls['backend']}/upload", {"files": files, "data": form}
+        if endpoint == "upload-eye":
+            eye = [("image", file) for field, file in files if field == "eye"]
+            return f"{urls['backend']}/upload-eye", {"files": eye, "data": form}
+        if endpoint == "upload-finger":
+            finger = [("image", file) for field, file in files if field == "finger"]
+            return f"{urls['backend']}/upload-finger", {"files": finger, "data": form}
+        query = CHAT_QUERIES[i % len(CHAT_QUERIES)]
+        if self.chat_unique:
+            query = f"{query} (request {i})"
+        return f"{urls['chat']}/chat", {"json": {"query": query}}
+
+
+class EndpointRun:
+    """
+    ยิง endpoint เดียวตาม rate / concurrency เก็บ latency ของ request ที่สำเร็จและนับ error ตามสาเหตุ
+    request ที่ยังไม่ได้ส่งเมื่อหมดเวลา + timeout (client ไม่ว่างตลอด) นับเป็น unsent
+    """
+
+    def __init__(self, endpoint, rate, concurrency, workload, urls, timeout, seed):
+        self.endpoint = endpoint
+        self.rate = rate
+        self.concurrency = concurrency
+        self.workload = workload
+        self.urls = urls
+        self.timeout = timeout
+        self.rng = np.random.default_rng(seed)
+        self.latencies = []
+        self.errors = {}
+        self.sent = 0
+        self.unsent = 0
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._counter = 0
+
+    def _next_index(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _send(self, session, scheduled_at):
+        url, kwargs = self.workload.request(self.endpoint, self.urls, self._next_index())
+        error = None
+        try:
+            response = session.post(url, timeout=self.timeout, **kwargs)
+            if response.status_code != 200:
+                error = str(response.status_code)
+        except requests.Timeout:
+            error = "timeout"
+        except requests.RequestException:
+            error = "connection"
+        elapsed = time.perf_counter() - scheduled_at
+        with self._lock:
+            self.sent += 1
+            if error is None:
+                self.latencies.append(elapsed)
+            else:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+    def _client(self, stop_at):
+        session = requests.Session()
+        if not self.rate:
+            while time.perf_counter() < stop_at:
+                self._send(session, time.perf_counter())
+            return
+        while True:
+            scheduled_at = self._queue.get()
+            if scheduled_at is None:
+                return
+            if time.perf_counter() > stop_at + self.timeout:
+                with self._lock:
+                    self.unsent += 1
+                continue
+            self._send(session, scheduled_at)
+
+    def _arrivals(self, stop_at):
+        # Poisson process: ช่วงห่างระหว่าง request เป็น exponential ที่ค่าเฉลี่ย 1 / rate
+        next_at = time.perf_counter()
+        while True:
+            next_at += self.rng.exponential(1.0 / self.rate)
+            if next_at >= stop_at:
+                break
+            time.sleep(max(0.0, next_at - time.perf_counter()))
+            self._queue.put(next_at)
+        for _ in range(self.concurrency):
+            self._queue.put(None)
+
+    def start(self, stop_at):
+        threads = [threading.Thread(target=self._client, args=(stop_at,), daemon=True)
+                   for _ in range(self.concurrency)]
+        if self.rate:
+            threads.append(threading.Thread(target=self._arrivals, args=(stop_at,), daemon=True))
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def report(self, duration):
+        latencies = sorted(self.latencies)
+
+        def percentile(q):
+            return round(1000.0 * latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1) if latencies else None
+
+        errors = sum(self.errors.values())
+        return {
+            "endpoint": self.endpoint,
+            "rate": self.rate,
+            "concurrency": self.concurrency,
+            "sent": self.sent,
+            "ok": len(latencies),
+            "unsent": self.unsent,
+            "errors": dict(self.errors),
+            "error_rate": errors / self.sent if self.sent else 0.0,
+            "throughput_rps": len(latencies) / duration,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(1000.0 * latencies[-1], 1) if latencies else None,
+        }
+
+
+class Services:
+    """เปิด process ของ service ทั้งหมดใน workdir ชั่วคราว (log ของแต่ละตัวอยู่ใน <workdir>/<name>.log)"""
+
+    def __init__(self, workdir):
+        self.workdir = workdir
+        self.processes = {}
+
+    def start(self, name, command, cwd, env=None):
+        log_file = open(os.path.join(self.workdir, f"{name}.log"), "wb")
+        self.processes[name] = subprocess.Popen(command, cwd=cwd, env=dict(os.environ, **(env or {})),
+                                                stdout=log_file, stderr=subprocess.STDOUT)
+        log_file.close()
+
+    def run(self, name, command, cwd, env=None):
+        with open(os.path.join(self.workdir, f"{name}.log"), "wb") as log_file:
+            subprocess.run(command, cwd=cwd, env=dict(os.environ, **(env or {})), stdout=log_file,
+                           stderr=subprocess.STDOUT, check=True)
+
+    def wait(self, name, url, timeout):
+        """รอจน url ตอบ 200 raise พร้อมท้าย log ถ้า process ตายหรือหมดเวลา"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.processes[name].poll() is not None:
+                break
+            try:
+                if requests.get(url, timeout=5).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.25)
+        raise RuntimeError(f"{name} did not become ready ({url}):\n{self.log_tail(name)}")
+
+    def log_tail(self, name, size=2000):
+        with open(os.path.join(self.workdir, f"{name}.log"), "rb") as f:
+            return f.read().decode(errors="replace")[-size:]
+
+    def stop(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def start_services(services, args, loads, model_dir):
+    urls = {}
+    if any(endpoint in loads for endpoint in BACKEND_ENDPOINTS):
+        firebase_port, backend_port = free_port(), free_port()
+        services.start("firebase", [sys.executable, "-m", "benchmarks.fake_firebase", "--port", str(firebase_port),
+                                    "--latency", str(args.firebase_latency), "--error-rate", str(args.firebase_error_rate)],
+                       BACKEND_DIR)
+        urls["firebase"] = f"http://127.0.0.1:{firebase_port}"
+        services.wait("firebase", f"{urls['firebase']}/stats", 30)
+
+        env = {
+            "WEB_WORKERS": str(args.web_workers),
+            "WEB_THREADS": str(args.web_threads),
+            "WEB_BIND": f"127.0.0.1:{backend_port}",
+            "MODEL_DIR": model_dir,
+            "FIREBASE_URL": urls["firebase"] + "/",
+            "FIREBASE_SPOOL_DIR": os.path.join(services.workdir, "spool"),
+            "RESULT_STORE_PATH": os.path.join(services.workdir, "results.sqlite3"),
+            "JOB_STORE_PATH": os.path.join(services.workdir, "jobs.sqlite3"),
+            "LOG_LEVEL": "WARNING",
+        }
+        if not args.cache:
+            env["PREDICTION_CACHE_SIZE"] = "0"
+        env.update(dict(item.split("=", 1) for item in args.env))
+        services.start("backend", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                       BACKEND_DIR, env)
+        urls["backend"] = f"http://127.0.0.1:{backend_port}"
+
+    if "chat" in loads:
+        ollama_port, chat_port = free_port(), free_port()
+        services.start("ollama", [sys.executable, os.path.join(ML_DIR, "fake_ollama.py"), "--port", str(ollama_port),
+                                  "--token-delay", str(args.token_delay)], ML_DIR)
+        ollama_url = f"http://127.0.0.1:{ollama_port}"
+        services.wait("ollama", f"{ollama_url}/api/tags", 30)
+        # index ของ chatbot สร้างใหม่ใน workdir ด้วย embedding ของ Ollama ปลอม (ไม่แตะ faiss_db ของ repo)
+        env = {"OLLAMA_BASE_URL": ollama_url}
+        services.run("train", [sys.executable, os.path.join(ML_DIR, "train.py"), "--file",
+                               os.path.join(ML_DIR, "company_data.txt"), "--output", "faiss_db"], services.workdir, env)
+        services.start("chatbot", [sys.executable, "-m", "uvicorn", "chatbot:app", "--app-dir", ML_DIR,
+                                   "--host", "127.0.0.1", "--port", str(chat_port), "--log-level", "warning"],
+                       services.workdir, env)
+        urls["ollama"] = ollama_url
+        urls["chat"] = f"http://127.0.0.1:{chat_port}"
+        services.wait("chatbot", f"{urls['chat']}/cache-stats", args.ready_timeout)
+
+    if "backend" in urls:
+        services.wait("backend", f"{urls['backend']}/readyz", args.ready_timeout)
+    return urls
+
+
+def collect_stats(urls):
+    """สถิติของ service หลังจบ load (ข้ามตัวที่อ่านไม่ได้)"""
+    sources = {
+        "firebase": ("firebase", "/stats"),
+        "ollama": ("ollama", "/stats"),
+        "chatbot_cache": ("chat", "/cache-stats"),
+        "backend_batching": ("backend", "/batching-stats"),
+        "backend_cache": ("backend", "/cache-stats"),
+        "backend_firebase_writer": ("backend", "/firebase-stats"),
+    }
+    stats = {}
+    for name, (service, path) in sources.items():
+        if service in urls:
+            try:
+                stats[name] = requests.get(urls[service] + path, timeout=10).json()
+            except (requests.RequestException, ValueError):
+                stats[name] = None
+    return stats
+
+
+def print_report(results):
+    print(f"{'endpoint':<14}{'sent':>7}{'ok':>7}{'err %':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}")
+    for r in results:
+        cells = [r[key] if r[key] is not None else float("nan") for key in ("p50_ms", "p95_ms", "p99_ms", "max_ms")]
+        print(f"{r['endpoint']:<14}{r['sent']:>7}{r['ok']:>7}{100 * r['error_rate']:>8.2f}{r['throughput_rps']:>9.2f}"
+              + "".join(f"{cell:>10.0f}" for cell in cells))
+        if r["errors"] or r["unsent"]:
+            print(f"{'':<14}errors {r['errors']}  unsent {r['unsent']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end load test of the backend and chatbot against local fakes")
+    parser.add_argument("--load", action="append", default=[], help="<endpoint>=<rate>[x<concurrency>], repeatable")
+    parser.add_argument("--rate", type=float, default=1.0, help="Default requests/s per endpoint (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Default concurrent clients per endpoint")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of load")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds of load before measuring (not reported)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--standin", action="store_true", help="Use randomly initialised models (no real weights)")
+    parser.add_argument("--image-sets", type=int, default=8, help="Distinct synthetic image sets to rotate through")
+    parser.add_argument("--cache", action="store_true", help="Keep the backend prediction cache enabled")
+    parser.add_argument("--chat-unique", action="store_true", help="Make every chat query unique (answer cache misses)")
+    parser.add_argument("--web-workers", type=int, default=1)
+    parser.add_argument("--web-threads", type=int, default=8)
+    parser.add_argument("--env", action="append", default=[], help="Extra KEY=VALUE for the backend, repeatable")
+    parser.add_argument("--firebase-latency", type=float, default=0.02)
+    parser.add_argument("--firebase-error-rate", type=float, default=0.0)
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Fake Ollama seconds per streamed token")
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-workdir", action="store_true", help="Keep service logs and stores after the run")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    loads = parse_loads(args.load, args.rate, args.concurrency)
+    model_dir = os.path.abspath(args.model_dir)
+    if args.standin:
+        from benchmarks.standins import write_standin_model_files
+
+        model_dir = write_standin_model_files(os.path.join(tempfile.gettempdir(), "biotrace-standin-models"))
+    workload = Workload(args.image_sets, args.chat_unique)
+
+    workdir = tempfile.mkdtemp(prefix="biotrace-loadtest-")
+    services = Services(workdir)
+    try:
+        print(f"Starting services in {workdir}", flush=True)
+        urls = start_services(services, args, loads, model_dir)
+
+        def run(duration, seed):
+            runs = [EndpointRun(endpoint, rate, concurrency, workload, urls, args.timeout, seed + i)
+                    for i, (endpoint, (rate, concurrency)) in enumerate(loads.items())]
+            stop_at = time.perf_counter() + duration
+            started = time.perf_counter()
+            threads = [thread for endpoint_run in runs for thread in endpoint_run.start(stop_at)]
+            for thread in threads:
+                thread.join()
+            return runs, time.perf_counter() - started
+
+        if args.warmup > 0:
+            print(f"Warm-up {args.warmup:.0f}s", flush=True)
+            run(args.warmup, args.seed + 1000)
+        print(f"Load {args.duration:.0f}s: " + ", ".join(
+            f"{endpoint} {'closed loop' if not rate else f'{rate:g}/s'} x{concurrency}"
+            for endpoint, (rate, concurrency) in loads.items()), flush=True)
+        runs, wall = run(args.duration, args.seed)
+        results = [endpoint_run.report(wall) for endpoint_run in runs]
+        stats = collect_stats(urls)
+    except Exception:
+        print(f"Logs kept in {workdir}", file=sys.stderr)
+        args.keep_workdir = True
+        raise
+    finally:
+        services.stop()
+        if not args.keep_workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.output:
+        report = {
+            "duration_s": args.duration,
+            "wall_s": wall,
+            "standin": args.standin,
+            "web_workers": args.web_workers,
+            "web_threads": args.web_threads,
+            "env": args.env,
+            "cache": args.cache,
+            "image_sets": args.image_sets,
+            "results": results,
+            "services": stats,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+micro-benchmark ของ backend-python แยกทีละขั้น ไม่ต้องใช้ไฟล์ weight จริงหรือ Firebase
+
+    cd backend-python
+    python -m benchmarks.run --output bench-baseline.json
+    ... แก้โค้ด ...
+    python -m benchmarks.run --output bench-current.json
+    python -m benchmarks.compare bench-baseline.json bench-current.json
+
+ใช้โมเดลแทน (benchmarks/standins.py) และภาพสังเคราะห์ (benchmarks/synthetic.py) ที่สร้างจาก seed คงที่
+ถ้าไม่มี torch / tensorflow ในเครื่อง จะข้ามขั้นที่ต้องใช้โมเดลและบันทึกเหตุผลไว้ในผลลัพธ์
+"""
+import argparse
+import importlib.metadata
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# ต้องตั้งก่อน import app: ไม่โหลดโมเดลจากไฟล์, ไม่ใช้ cache ผลทำนาย, ไม่เขียน Firebase
+os.environ["MODEL_LOADING"] = "lazy"
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+os.environ["FIREBASE_URL"] = ""
+# วัดเฉพาะโมเดล: ไม่รอหน้าต่าง micro-batch, ไม่ตรวจคุณภาพภาพ, ไม่ใช้ cascade
+os.environ["BATCHING_ENABLED"] = "0"
+os.environ["QUALITY_GATE"] = "off"
+os.environ["EYE_CASCADE"] = "off"
+# ไม่เขียน results.sqlite3 (และไม่จับเวลา insert ใน http.upload) ส่วน jobs.sqlite3 อยู่ในไดเรกทอรีชั่วคราว
+os.environ["RESULT_STORE_PATH"] = ""
+os.environ["JOB_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="biotrace-bench-"), "jobs.sqlite3")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import numpy as np
+
+from benchmarks.synthetic import fingerprint_jpegs, fundus_jpegs
+
+SCORING_COHORT_SIZE = 10000
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_ms": 1000.0 * ordered[0],
+        "median_ms": 1000.0 * statistics.median(ordered),
+        "mean_ms": 1000.0 * statistics.fmean(ordered),
+        "p95_ms": 1000.0 * ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        "stdev_ms": 1000.0 * statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def measure(func, repeat, warmup, number=1):
+    """เวลาต่อการเรียกหนึ่งครั้ง (วินาที) repeat ตัวอย่าง แต่ละตัวอย่างเรียก func number ครั้ง"""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - started) / number)
+    return samples
+
+
+def scoring_benchmarks():
+    from src.Fingerprint import calculate_diabetes_risk, calculate_diabetes_risk_batch
+    from src.Retinal import calculate_diabetes_risk_from_eyes, calculate_diabetes_risk_from_eyes_batch
+    from src.Screening import eyeLabels, fingerLabels, score_patient
+    from src.SumDiabetes import manual_weighted_risk, manual_weighted_risk_batch
+
+    rng = np.random.default_rng(0)
+    fingers = {code: value for code, value in zip(
+        ['R1', 'R2', 'R3', 'R4', 'R5', 'L1', 'L2', 'L3', 'L4', 'L5'], "WALWWLAWLW")}
+    results_eye = [{"filename": label, "prediction": stage} for label, stage in zip(eyeLabels, (2, 3))]
+    results_finger = [{"filename": label, "prediction": value} for label, value in zip(fingerLabels, "WALWWLAWLW")]
+
+    n = SCORING_COHORT_SIZE
+    whorls = rng.integers(0, 11, n)
+    ages = rng.integers(20, 90, n)
+    genders_en = rng.choice(np.array(["M", "F"]), n)
+    genders_th = rng.choice(np.array(["ชาย", "หญิง"]), n)
+    stages_r = rng.integers(1, 6, n)
+    stages_l = rng.integers(1, 6, n)
+    retina = rng.uniform(20, 110, n)
+    finger = rng.uniform(0, 80, n)
+
+    return {
+        "scoring.calculate_diabetes_risk": (lambda: calculate_diabetes_risk(fingers, 'M', 60), 1000),
+        "scoring.calculate_diabetes_risk_from_eyes": (
+            lambda: calculate_diabetes_risk_from_eyes(2, 3, 60, 'ชาย'), 1000),
+        "scoring.manual_weighted_risk": (lambda: manual_weighted_risk(57.5, 43.0), 1000),
+        "scoring.score_patient": (lambda: score_patient(results_eye, results_finger, 60, 'ชาย'), 1000),
+        f"scoring.calculate_diabetes_risk_batch[{n}]": (
+            lambda: calculate_diabetes_risk_batch(whorls, genders_en, ages), 1),
+        f"scoring.calculate_diabetes_risk_from_eyes_batch[{n}]": (
+            lambda: calculate_diabetes_risk_from_eyes_batch(stages_r, stages_l, ages, genders_th), 1),
+        f"scoring.manual_weighted_risk_batch[{n}]": (lambda: manual_weighted_risk_batch(retina, finger), 1),
+    }
+
+
+def preprocess_benchmarks(eye_jpegs, finger_jpegs):
+    from src.Preprocess import (load_eye, load_finger, normalize_eye_batch, normalize_finger_batch,
+                                preprocess_image_eye, preprocess_image_finger, transform_eye)
+
+    return {
+        "preprocess.preprocess_image_eye": (lambda: preprocess_image_eye(eye_jpegs[0]), 1),
+        "preprocess.preprocess_image_eye+transform_eye": (
+            lambda: transform_eye(preprocess_image_eye(eye_jpegs[0])), 1),
+        "preprocess.preprocess_image_finger": (lambda: preprocess_image_finger(finger_jpegs[0]), 1),
+        "preprocess.fast_eye": (lambda: normalize_eye_batch([load_eye(eye_jpegs[0], reduced=False)]), 1),
+        "preprocess.fast_eye_reduced": (lambda: normalize_eye_batch([load_eye(eye_jpegs[0], reduced=True)]), 1),
+        "preprocess.fast_finger": (lambda: normalize_finger_batch([load_finger(finger_jpegs[0], reduced=False)]), 1),
+        "preprocess.fast_finger_reduced": (
+            lambda: normalize_finger_batch([load_finger(finger_jpegs[0], reduced=True)]), 1),
+    }
+
+
+def upload_form(eye_jpegs, finger_jpegs):
+    from src.Screening import eyeLabels, fingerLabels
+
+    return {
+        "eye": [(io.BytesIO(data), f"bench_{label}.jpg") for data, label in zip(eye_jpegs, eyeLabels)],
+        "finger": [(io.BytesIO(data), f"bench_{label}.jpg") for data, label in zip(finger_jpegs, fingerLabels)],
+        "userEmail": "bench@example.com",
+        "age": "60",
+        "gender": "ชาย",
+    }
+
+
+def model_benchmarks(app_module, eye_jpegs, finger_jpegs):
+    client = app_module.app.test_client()
+
+    def upload():
+        response = client.post("/upload", data=upload_form(eye_jpegs, finger_jpegs),
+                               content_type="multipart/form-data")
+        if response.status_code != 200:
+            raise RuntimeError(f"/upload returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return {
+        "model.predict_eye": (lambda: app_module.predict_eye(eye_jpegs[0]), 1),
+        f"model.predict_eye_batch[{len(eye_jpegs)}]": (lambda: app_module.predict_eye_batch(eye_jpegs), 1),
+        "model.predict_finger": (lambda: app_module.predict_finger(finger_jpegs[0]), 1),
+        f"model.predict_finger_batch[{len(finger_jpegs)}]": (
+            lambda: app_module.predict_finger_batch(finger_jpegs), 1),
+        "http.upload": (upload, 1),
+    }
+
+
+def package_versions():
+    versions = {"python": platform.python_version()}
+    for name in ("numpy", "opencv-python-headless", "flask", "torch", "tensorflow", "onnxruntime"):
+        try:
+            versions[name] = importlib.metadata.version(name)
+        except importlib.metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the BioTrace ML backend")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--repeat", type=int, default=20, help="Samples per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed calls before sampling")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--filter", default=None, help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--skip-models", action="store_true", help="Skip stages that need torch/tensorflow")
+    args = parser.parse_args()
+
+    eye_jpegs = fundus_jpegs(2, seed=args.seed)
+    finger_jpegs = fingerprint_jpegs(10, seed=args.seed)
+
+    benchmarks = {}
+    benchmarks.update(preprocess_benchmarks(eye_jpegs, finger_jpegs))
+    benchmarks.update(scoring_benchmarks())
+
+    skipped = {}
+    if args.skip_models:
+        skipped["model"] = "--skip-models"
+    else:
+        try:
+            from benchmarks.standins import build_standin_models
+            import app as app_module
+
+            if app_module.INFERENCE_MODE != "inprocess":
+                # stand-in models ถูกสร้างใน process นี้ ส่งเข้า model worker ไม่ได้
+                skipped["model"] = f"INFERENCE_MODE={app_module.INFERENCE_MODE} (stand-ins need inprocess)"
+                print("Skipping model benchmarks: stand-in models need INFERENCE_MODE=inprocess "
+                      "(use benchmarks/loadtest.py --standin for the worker mode)", file=sys.stderr)
+            else:
+                eye, finger = build_standin_models(args.seed, app_module.EYE_NUM_THREADS,
+                                                   app_module.FINGER_NUM_THREADS)
+                app_module.model_registry.set_models(eye, finger)
+                benchmarks.update(model_benchmarks(app_module, eye_jpegs, finger_jpegs))
+        except ImportError as e:
+            skipped["model"] = f"missing dependency: {e}"
+            print(f"Skipping model benchmarks ({e})", file=sys.stderr)
+
+    results = {}
+    for name, (func, number) in benchmarks.items():
+        if args.filter and args.filter not in name:
+            continue
+        results[name] = summarize(measure(func, args.repeat, args.warmup, number))
+        print(f"{name:55s} median {results[name]['median_ms']:10.3f} ms  p95 {results[name]['p95_ms']:10.3f} ms")
+
+    report = {
+        "metadata": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": git_commit(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "versions": package_versions(),
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "seed": args.seed,
+            "skipped": skipped,
+        },
+        "benchmarks": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Wrote {len(results)} benchmarks to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
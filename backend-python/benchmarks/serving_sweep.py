@@ -0,0 +1,236 @@
+"""
+หาจำนวน worker และงบ thread ของ gunicorn ที่ให้ throughput สูงสุดบนเครื่องนี้
+
+    cd backend-python
+    python -m benchmarks.serving_sweep --standin --output sweep.json
+    python -m benchmarks.serving_sweep --model-dir model --configs 1x8,2x4,4x2,8x1 --concurrency 16 --max-p95-ms 3000
+
+แต่ละ config "<workers>x<threads>" คือ WEB_WORKERS และงบ intra-op thread ต่อ worker
+(แบ่งให้ตา / นิ้วด้วย default_thread_budget) ค่าเริ่มต้นคือทุกวิธีแบ่ง core ของเครื่องเป็นเลขยกกำลังสอง
+สคริปต์เปิด gunicorn (gunicorn.conf.py) ทีละ config รอ /readyz แล้วยิง /upload (ตา 2 + นิ้ว 10 ภาพสังเคราะห์)
+จาก client พร้อมกัน --concurrency ตัวเป็นเวลา --duration วินาที บันทึก throughput, p50/p95/p99 และ error
+
+ผลที่ได้ขึ้นกับเครื่อง ให้รันบนเครื่อง (หรือ container ที่จำกัด CPU) เดียวกับ production
+แล้วตั้ง WEB_WORKERS / EYE_NUM_THREADS / FINGER_NUM_THREADS ตาม config ที่แนะนำ
+--standin ใช้ weight สุ่ม (benchmarks/standins.py) ซึ่งเวลาใกล้เคียงโมเดลจริงเพราะโครงสร้างเดียวกัน
+prediction cache ถูกปิดระหว่างวัด เพราะทุก request ใช้ภาพชุดเดียวกัน
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.synthetic import fingerprint_jpegs, fundus_jpegs
+from src.InferenceBackend import default_thread_budget
+from src.Screening import eyeLabels, fingerLabels
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def available_cores():
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+
+def default_configs(cores):
+    configs = []
+    workers = 1
+    while workers <= cores:
+        configs.append((workers, cores // workers))
+        workers *= 2
+    return configs
+
+
+def parse_configs(text):
+    configs = []
+    for part in text.split(","):
+        workers, threads = part.lower().split("x")
+        configs.append((int(workers), int(threads)))
+    return configs
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, threads, web_threads, model_dir, port, log_file, workdir):
+    eye_threads, finger_threads = default_thread_budget(threads)
+    env = dict(
+        os.environ,
+        WEB_WORKERS=str(workers),
+        WEB_THREADS=str(web_threads),
+        WEB_BIND=f"127.0.0.1:{port}",
+        EYE_NUM_THREADS=str(eye_threads),
+        FINGER_NUM_THREADS=str(finger_threads),
+        MODEL_DIR=model_dir,
+        PREDICTION_CACHE_SIZE="0",
+        FIREBASE_URL="",
+        # store ในเครื่องอยู่ใน workdir ชั่วคราว ไม่เขียน results.sqlite3 / jobs.sqlite3 ลงใน backend-python
+        RESULT_STORE_PATH=os.path.join(workdir, "results.sqlite3"),
+        JOB_STORE_PATH=os.path.join(workdir, "jobs.sqlite3"),
+        LOG_LEVEL="WARNING",
+    )
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    return subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+        cwd=BACKEND_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT,
+    )
+
+
+def wait_ready(base_url, workers, timeout):
+    """รอจน /readyz ตอบ 200 ติดกันหลายครั้ง (request กระจายไปหลาย worker)"""
+    deadline = time.time() + timeout
+    streak = 0
+    while time.time() < deadline:
+        try:
+            ok = requests.get(f"{base_url}/readyz", timeout=5).status_code == 200
+        except requests.RequestException:
+            ok = False
+        streak = streak + 1 if ok else 0
+        if streak >= 4 * workers:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def upload_files(eye_jpegs, finger_jpegs):
+    files = [("eye", (f"bench_{label}.jpg", data, "image/jpeg")) for label, data in zip(eyeLabels, eye_jpegs)]
+    files += [("finger", (f"bench_{label}.jpg", data, "image/jpeg")) for label, data in zip(fingerLabels, finger_jpegs)]
+    return files
+
+
+def run_load(base_url, files, concurrency, duration, warmup_requests):
+    form = {"userEmail": "bench@example.com", "age": "60", "gender": "ชาย"}
+    for _ in range(warmup_requests):
+        requests.post(f"{base_url}/upload", files=files, data=form, timeout=300)
+
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client():
+        session = requests.Session()
+        while time.perf_counter() < stop_at:
+            started = time.perf_counter()
+            try:
+                ok = session.post(f"{base_url}/upload", files=files, data=form, timeout=300).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(q):
+        return 1000.0 * latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / wall,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "mean_ms": 1000.0 * statistics.fmean(latencies) if latencies else None,
+    }
+
+
+def recommend(results, max_p95_ms):
+    candidates = [r for r in results if r.get("throughput_rps") and not r.get("errors")]
+    if max_p95_ms is not None:
+        candidates = [r for r in candidates if r["p95_ms"] <= max_p95_ms]
+    return max(candidates, key=lambda r: r["throughput_rps"], default=None)
+
+
+def main():
+    cores = available_cores()
+    parser = argparse.ArgumentParser(description="Sweep gunicorn worker / thread counts for the BioTrace backend")
+    parser.add_argument("--configs", default=None, help="Comma-separated <workers>x<threads per worker>")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--standin", action="store_true", help="Use randomly initialised models (no real weights)")
+    parser.add_argument("--web-threads", type=int, default=4, help="gthread request threads per worker")
+    parser.add_argument("--concurrency", type=int, default=max(2, cores), help="Concurrent /upload clients")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load per config")
+    parser.add_argument("--warmup-requests", type=int, default=2)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="Only recommend configs under this p95")
+    parser.add_argument("--output", default="serving-sweep.json")
+    args = parser.parse_args()
+
+    model_dir = os.path.abspath(args.model_dir)
+    if args.standin:
+        from benchmarks.standins import write_standin_model_files
+
+        model_dir = write_standin_model_files(os.path.join(tempfile.gettempdir(), "biotrace-standin-models"))
+
+    configs = parse_configs(args.configs) if args.configs else default_configs(cores)
+    files = upload_files(fundus_jpegs(2), fingerprint_jpegs(10))
+
+    results = []
+    for workers, threads in configs:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        print(f"== {workers} worker(s) x {threads} thread(s)", flush=True)
+        with tempfile.TemporaryFile() as log_file, tempfile.TemporaryDirectory(prefix="serving-sweep-") as workdir:
+            server = start_server(workers, threads, args.web_threads, model_dir, port, log_file, workdir)
+            try:
+                if not wait_ready(base_url, workers, args.ready_timeout):
+                    log_file.seek(0)
+                    print(log_file.read().decode(errors="replace")[-2000:], file=sys.stderr)
+                    results.append({"workers": workers, "threads": threads, "error": "server did not become ready"})
+                    continue
+                result = run_load(base_url, files, args.concurrency, args.duration, args.warmup_requests)
+            finally:
+                server.terminate()
+                server.wait(timeout=60)
+        result.update({"workers": workers, "threads": threads})
+        results.append(result)
+        # config ที่ทุก request ล้มเหลวไม่มี percentile (None)
+        p50, p95, p99 = (result[key] if result[key] is not None else float("nan") for key in ("p50_ms", "p95_ms", "p99_ms"))
+        print(f"   {result['throughput_rps']:.2f} req/s  p50 {p50:.0f} ms  p95 {p95:.0f} ms  "
+              f"p99 {p99:.0f} ms  errors {result['errors']}", flush=True)
+
+    best = recommend(results, args.max_p95_ms)
+    report = {
+        "cores": cores,
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "web_threads": args.web_threads,
+        "standin": args.standin,
+        "results": results,
+        "recommended": best,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    if best is not None:
+        eye_threads, finger_threads = default_thread_budget(best["threads"])
+        print(f"Recommended: WEB_WORKERS={best['workers']} EYE_NUM_THREADS={eye_threads} "
+              f"FINGER_NUM_THREADS={finger_threads}")
+    else:
+        print("No config met the constraints", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+โมเดลแทนสำหรับ benchmark (ไม่ต้องมีไฟล์ weight จริง)
+
+- ตา: EfficientNet-B4 โครงสร้างเดียวกับ EyeAI.pth แต่ weight สุ่ม
+- นิ้ว: CNN Keras ขนาด input/output เดียวกับ FingerAI.h5 (150x150x3 -> softmax 3 คลาส)
+
+เวลาที่วัดได้จึงใกล้เคียงโมเดลจริง แต่ค่าทำนายไม่มีความหมาย
+"""
+import os
+
+from src.InferenceBackend import EYE_WEIGHTS, FINGER_WEIGHTS, KerasFingerModel, TorchEyeModel, build_eye_network
+from src.Preprocess import FINGER_SIZE
+
+
+def build_finger_network(seed=0):
+    import tensorflow as tf
+
+    tf.keras.utils.set_random_seed(seed)
+    layers = tf.keras.layers
+    return tf.keras.Sequential([
+        layers.Input(shape=(FINGER_SIZE, FINGER_SIZE, 3)),
+        layers.Conv2D(32, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Conv2D(64, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Conv2D(128, 3, activation="relu"),
+        layers.MaxPooling2D(),
+        layers.Flatten(),
+        layers.Dense(128, activation="relu"),
+        layers.Dense(3, activation="softmax"),
+    ])
+
+
+class StandInFingerModel(KerasFingerModel):
+    def __init__(self, seed=0, num_threads=None):
+        import tensorflow as tf
+
+        if num_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        self.network = build_finger_network(seed)
+
+
+def build_standin_models(seed=0, eye_threads=None, finger_threads=None):
+    """คืนค่า (eye_model, finger_model) ที่เรียกใช้แบบเดียวกับ load_models()"""
+    import torch
+
+    torch.manual_seed(seed)
+    eye = TorchEyeModel(None, num_threads=eye_threads)
+    finger = StandInFingerModel(seed, num_threads=finger_threads)
+    return eye, finger
+
+
+def write_standin_model_files(model_dir, seed=0):
+    """
+    เขียน EyeAI.pth / FingerAI.h5 แบบ weight สุ่มลง model_dir (ถ้ายังไม่มี)
+    สำหรับ benchmark ที่ต้องรัน server จริง (เช่น serving_sweep.py ผ่าน MODEL_DIR)
+    """
+    import torch
+
+    os.makedirs(model_dir, exist_ok=True)
+    eye_path = os.path.join(model_dir, EYE_WEIGHTS)
+    if not os.path.exists(eye_path):
+        torch.manual_seed(seed)
+        torch.save(build_eye_network().state_dict(), eye_path)
+    finger_path = os.path.join(model_dir, FINGER_WEIGHTS)
+    if not os.path.exists(finger_path):
+        build_finger_network(seed).save(finger_path)
+    return model_dir
@@ -0,0 +1,63 @@
+"""ภาพสังเคราะห์สำหรับ benchmark: ภาพจอประสาทตา (fundus) และลายนิ้วมือ เข้ารหัสเป็น JPEG bytes"""
+import cv2
+import numpy as np
+
+# ขนาดใกล้เคียงภาพจากกล้อง fundus / เครื่องสแกนลายนิ้วมือจริง
+FUNDUS_SIZE = (2048, 1536)
+FINGERPRINT_SIZE = (400, 400)
+
+
+def synthetic_fundus(seed=0, size=FUNDUS_SIZE):
+    """วงกลมสีส้มแดงบนพื้นดำ มี optic disc และเส้นเลือดแบบสุ่ม"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    center = (width // 2, height // 2)
+    radius = int(min(width, height) * 0.45)
+    cv2.circle(image, center, radius, (40, 80, 190), -1)
+
+    disc = (center[0] + int(radius * rng.uniform(0.2, 0.5)), center[1] + int(radius * rng.uniform(-0.2, 0.2)))
+    cv2.circle(image, disc, radius // 8, (150, 200, 240), -1)
+    for _ in range(12):
+        points = [disc]
+        angle = rng.uniform(0, 2 * np.pi)
+        for step in range(1, 8):
+            angle += rng.normal(0, 0.3)
+            last = points[-1]
+            length = radius / 6
+            points.append((int(last[0] + length * np.cos(angle)), int(last[1] + length * np.sin(angle))))
+        cv2.polylines(image, [np.array(points, dtype=np.int32)], False, (20, 30, 120), int(rng.integers(3, 9)))
+
+    noise = rng.normal(0, 6, image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.circle(mask, center, radius, 255, -1)
+    return cv2.bitwise_and(image, image, mask=mask)
+
+
+def synthetic_fingerprint(seed=0, size=FINGERPRINT_SIZE):
+    """ลายเส้นวงรีรอบจุดศูนย์กลาง (คล้าย whorl) ภาพ grayscale 3 channel"""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    cx, cy = width * rng.uniform(0.4, 0.6), height * rng.uniform(0.4, 0.6)
+    radius = np.sqrt(((xs - cx) * rng.uniform(0.8, 1.2)) ** 2 + (ys - cy) ** 2)
+    angle = np.arctan2(ys - cy, xs - cx)
+    ridges = 0.5 + 0.5 * np.sin(radius / rng.uniform(3.0, 4.5) + rng.uniform(0, 1.5) * angle)
+    gray = (255 * (1 - 0.8 * ridges) + rng.normal(0, 10, ridges.shape)).clip(0, 255).astype(np.uint8)
+    return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+
+
+def encode_jpeg(image, quality=90):
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise RuntimeError("Cannot encode synthetic image")
+    return encoded.tobytes()
+
+
+def fundus_jpegs(count, seed=0):
+    return [encode_jpeg(synthetic_fundus(seed + i)) for i in range(count)]
+
+
+def fingerprint_jpegs(count, seed=0):
+    return [encode_jpeg(synthetic_fingerprint(seed + i)) for i in range(count)]
@@ -0,0 +1,310 @@
+"""
+คัดกรองผู้ป่วยจำนวนมากแบบ offline โดยไม่ผ่าน Flask /upload
+
+โครงสร้างข้อมูล:
+    images/<patient_id>/Left Eye.jpg, Right Eye.jpg, Right Thumb.jpg, ... (ชื่อไฟล์ตาม label)
+    patients.csv มีคอลัมน์ patient_id, age, gender (และ userEmail ถ้ามี)
+
+    python bulk_screening.py --images images --patients patients.csv --output results.jsonl --workers 4
+    python bulk_screening.py --images images --patients patients.csv --output results.parquet --resume
+
+แต่ละ worker process โหลดโมเดลของตัวเองหนึ่งชุด ผลลัพธ์ถูกเขียนทีละผู้ป่วย (JSONL)
+หรือทีละก้อน (Parquet แบบ part files ต้องติดตั้ง pyarrow) และบันทึก patient_id ที่เสร็จแล้วใน <output>.checkpoint
+ผู้ป่วยที่ error ยังมีแถวใน output แต่ไม่ถูกบันทึกใน checkpoint จึงถูกคัดกรองใหม่เมื่อ --resume
+ตอน --resume แถวใน output ที่ patient_id ไม่อยู่ใน checkpoint (error หรือเขียนแล้วแต่ยังไม่ได้ checkpoint ก่อนหยุด)
+จะถูกลบออกก่อน เพื่อไม่ให้มีแถวซ้ำ
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+from src.InferenceBackend import load_models
+from src.Preprocess import load_eye, load_finger, normalize_eye_batch, normalize_finger_batch
+from src.Screening import decode_eye_probs, decode_finger_probs, eyeLabels, fingerLabels, score_patient
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+_models = None
+
+
+def image_label(filename):
+    """label จากชื่อไฟล์ รองรับทั้ง 'Left Eye.jpg' และแบบเดียวกับ /upload '<prefix>_Left Eye.jpg'"""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    for label in eyeLabels + fingerLabels:
+        if stem.lower() == label.lower() or stem.lower().endswith("_" + label.lower()):
+            return label
+    return None
+
+
+def read_patients(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            yield row
+
+
+def build_task(row, images_dir):
+    patient_id = row["patient_id"]
+    folder = os.path.join(images_dir, patient_id)
+    eye_paths = {}
+    finger_paths = {}
+    if os.path.isdir(folder):
+        for name in sorted(os.listdir(folder)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            label = image_label(name)
+            if label in eyeLabels:
+                eye_paths.setdefault(label, os.path.join(folder, name))
+            elif label in fingerLabels:
+                finger_paths.setdefault(label, os.path.join(folder, name))
+    return {
+        "patient_id": patient_id,
+        "age": row.get("age"),
+        "gender": row.get("gender"),
+        "userEmail": row.get("userEmail"),
+        "eye_paths": eye_paths,
+        "finger_paths": finger_paths,
+    }
+
+
+def _init_worker(backend, model_dir, precision, threads):
+    global _models
+    _models = load_models(backend, model_dir=model_dir, precision=precision,
+                          eye_threads=threads, finger_threads=threads)
+
+
+def _predict(labels_to_paths, load, normalize, model, decode):
+    if not labels_to_paths:
+        return []
+    labels = list(labels_to_paths)
+    batch = normalize([load(labels_to_paths[label]) for label in labels])
+    results = []
+    for label, output in zip(labels, decode(model(batch))):
+        if isinstance(output, Exception):
+            raise output
+        stage, confidence = output
+        results.append({"filename": label, "prediction": stage, "confidence": round(confidence * 100, 2)})
+    return results
+
+
+def screen_patient(task):
+    model_eye, model_finger = _models
+    started = time.perf_counter()
+    record = {"patient_id": task["patient_id"], "userEmail": task["userEmail"]}
+    try:
+        if not task["eye_paths"] and not task["finger_paths"]:
+            raise ValueError("No eye or finger images found")
+        age = int(task["age"] or 0)
+        results_eye = _predict(task["eye_paths"], load_eye, normalize_eye_batch, model_eye, decode_eye_probs)
+        results_finger = _predict(task["finger_paths"], load_finger, normalize_finger_batch,
+                                  model_finger, decode_finger_probs)
+        result_risk = score_patient(results_eye, results_finger, age, task["gender"])
+        if isinstance(result_risk, str):
+            raise ValueError(result_risk)
+        record.update({
+            "eye": results_eye,
+            "finger": results_finger,
+            "prediction": result_risk["total_risk"],
+            "level": result_risk["level"],
+            "description": result_risk["description"],
+            "error": None,
+        })
+    except Exception as e:
+        record.update({"eye": [], "finger": [], "prediction": None, "level": None, "description": None, "error": str(e)})
+    record["images"] = len(task["eye_paths"]) + len(task["finger_paths"])
+    record["elapsed_ms"] = round(1000.0 * (time.perf_counter() - started), 1)
+    return record
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def prune(path, done):
+        """เก็บเฉพาะแถวแรกของ patient_id ที่อยู่ใน done คืนค่าจำนวนแถวที่ลบ"""
+        if not os.path.exists(path):
+            return 0
+        kept, removed, seen = [], 0, set()
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    patient_id = json.loads(line)["patient_id"]
+                except (ValueError, KeyError):
+                    # บรรทัดที่เขียนไม่จบตอน process หยุด
+                    patient_id = None
+                if patient_id in done and patient_id not in seen:
+                    seen.add(patient_id)
+                    kept.append(line if line.endswith("\n") else line + "\n")
+                else:
+                    removed += 1
+        if removed:
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(kept)
+            os.replace(tmp_path, path)
+        return removed
+
+    def write(self, record):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        return [record["patient_id"]]
+
+    def close(self):
+        self.file.close()
+        return []
+
+
+class ParquetSink:
+    """เขียน Parquet เป็น part files ในโฟลเดอร์ <output> ทีละ rows_per_part แถว"""
+
+    def __init__(self, path, rows_per_part):
+        import pyarrow  # noqa: F401 (ตรวจว่าติดตั้งแล้วก่อนเริ่มงาน)
+
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self.rows = []
+        os.makedirs(path, exist_ok=True)
+        # ต่อจาก part ที่มีเลขสูงสุด (prune อาจลบ part ที่อยู่ตรงกลางไปแล้ว)
+        parts = [int(name[5:-8]) for name in os.listdir(path) if name.startswith("part-") and name.endswith(".parquet")]
+        self.part = max(parts) + 1 if parts else 0
+
+    @staticmethod
+    def prune(path, done):
+        """เก็บเฉพาะแถวแรกของ patient_id ที่อยู่ใน done ในทุก part file คืนค่าจำนวนแถวที่ลบ"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not os.path.isdir(path):
+            return 0
+        removed, seen = 0, set()
+        for name in sorted(os.listdir(path)):
+            if not name.endswith(".parquet"):
+                continue
+            part_path = os.path.join(path, name)
+            table = pq.read_table(part_path)
+            keep = []
+            for patient_id in table.column("patient_id").to_pylist():
+                keep.append(patient_id in done and patient_id not in seen)
+                seen.add(patient_id)
+            if all(keep):
+                continue
+            removed += keep.count(False)
+            if any(keep):
+                tmp_path = part_path + ".tmp"
+                pq.write_table(table.filter(pa.array(keep)), tmp_path)
+                os.replace(tmp_path, part_path)
+            else:
+                os.remove(part_path)
+        return removed
+
+    def write(self, record):
+        row = dict(record)
+        row["eye"] = json.dumps(row["eye"], ensure_ascii=False)
+        row["finger"] = json.dumps(row["finger"], ensure_ascii=False)
+        self.rows.append(row)
+        return self._flush() if len(self.rows) >= self.rows_per_part else []
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self.rows:
+            return []
+        pq.write_table(pa.Table.from_pylist(self.rows), os.path.join(self.path, f"part-{self.part:05d}.parquet"))
+        self.part += 1
+        done = [row["patient_id"] for row in self.rows]
+        self.rows = []
+        return done
+
+    def close(self):
+        return self._flush()
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline bulk screening with a process pool")
+    parser.add_argument("--images", required=True, help="folder with one sub-folder of images per patient")
+    parser.add_argument("--patients", required=True, help="CSV with patient_id, age, gender[, userEmail]")
+    parser.add_argument("--output", required=True, help="results.jsonl or results.parquet (folder of part files)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4))
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="intra-op threads per model in each worker (default: cores / workers)")
+    parser.add_argument("--backend", default=os.environ.get("INFERENCE_BACKEND", "native"))
+    parser.add_argument("--precision", default=os.environ.get("MODEL_PRECISION", "fp32"))
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--rows-per-part", type=int, default=1000, help="rows per Parquet part file")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip patients listed in <output>.checkpoint and retry the ones that failed")
+    args = parser.parse_args()
+
+    checkpoint_path = args.output.rstrip("/") + ".checkpoint"
+    if not args.resume and os.path.exists(checkpoint_path):
+        parser.error(f"{checkpoint_path} exists, use --resume or remove it")
+    done = load_checkpoint(checkpoint_path) if args.resume else set()
+    sink_class = ParquetSink if args.output.endswith(".parquet") else JsonlSink
+    if args.resume:
+        removed = sink_class.prune(args.output, done)
+        print(f"[INFO] Resuming, {len(done)} patients already screened, "
+              f"{removed} failed or unrecorded rows removed from {args.output}")
+
+    if sink_class is ParquetSink:
+        sink = ParquetSink(args.output, args.rows_per_part)
+    else:
+        sink = JsonlSink(args.output)
+
+    threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // args.workers)
+    tasks = (build_task(row, args.images) for row in read_patients(args.patients) if row["patient_id"] not in done)
+
+    started = time.perf_counter()
+    patients = images = errors = 0
+    failed = set()
+    # spawn เพื่อให้แต่ละ worker เริ่ม torch / tensorflow ใหม่ของตัวเอง
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers, initializer=_init_worker,
+                      initargs=(args.backend, args.model_dir, args.precision, threads)) as pool, \
+            open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        try:
+            for record in pool.imap_unordered(screen_patient, tasks, chunksize=4):
+                patients += 1
+                images += record["images"]
+                if record["error"]:
+                    errors += 1
+                    failed.add(record["patient_id"])
+                    print(f"[ERROR] {record['patient_id']}: {record['error']}")
+                # checkpoint หลังเขียน output แล้วเท่านั้น และไม่บันทึกผู้ป่วยที่ error เพื่อให้ --resume ทำใหม่
+                for patient_id in sink.write(record):
+                    if patient_id not in failed:
+                        checkpoint.write(patient_id + "\n")
+                checkpoint.flush()
+                if patients % 100 == 0:
+                    elapsed = time.perf_counter() - started
+                    print(f"[INFO] {patients} patients, {patients / elapsed:.2f} patients/s")
+        finally:
+            for patient_id in sink.close():
+                if patient_id not in failed:
+                    checkpoint.write(patient_id + "\n")
+
+    elapsed = time.perf_counter() - started
+    print("📊 Summary")
+    print(f"Patients screened = {patients} ({errors} errors)")
+    print(f"Images = {images}")
+    print(f"Elapsed = {elapsed:.1f} s")
+    if elapsed > 0:
+        print(f"Throughput = {patients / elapsed:.2f} patients/s, {images / elapsed:.2f} images/s")
+    if errors:
+        print("Failed patients are not checkpointed, run again with --resume to retry them")
+
+
+if __name__ == "__main__":
+    main()
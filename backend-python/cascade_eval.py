@@ -0,0 +1,165 @@
+"""
+เลือก threshold ของ EyeCascade (EYE_CASCADE_THRESHOLD) จากชุดภาพตาที่มี label
+
+    python cascade_eval.py --images samples/eye --output cascade-eval.json
+    python cascade_eval.py --images samples/eye --size 260 --thresholds 0.8,0.9,0.95 --min-agreement 0.995
+    python cascade_eval.py --images samples/eye --cascade-model EyeAI-b0.pth --measure
+
+โครงสร้างข้อมูล: samples/eye/<stage 1-5>/*.jpg (stage ตามที่ service ตอบ 1 = No DR) ภาพที่ไม่อยู่ในโฟลเดอร์ 1-5
+ใช้วัด escalation rate และ agreement ได้แต่ไม่นับใน accuracy
+
+รัน B4 (456x456) และ stage 1 กับทุกภาพครั้งเดียว แล้วคำนวณของแต่ละ threshold:
+- escalation rate: สัดส่วนภาพที่ถูกส่งต่อให้ B4
+- agreement: สัดส่วนที่ stage ของ cascade ตรงกับ B4 อย่างเดียว
+- accuracy ของ B4 และของ cascade เทียบกับ label
+- throughput: เวลาของ cascade ประมาณจาก (เวลา stage 1 ทุกภาพ + เวลา B4 ต่อภาพ x ภาพที่ถูกส่งต่อ)
+  ใช้ --measure เพื่อรัน cascade จริงทุก threshold แทนการประมาณ
+แนะนำ threshold ที่ throughput สูงสุดโดย agreement ไม่ต่ำกว่า --min-agreement
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from src.Cascade import EYE_CASCADE_SIZE, EyeCascade, parse_stages
+from src.InferenceBackend import default_thread_budget, load_eye_cascade_model, load_eye_model
+from src.Preprocess import load_eye, normalize_eye_batch
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+DEFAULT_THRESHOLDS = "0.5,0.6,0.7,0.8,0.85,0.9,0.95,0.97,0.99"
+
+
+def list_labeled_images(root):
+    """คืนค่า list ของ (path, label) label เป็น None ถ้าโฟลเดอร์แม่ไม่ใช่ 1-5"""
+    items = []
+    for directory, _, filenames in os.walk(root):
+        name = os.path.basename(directory)
+        label = int(name) if name.isdigit() and 1 <= int(name) <= 5 else None
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(directory, filename), label))
+    return sorted(items)
+
+
+def run_batches(images, batch_size, prepare, model):
+    """รันโมเดลทีละ batch คืนค่า (softmax (N, 5), วินาทีรวมของ normalize + inference)"""
+    outputs = []
+    started = time.perf_counter()
+    for i in range(0, len(images), batch_size):
+        outputs.append(np.array(model(prepare(images[i:i + batch_size])), dtype=np.float32))
+    return np.concatenate(outputs), time.perf_counter() - started
+
+
+def measure_cascade(cascade, images, batch_size, stage1, model_eye):
+    started = time.perf_counter()
+    outputs = [cascade(images[i:i + batch_size], stage1, model_eye)[0] for i in range(0, len(images), batch_size)]
+    return np.concatenate(outputs), time.perf_counter() - started
+
+
+def accuracy(predictions, labels):
+    labeled = labels > 0
+    return float(np.mean(predictions[labeled] == labels[labeled])) if labeled.any() else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure escalation rate, agreement and speed-up of the eye cascade")
+    parser.add_argument("--images", required=True, help="Folder of fundus images, optionally in <stage 1-5>/ subfolders")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--backend", default="native", choices=("native", "onnxruntime"))
+    parser.add_argument("--precision", default="fp32")
+    parser.add_argument("--cascade-model", default=None, help="Separate stage 1 model file in --model-dir")
+    parser.add_argument("--cascade-arch", default="efficientnet-b0")
+    parser.add_argument("--size", type=int, default=EYE_CASCADE_SIZE, help="Stage 1 input size")
+    parser.add_argument("--stages", default="", help="Stages stage 1 may answer, e.g. 1 (default: all)")
+    parser.add_argument("--thresholds", default=DEFAULT_THRESHOLDS)
+    parser.add_argument("--min-agreement", type=float, default=0.99)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: same as the service)")
+    parser.add_argument("--measure", action="store_true", help="Run the cascade for every threshold instead of estimating")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    items = list_labeled_images(args.images)
+    if not items:
+        print(f"[ERROR] No images found in {args.images}", file=sys.stderr)
+        sys.exit(1)
+    images = [load_eye(path) for path, _ in items]
+    labels = np.array([label or 0 for _, label in items])
+    print(f"[INFO] {len(images)} images, {int((labels > 0).sum())} labeled")
+
+    threads = args.threads or default_thread_budget()[0]
+    model_eye = load_eye_model(args.backend, args.model_dir, args.precision, num_threads=threads)
+    stage1 = load_eye_cascade_model(args.cascade_model, args.backend, args.model_dir, args.cascade_arch,
+                                    num_threads=threads) if args.cascade_model else model_eye
+    stages = parse_stages(args.stages)
+    probe = EyeCascade(size=args.size, accept_stages=stages)
+
+    # warm-up ทั้งสองขนาด ไม่ให้เวลาเตรียม kernel ครั้งแรกถูกนับ
+    run_batches(images[:args.batch_size], args.batch_size, normalize_eye_batch, model_eye)
+    run_batches(images[:args.batch_size], args.batch_size, probe.stage1_batch, stage1)
+
+    full_probs, full_seconds = run_batches(images, args.batch_size, normalize_eye_batch, model_eye)
+    stage1_probs, stage1_seconds = run_batches(images, args.batch_size, probe.stage1_batch, stage1)
+    full_pred = full_probs.argmax(axis=1) + 1
+    stage1_pred = stage1_probs.argmax(axis=1) + 1
+    full_per_image = full_seconds / len(images)
+    print(f"[INFO] B4 only: {len(images) / full_seconds:.2f} images/s, accuracy {accuracy(full_pred, labels)}")
+    print(f"[INFO] stage 1 ({args.cascade_model or f'B4 at {args.size}x{args.size}'}): "
+          f"{len(images) / stage1_seconds:.2f} images/s, agreement with B4 {np.mean(stage1_pred == full_pred):.4f}")
+
+    results = []
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        cascade = EyeCascade(threshold=threshold, size=args.size, accept_stages=stages)
+        accepted = cascade.accept(stage1_probs)
+        if args.measure:
+            probs, seconds = measure_cascade(cascade, images, args.batch_size, stage1, model_eye)
+            predictions = probs.argmax(axis=1) + 1
+        else:
+            predictions = np.where(accepted, stage1_pred, full_pred)
+            seconds = stage1_seconds + full_per_image * int((~accepted).sum())
+        result = {
+            "threshold": threshold,
+            "escalation_rate": float(np.mean(~accepted)),
+            "agreement": float(np.mean(predictions == full_pred)),
+            "accuracy": accuracy(predictions, labels),
+            "throughput": len(images) / seconds,
+            "speedup": full_seconds / seconds,
+        }
+        results.append(result)
+        print(f"  threshold {threshold:.2f}: escalated {result['escalation_rate'] * 100:5.1f}%  "
+              f"agreement {result['agreement'] * 100:6.2f}%  accuracy {result['accuracy']}  "
+              f"{result['throughput']:.2f} images/s  x{result['speedup']:.2f}")
+
+    candidates = [r for r in results if r["agreement"] >= args.min_agreement]
+    best = max(candidates, key=lambda r: r["speedup"], default=None)
+    if best is not None:
+        print(f"Recommended: EYE_CASCADE=on EYE_CASCADE_THRESHOLD={best['threshold']} EYE_CASCADE_SIZE={args.size}"
+              + (f" EYE_CASCADE_STAGES={args.stages}" if args.stages else "")
+              + (f" EYE_CASCADE_MODEL={args.cascade_model}" if args.cascade_model else ""))
+    else:
+        print(f"[WARN] No threshold reached agreement {args.min_agreement}, keep EYE_CASCADE=off", file=sys.stderr)
+
+    if args.output:
+        report = {
+            "images": len(images),
+            "labeled": int((labels > 0).sum()),
+            "size": args.size,
+            "cascade_model": args.cascade_model,
+            "stages": list(stages) if stages else None,
+            "measured": args.measure,
+            "b4": {"throughput": len(images) / full_seconds, "accuracy": accuracy(full_pred, labels)},
+            "stage1": {"throughput": len(images) / stage1_seconds,
+                       "agreement": float(np.mean(stage1_pred == full_pred)),
+                       "accuracy": accuracy(stage1_pred, labels)},
+            "thresholds": results,
+            "recommended": best,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+แปลง EyeAI.pth (PyTorch) และ FingerAI.h5 (Keras) เป็น ONNX สำหรับ INFERENCE_BACKEND=onnxruntime
+แล้วตรวจ parity ของ stage และ confidence เทียบกับโมเดลต้นฉบับบนชุดภาพตัวอย่าง
+
+    python export_onnx.py --model-dir model --eye-samples samples/eye --finger-samples samples/finger
+    python export_onnx.py --parity-only --eye-samples samples/eye --finger-samples samples/finger
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+from src.InferenceBackend import (
+    EYE_ONNX, EYE_WEIGHTS, FINGER_ONNX, FINGER_WEIGHTS,
+    KerasFingerModel, OnnxModel, TorchEyeModel,
+)
+from src.Preprocess import EYE_SIZE, FINGER_SIZE, preprocess_image_eye, preprocess_image_finger, transform_eye
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+def export_eye(weights_path, onnx_path, opset):
+    import torch
+
+    model = TorchEyeModel(weights_path)
+    network = model.network.cpu()
+    # Swish แบบ memory-efficient เป็น autograd.Function ที่ export เป็น ONNX ไม่ได้
+    network.set_swish(memory_efficient=False)
+    dummy = torch.zeros(1, 3, EYE_SIZE, EYE_SIZE)
+    torch.onnx.export(
+        network, dummy, onnx_path,
+        input_names=["input"], output_names=["logits"],
+        # spatial axes เป็น dynamic ด้วย เพื่อให้ EyeCascade ใช้โมเดลเดียวกันที่ความละเอียดต่ำเป็น stage 1
+        dynamic_axes={"input": {0: "batch", 2: "height", 3: "width"}, "logits": {0: "batch"}},
+        opset_version=opset,
+    )
+    print(f"[INFO] Exported eye model to {onnx_path}")
+
+
+def export_finger(model_path, onnx_path, opset):
+    import tensorflow as tf
+    import tf2onnx
+
+    model = KerasFingerModel(model_path).network
+    spec = (tf.TensorSpec((None, FINGER_SIZE, FINGER_SIZE, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=onnx_path)
+    print(f"[INFO] Exported finger model to {onnx_path}")
+
+
+def list_images(folder):
+    if not folder:
+        return []
+    return sorted(
+        os.path.join(folder, name) for name in os.listdir(folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+
+def compare(name, reference_model, onnx_model, batch):
+    reference = reference_model(batch)
+    candidate = onnx_model(batch)
+    ref_pred = np.argmax(reference, axis=1)
+    cand_pred = np.argmax(candidate, axis=1)
+    ref_conf = reference[np.arange(len(batch)), ref_pred]
+    cand_conf = candidate[np.arange(len(batch)), cand_pred]
+    agreement = float(np.mean(ref_pred == cand_pred))
+    max_conf_diff = float(np.max(np.abs(ref_conf - cand_conf)))
+    print(f"[PARITY] {name}: {len(batch)} images, stage agreement {agreement * 100:.2f}%, "
+          f"max confidence diff {max_conf_diff:.6f}")
+    return agreement, max_conf_diff
+
+
+def parity_check(args):
+    ok = True
+    eye_images = list_images(args.eye_samples)
+    if eye_images:
+        batch = np.stack([transform_eye(preprocess_image_eye(path)) for path in eye_images])
+        agreement, diff = compare(
+            "eye",
+            TorchEyeModel(os.path.join(args.model_dir, EYE_WEIGHTS)),
+            OnnxModel(os.path.join(args.model_dir, EYE_ONNX), apply_softmax=True),
+            batch,
+        )
+        ok = ok and agreement == 1.0 and diff <= args.tolerance
+
+    finger_images = list_images(args.finger_samples)
+    if finger_images:
+        batch = np.stack([preprocess_image_finger(path) for path in finger_images])
+        agreement, diff = compare(
+            "finger",
+            KerasFingerModel(os.path.join(args.model_dir, FINGER_WEIGHTS)),
+            OnnxModel(os.path.join(args.model_dir, FINGER_ONNX)),
+            batch,
+        )
+        ok = ok and agreement == 1.0 and diff <= args.tolerance
+
+    if not eye_images and not finger_images:
+        print("[WARN] No sample images given, parity check skipped")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export EyeAI/FingerAI to ONNX and check parity")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--eye-samples", help="folder of fundus images for the parity check")
+    parser.add_argument("--finger-samples", help="folder of fingerprint images for the parity check")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="max allowed confidence difference")
+    parser.add_argument("--parity-only", action="store_true", help="skip export, only compare existing files")
+    args = parser.parse_args()
+
+    if not args.parity_only:
+        export_eye(os.path.join(args.model_dir, EYE_WEIGHTS), os.path.join(args.model_dir, EYE_ONNX), args.opset)
+        export_finger(os.path.join(args.model_dir, FINGER_WEIGHTS), os.path.join(args.model_dir, FINGER_ONNX), args.opset)
+
+    if not parity_check(args):
+        print("[ERROR] ONNX outputs differ from the original models")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+gunicorn สำหรับ production (แทน Flask development server ของ app.run)
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+- preload_app: master import app.py และโหลด weight ที่ข้าม fork ได้ (EfficientNet-B4 ของ PyTorch) ครั้งเดียว
+  worker ทุกตัวใช้ weight ชุดนั้นร่วมกันแบบ copy-on-write แล้วโหลดส่วนที่เหลือ (FingerAI / onnxruntime)
+  และ warm-up เองหลัง fork (/readyz ของแต่ละ worker เป็น 503 จนกว่าจะเสร็จ)
+- INFERENCE_MODE=workers: preload ไม่โหลดอะไร แต่ละ worker เริ่ม process ของโมเดลตาและนิ้วของตัวเองหลัง fork
+  (ไม่ใช้ weight ร่วมกัน) จึงควรใช้ WEB_WORKERS=1 และเพิ่ม WEB_THREADS แทน
+- แบ่ง core ให้ worker เท่า ๆ กัน แล้วแบ่งต่อให้ torch (ตา) และ TF / onnxruntime (นิ้ว)
+  ด้วย default_thread_budget (intra-op ตามงบ, inter-op = 1)
+
+ตัวแปร environment:
+    WEB_WORKERS   จำนวน worker process (ค่าเริ่มต้น 2 แต่ไม่เกินจำนวน core)
+    WEB_THREADS   จำนวน request พร้อมกันต่อ worker (gthread, ค่าเริ่มต้น 4) ให้ micro-batching รวม request ได้
+    WEB_BIND      (ค่าเริ่มต้น 0.0.0.0:5000), WEB_TIMEOUT (วินาที, ค่าเริ่มต้น 120)
+    EYE_NUM_THREADS / FINGER_NUM_THREADS  override งบ thread ต่อ worker
+
+เลือก WEB_WORKERS และงบ thread ที่เหมาะกับเครื่องด้วย benchmarks/serving_sweep.py
+"""
+import gc
+import os
+import shutil
+import tempfile
+
+from src.InferenceBackend import default_thread_budget
+
+cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", min(2, cores)))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", "4"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "120"))
+preload_app = True
+
+# ต้องตั้งก่อน master import app.py
+eye_threads, finger_threads = default_thread_budget(max(1, cores // workers))
+os.environ.setdefault("EYE_NUM_THREADS", str(eye_threads))
+os.environ.setdefault("FINGER_NUM_THREADS", str(finger_threads))
+
+# eager / background จะรัน warm-up (หรือ thread) ใน master ซึ่งไม่ข้าม fork จึงเปลี่ยนเป็น preload
+# lazy ใช้ได้ตามเดิม (แต่ละ worker โหลดเองเมื่อ request แรกหรือ /readyz ครั้งแรกมาถึง ไม่ได้ใช้ weight ร่วมกัน)
+if os.environ.get("MODEL_LOADING") != "lazy":
+    os.environ["MODEL_LOADING"] = "preload"
+
+# หลาย worker: ให้ prometheus_client เขียน metric ลงไฟล์ร่วมกันเพื่อให้ /metrics รวมค่าของทุก worker
+_metrics_dir = None
+if workers > 1 and not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+    _metrics_dir = tempfile.mkdtemp(prefix="biotrace-metrics-")
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = _metrics_dir
+
+
+def when_ready(server):
+    # ย้าย object ที่มีอยู่ออกจากการไล่ของ GC เพื่อไม่ให้ worker เขียนทับ page ที่ใช้ร่วมกัน (copy-on-write)
+    gc.freeze()
+    server.log.info("Workers: %s x %s threads, thread budget per worker: eye=%s finger=%s",
+                    workers, threads, os.environ["EYE_NUM_THREADS"], os.environ["FINGER_NUM_THREADS"])
+
+
+def post_fork(server, worker):
+    from app import MODEL_LOADING, model_registry
+
+    if MODEL_LOADING == "preload":
+        model_registry.start_background()
+
+
+def worker_exit(server, worker):
+    # ผลที่ /upload ตอบไปแล้วแต่ยังอยู่ในคิวของ FirebaseWriter: ส่งให้หมดหรือเก็บลง spool ก่อน worker จบ
+    from app import firebase_writer
+
+    if firebase_writer is not None:
+        firebase_writer.close()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _metrics_dir is not None:
+        shutil.rmtree(_metrics_dir, ignore_errors=True)
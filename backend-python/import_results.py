@@ -0,0 +1,60 @@
+"""
+import ผลลัพธ์เก่าจาก Firebase (node "results") เข้า store ในเครื่อง (src/ResultStore.py) ครั้งเดียวตอนเริ่มใช้
+
+    python import_results.py --input results.json
+    python import_results.py --input export.json --node results --db data/results.sqlite3
+
+--input เป็นไฟล์ JSON ที่ export จาก Firebase ได้ทั้งแบบเฉพาะ node ({"<push id>": record, ...})
+หรือทั้ง database (ระบุ --node) key ของ Firebase ถูกใช้เป็น id จึง import ซ้ำได้โดยไม่เกิด record ซ้ำ
+และไม่ชนกับ record ที่ service เขียนเองหลังจากเปิด store แล้ว
+record ที่ไม่มี userEmail หรือ timestamp จะถูกข้าม
+"""
+import argparse
+import json
+import os
+
+from src.ResultStore import ResultStore
+
+
+def iter_records(data):
+    # Firebase export ของ node ที่ key เป็นเลขเรียงกันอาจออกมาเป็น list
+    if isinstance(data, list):
+        return ((str(i), record) for i, record in enumerate(data) if record is not None)
+    return data.items()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the local result store from a Firebase results.json export")
+    parser.add_argument("--input", required=True, help="Exported JSON (results node or whole database)")
+    parser.add_argument("--node", default=None, help="Node to read when --input is a whole-database export")
+    parser.add_argument("--db", default=os.environ.get("RESULT_STORE_PATH") or "data/results.sqlite3")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8") as f:
+        data = json.load(f)
+    if args.node:
+        data = data.get(args.node) or {}
+
+    store = ResultStore(args.db)
+    total = added = skipped = 0
+    batch = []
+    for key, record in iter_records(data):
+        total += 1
+        if not isinstance(record, dict) or not record.get("userEmail") or not record.get("timestamp"):
+            skipped += 1
+            continue
+        batch.append((key, record))
+        if len(batch) >= args.batch_size:
+            added += store.add_many(batch)
+            batch = []
+    if batch:
+        added += store.add_many(batch)
+
+    print(f"{total} records read, {added} imported, {total - added - skipped} already present, {skipped} skipped "
+          f"(no userEmail / timestamp)")
+    print(f"{store.count()} results in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
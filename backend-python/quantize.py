@@ -0,0 +1,136 @@
+"""
+INT8 post-training quantization ของ EyeAI และ FingerAI (ONNX Runtime static quantization)
+ต้อง export เป็น ONNX ก่อนด้วย export_onnx.py แล้ว calibrate ด้วยโฟลเดอร์ภาพตัวอย่าง
+
+    python quantize.py --model-dir model --eye-samples samples/eye --finger-samples samples/finger --report quant_report.json
+
+ผลลัพธ์คือ model/EyeAI.int8.onnx และ model/FingerAI.int8.onnx
+ใช้งานใน app.py ด้วย INFERENCE_BACKEND=onnxruntime และ MODEL_PRECISION=int8
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from export_onnx import list_images
+from src.InferenceBackend import EYE_ONNX, FINGER_ONNX, OnnxModel, onnx_filename
+from src.Preprocess import preprocess_image_eye, preprocess_image_finger, transform_eye
+
+
+class _CalibrationReader:
+    def __init__(self, input_name, batch):
+        self.input_name = input_name
+        self.samples = iter([batch[i:i + 1] for i in range(len(batch))])
+
+    def get_next(self):
+        sample = next(self.samples, None)
+        return None if sample is None else {self.input_name: sample}
+
+
+def quantize_model(fp32_path, int8_path, batch):
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared_path = int8_path + ".prep.onnx"
+    quant_pre_process(fp32_path, prepared_path)
+    input_name = OnnxModel(fp32_path).input_name
+    try:
+        quantize_static(
+            prepared_path, int8_path,
+            _CalibrationReader(input_name, batch),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=CalibrationMethod.MinMax,
+        )
+    finally:
+        os.remove(prepared_path)
+    print(f"[INFO] Wrote {int8_path}")
+
+
+def time_per_image(model, batch, repeats):
+    model(batch[:1])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for i in range(len(batch)):
+            model(batch[i:i + 1])
+    return 1000.0 * (time.perf_counter() - start) / (repeats * len(batch))
+
+
+def report_model(name, class_names, fp32_path, int8_path, batch, repeats):
+    fp32 = OnnxModel(fp32_path, apply_softmax=(name == "eye"))
+    int8 = OnnxModel(int8_path, apply_softmax=(name == "eye"))
+    fp32_pred = np.argmax(fp32(batch), axis=1)
+    int8_pred = np.argmax(int8(batch), axis=1)
+
+    per_class = {}
+    for index, class_name in enumerate(class_names):
+        mask = fp32_pred == index
+        if mask.any():
+            per_class[class_name] = {
+                "images": int(mask.sum()),
+                "agreement": float(np.mean(int8_pred[mask] == index)),
+            }
+
+    report = {
+        "images": len(batch),
+        "agreement": float(np.mean(fp32_pred == int8_pred)),
+        "per_class_agreement": per_class,
+        "latency_ms_per_image": {
+            "fp32": time_per_image(fp32, batch, repeats),
+            "int8": time_per_image(int8, batch, repeats),
+        },
+        "size_mb": {
+            "fp32": os.path.getsize(fp32_path) / 2 ** 20,
+            "int8": os.path.getsize(int8_path) / 2 ** 20,
+        },
+    }
+
+    print(f"[REPORT] {name}: agreement {report['agreement'] * 100:.2f}% on {len(batch)} images")
+    for class_name, stats in per_class.items():
+        print(f"    {class_name}: {stats['agreement'] * 100:.2f}% ({stats['images']} images)")
+    print(f"    latency {report['latency_ms_per_image']['fp32']:.1f} ms -> {report['latency_ms_per_image']['int8']:.1f} ms per image")
+    print(f"    size {report['size_mb']['fp32']:.1f} MB -> {report['size_mb']['int8']:.1f} MB")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization with an FP32 parity report")
+    parser.add_argument("--model-dir", default="model")
+    parser.add_argument("--eye-samples", help="folder of fundus images used for calibration")
+    parser.add_argument("--finger-samples", help="folder of fingerprint images used for calibration")
+    parser.add_argument("--repeats", type=int, default=3, help="timing passes over the calibration set")
+    parser.add_argument("--report", help="write the report as JSON to this path")
+    args = parser.parse_args()
+
+    report = {}
+    eye_images = list_images(args.eye_samples)
+    if eye_images:
+        batch = np.stack([transform_eye(preprocess_image_eye(path)) for path in eye_images])
+        fp32_path = os.path.join(args.model_dir, EYE_ONNX)
+        int8_path = os.path.join(args.model_dir, onnx_filename(EYE_ONNX, "int8"))
+        quantize_model(fp32_path, int8_path, batch)
+        report["eye"] = report_model("eye", [str(stage) for stage in range(1, 6)], fp32_path, int8_path, batch, args.repeats)
+
+    finger_images = list_images(args.finger_samples)
+    if finger_images:
+        batch = np.stack([preprocess_image_finger(path) for path in finger_images])
+        fp32_path = os.path.join(args.model_dir, FINGER_ONNX)
+        int8_path = os.path.join(args.model_dir, onnx_filename(FINGER_ONNX, "int8"))
+        quantize_model(fp32_path, int8_path, batch)
+        report["finger"] = report_model("finger", ["A", "W", "L"], fp32_path, int8_path, batch, args.repeats)
+
+    if not report:
+        parser.error("give --eye-samples and/or --finger-samples to calibrate on")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def verify_jwt(token, secret):
+    """
+    ตรวจ JWT แบบ HS256 ที่ backend (Node) ออกให้ตอน login (jwt.sign(payload, process.env.JWT))
+    คืนค่า payload (dict) ถ้า signature ถูกต้องและยังไม่หมดอายุ ไม่งั้นคืนค่า None
+    """
+    if not token or not secret:
+        return None
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        if header.get("alg") != "HS256":
+            return None
+        expected = hmac.new(secret.encode(), f"{header_b64}.{payload_b64}".encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(signature_b64)):
+            return None
+        payload = json.loads(_b64decode(payload_b64))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if "exp" in payload and time.time() >= float(payload["exp"]):
+        return None
+    return payload
+
+
+def request_token(request):
+    """token จาก header Authorization: Bearer ... หรือ cookie access_token (ลำดับเดียวกับ verifyToken ของ Node)"""
+    header = request.headers.get("Authorization", "")
+    if header.startswith("Bearer "):
+        return header.split(" ", 1)[1]
+    return request.cookies.get("access_token")
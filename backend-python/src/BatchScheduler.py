@@ -0,0 +1,182 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchQueueFull(RuntimeError):
+    pass
+
+
+class _Pending:
+    __slots__ = ("item", "future", "group", "enqueued_at")
+
+    def __init__(self, item, future, group):
+        self.item = item
+        self.future = future
+        # item จาก submit_many ครั้งเดียวกัน (request เดียวกัน) อยู่ group เดียวกัน
+        self.group = group
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchScheduler:
+    """
+    รวม tensor ที่ preprocess แล้วจากหลาย request เข้าเป็น batch เดียวต่อ forward pass
+
+    run_batch: ฟังก์ชันรับ list ของ item แล้วคืน list ผลลัพธ์ตามลำดับเดิม
+               (ถ้า element ใดเป็น Exception จะถูกส่งกลับเป็น error ของ item นั้น)
+    max_batch_size: จำนวน item สูงสุดต่อ batch
+    max_wait_ms: เวลารอสูงสุดหลังได้ item แรก ก่อนรัน batch ที่ยังไม่เต็ม
+    max_queue_size: ขนาดคิวสูงสุด ถ้าเต็มจะ raise BatchQueueFull
+    on_batch: callback(batch_size, queue_waits) สำหรับเก็บ metrics (ไม่บังคับ)
+
+    ถ้า run_batch ของ batch ที่รวมหลาย request raise จะรันใหม่ทีละ request
+    เพื่อให้ error ไปถึงเฉพาะ request ที่ทำให้เกิด ไม่ใช่ทุก request ที่บังเอิญอยู่ใน batch เดียวกัน
+    """
+
+    def __init__(self, name, run_batch, max_batch_size=16, max_wait_ms=5.0, max_queue_size=256, on_batch=None):
+        self.name = name
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_queue_size = max_queue_size
+        self.on_batch = on_batch
+
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._rejected = 0
+        self._isolated = 0
+        self._batch_sizes = {}
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def _ensure_worker(self):
+        # thread ไม่ข้าม fork มาด้วย จึงเริ่ม worker ใหม่เมื่ออยู่ใน process ใหม่
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._thread = threading.Thread(target=self._worker_loop, name=f"batch-{self.name}", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, item, timeout=None, group=None):
+        """timeout=None: ไม่รอเลย คิวเต็มก็ raise BatchQueueFull ทันที (ไม่ให้ request thread ค้าง)"""
+        self._ensure_worker()
+        future = Future()
+        pending = _Pending(item, future, group if group is not None else future)
+        try:
+            if timeout is None:
+                self._queue.put_nowait(pending)
+            else:
+                self._queue.put(pending, timeout=timeout)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise BatchQueueFull(f"{self.name} batch queue is full ({self.max_queue_size} items)")
+        return pending.future
+
+    def submit_many(self, items, timeout=None):
+        group = object()
+        return [self.submit(item, timeout=timeout, group=group) for item in items]
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect()
+            started_at = time.perf_counter()
+            batch = [p for p in batch if p.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._run(batch, started_at)
+            except Exception as e:
+                # error ใด ๆ (รวมถึง on_batch) ต้องไม่ทำให้ thread นี้ตาย และทุก future ต้องได้คำตอบ
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+
+    def _run(self, batch, started_at):
+        self._record(batch, started_at)
+        try:
+            outputs = self._call(batch)
+        except Exception:
+            groups = {}
+            for p in batch:
+                groups.setdefault(id(p.group), []).append(p)
+            if len(groups) == 1:
+                raise
+            # รันใหม่ทีละ request: request ที่ input ผิดได้ error ของตัวเอง ที่เหลือได้ผลตามปกติ
+            with self._stats_lock:
+                self._isolated += 1
+            for members in groups.values():
+                try:
+                    self._resolve(members, self._call(members))
+                except Exception as e:
+                    for p in members:
+                        if not p.future.done():
+                            p.future.set_exception(e)
+            return
+        self._resolve(batch, outputs)
+
+    def _call(self, batch):
+        outputs = self.run_batch([p.item for p in batch])
+        if len(outputs) != len(batch):
+            raise RuntimeError(f"{self.name} run_batch returned {len(outputs)} outputs for {len(batch)} items")
+        return outputs
+
+    def _resolve(self, batch, outputs):
+        for p, output in zip(batch, outputs):
+            if isinstance(output, Exception):
+                p.future.set_exception(output)
+            else:
+                p.future.set_result(output)
+
+    def _record(self, batch, started_at):
+        waits = [started_at - p.enqueued_at for p in batch]
+        with self._stats_lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+        if self.on_batch is not None:
+            self.on_batch(len(batch), waits)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "name": self.name,
+                "batches": self._batches,
+                "items": self._items,
+                "rejected": self._rejected,
+                "isolated_batches": self._isolated,
+                "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+                "batch_size_counts": dict(sorted(self._batch_sizes.items())),
+                "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+                "avg_queue_wait_ms": 1000.0 * self._queue_wait_total / self._items if self._items else 0.0,
+                "max_queue_wait_ms": 1000.0 * self._queue_wait_max,
+            }
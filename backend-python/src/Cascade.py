@@ -0,0 +1,84 @@
+import threading
+
+import cv2
+import numpy as np
+
+from src.Observability import EYE_CASCADE_IMAGES, timed
+from src.Preprocess import EYE_SIZE, BatchBuffer, normalize_eye_batch
+
+# stage 1 ค่าเริ่มต้น: EfficientNet-B4 ตัวเดิมที่ความละเอียด 224x224 (น้อยกว่า 456x456 ราว 4 เท่า)
+# หรือโมเดลเล็กแยก (EYE_CASCADE_MODEL เช่น EfficientNet-B0) ที่ input ขนาดนี้
+EYE_CASCADE_SIZE = 224
+
+
+def parse_stages(text):
+    """ "1,2" -> (1, 2), ว่าง = ทุก stage"""
+    return tuple(int(stage) for stage in text.split(",") if stage.strip()) if text else None
+
+
+class EyeCascade:
+    """
+    cascade ของโมเดลตา: stage 1 (ถูก) ทำนายทุกภาพ ภาพที่ confidence ของ stage 1 ต่ำกว่า threshold
+    (หรือ stage ที่ทำนายไม่อยู่ใน accept_stages) จะถูกส่งต่อให้ model_eye (EfficientNet-B4 ที่ 456x456)
+    รับภาพ BGR uint8 ขนาด 456x456 (เหมือน run_eye_batch) คืนค่า (softmax (N, 5), escalated (N,) bool)
+    """
+
+    def __init__(self, threshold=0.9, size=EYE_CASCADE_SIZE, accept_stages=None):
+        self.threshold = threshold
+        self.size = size
+        self.accept_stages = accept_stages
+        self._buffer = BatchBuffer((3, size, size))
+        self._lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+
+    def signature(self):
+        """ส่วนของเวอร์ชันโมเดล (key ของ PredictionCache) ที่ขึ้นกับการตั้งค่า cascade"""
+        stages = ",".join(map(str, self.accept_stages)) if self.accept_stages else "all"
+        return f"cascade{self.size}-t{self.threshold}-s{stages}"
+
+    def accept(self, probs):
+        """mask ของภาพที่ใช้ผล stage 1 ได้"""
+        accepted = probs.max(axis=1) >= self.threshold
+        if self.accept_stages:
+            accepted &= np.isin(probs.argmax(axis=1) + 1, self.accept_stages)
+        return accepted
+
+    def stage1_batch(self, images):
+        """ภาพ BGR uint8 456x456 -> input ของ stage 1 (N, 3, size, size) ที่ normalize แล้ว"""
+        if self.size == EYE_SIZE:
+            return normalize_eye_batch(images)
+        small = [cv2.resize(image, (self.size, self.size), interpolation=cv2.INTER_AREA) for image in images]
+        return normalize_eye_batch(small, out=self._buffer.get(len(small)))
+
+    def __call__(self, images, stage1_model, model_eye):
+        with timed("normalize"):
+            batch = self.stage1_batch(images)
+        with timed("inference_eye_stage1"):
+            probs = np.array(stage1_model(batch), dtype=np.float32)
+
+        escalate = np.flatnonzero(~self.accept(probs))
+        if len(escalate):
+            with timed("normalize"):
+                full = normalize_eye_batch([images[i] for i in escalate])
+            with timed("inference_eye"):
+                probs[escalate] = model_eye(full)
+
+        EYE_CASCADE_IMAGES.labels("stage1").inc(len(images) - len(escalate))
+        EYE_CASCADE_IMAGES.labels("escalated").inc(len(escalate))
+        with self._lock:
+            self.images += len(images)
+            self.escalated += len(escalate)
+        escalated = np.zeros(len(images), dtype=bool)
+        escalated[escalate] = True
+        return probs, escalated
+
+    def stats(self):
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "size": self.size,
+                "images": self.images,
+                "escalated": self.escalated,
+                "escalation_rate": self.escalated / self.images if self.images else 0.0,
+            }
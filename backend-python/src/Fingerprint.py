@@ -1,3 +1,10 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
 def calculate_diabetes_risk(fingers, gender, age):
     """
     คำนวณความเสี่ยงเป็นโรคเบาหวานชนิดที่ 2 จากลายนิ้วมือ + อายุ + เพศ
@@ -30,18 +37,45 @@ def calculate_diabetes_risk(fingers, gender, age):
         total_risk = None
 
     # Step 4: แสดงผล
-    print("📌 ผลลัพธ์:")
-    print(f"Whorl Score = {whorl_score}")
-    print(f"เปอร์เซ็นต์ลายนิ้วมือแบบ Whorl = {whorl_percent:.1f}%")
-    
+    logger.debug("📌 ผลลัพธ์:")
+    logger.debug("Whorl Score = %d", whorl_score)
+    logger.debug("เปอร์เซ็นต์ลายนิ้วมือแบบ Whorl = %.1f%%", whorl_percent)
+
     if base_risk is not None:
-        print(f"ความเสี่ยงเบาหวานพื้นฐานจากอายุ/เพศ = {base_risk:.1f}%")
-        print(f"ความเสี่ยงรวม ≈ {base_risk:.1f}% + ({whorl_percent:.1f}% × 0.5) = {total_risk:.1f}%")
+        logger.debug("ความเสี่ยงเบาหวานพื้นฐานจากอายุ/เพศ = %.1f%%", base_risk)
+        logger.debug("ความเสี่ยงรวม ≈ %.1f%% + (%.1f%% × 0.5) = %.1f%%", base_risk, whorl_percent, total_risk)
     else:
-        print("⚠️ ไม่สามารถประเมินได้: อายุ < 45 ปี")
+        logger.debug("⚠️ ไม่สามารถประเมินได้: อายุ < 45 ปี")
     
     return total_risk
 
+
+def calculate_diabetes_risk_batch(whorl_counts, genders, ages):
+    """
+    calculate_diabetes_risk แบบ vectorized สำหรับทั้ง cohort (ไม่ log)
+
+    whorl_counts: array จำนวนนิ้วที่เป็น Whorl (0-10) ของแต่ละคน
+    genders: array ของ 'M' / 'F' (ไม่สนตัวพิมพ์)
+    ages: array อายุ (ปี)
+    คืนค่า array ความเสี่ยง (NaN ในกรณีที่ scalar คืน None คืออายุ < 45 หรือเพศไม่ถูกต้อง)
+    """
+    whorl_counts = np.asarray(whorl_counts, dtype=np.float64)
+    genders = np.char.upper(np.asarray(genders, dtype=str))
+    ages = np.asarray(ages, dtype=np.float64)
+
+    whorl_percent = (whorl_counts / 10) * 100
+
+    middle_age = (45 <= ages) & (ages < 65)
+    old_age = ages >= 65
+    female = genders == 'F'
+    male = genders == 'M'
+    base_risk = np.select(
+        [female & middle_age, female & old_age, male & middle_age, male & old_age],
+        [13.7, 26.0, 18.0, 29.2],
+        default=np.nan,
+    )
+    return base_risk + (whorl_percent * 0.5)
+
 # # ✅ ตัวอย่างการใช้งาน
 # fingers_input = {
 #     'R1': 'W', 'R2': 'A', 'R3': 'W', 'R4': 'W', 'R5': 'W',
@@ -0,0 +1,279 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PUSH_CHARS = "-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+
+def generate_push_id():
+    """
+    สร้าง key แบบเดียวกับ push id ของ Firebase (เรียงตามเวลา)
+    ใช้ key ที่กำหนดเองเพื่อให้ PATCH ซ้ำ (retry / replay) ไม่สร้าง record ซ้ำ
+    """
+    now = int(time.time() * 1000)
+    time_chars = []
+    for _ in range(8):
+        time_chars.append(PUSH_CHARS[now % 64])
+        now //= 64
+    random_chars = [random.choice(PUSH_CHARS) for _ in range(12)]
+    return "".join(reversed(time_chars)) + "".join(random_chars)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # process มีอยู่แต่เป็นของ user อื่น
+        return True
+    return True
+
+
+class FirebaseWriter:
+    """
+    เขียนผลลัพธ์ไป Firebase Realtime Database จาก background thread
+
+    - รวมหลาย record เป็น multi-path PATCH ครั้งเดียว ({"<node>/<push id>": record, ...})
+    - ใช้ requests.Session ที่มี connection pool พร้อม timeout และ retry แบบ backoff
+    - 401 / 403 (token หมดอายุหรือถูกเปลี่ยน) ถือว่าส่งใหม่ได้ เก็บลง spool
+      4xx อื่นส่งทีละ record เพื่อให้ record ที่ผิดไม่ทำให้ record อื่นใน PATCH เดียวกันหายไปด้วย
+    - ถ้าส่งไม่สำเร็จจะเก็บลงไฟล์ใน spool_dir แล้วส่งใหม่เมื่อ Firebase กลับมา
+      ไฟล์ที่ process อื่น claim ไว้ (.replay-<pid>) แล้วตายไปก่อนส่งเสร็จจะถูกนำกลับมาส่งใหม่
+    - ตอน process จบ (atexit หรือ close()) รอส่งคิวที่เหลือ ส่งไม่ทันจะเก็บลง spool
+    - on_request: callback(seconds, ok) ต่อหนึ่ง PATCH สำหรับเก็บ metrics (ไม่บังคับ)
+    """
+
+    def __init__(self, base_url, spool_dir="spool", max_batch=50, linger_ms=200.0,
+                 timeout=5.0, max_retries=3, backoff=0.5, spool_retry_interval=30.0, queue_size=10000,
+                 on_request=None):
+        self.base_url = base_url.rstrip("/") + "/"
+        self.spool_dir = spool_dir
+        self.max_batch = max_batch
+        self.linger = linger_ms / 1000.0
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.spool_retry_interval = spool_retry_interval
+        self.queue_size = queue_size
+        self.on_request = on_request
+
+        self.sent = 0
+        self.failed = 0
+        self.spooled = 0
+        self.dropped = 0
+
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._queue = None
+        self._session = None
+        self._last_spool_attempt = 0.0
+
+    def _ensure_worker(self):
+        # thread และ connection pool ไม่ข้าม fork จึงสร้างใหม่ในแต่ละ process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            self._session.mount("http://", adapter)
+            self._session.mount("https://", adapter)
+            threading.Thread(target=self._worker_loop, name="firebase-writer", daemon=True).start()
+            atexit.register(self.close)
+            self._pid = os.getpid()
+
+    def write(self, node, record):
+        """ส่ง record เข้าคิวแบบไม่ block คืนค่า push id ที่จะใช้เป็น key"""
+        self._ensure_worker()
+        key = generate_push_id()
+        try:
+            self._queue.put_nowait((f"{node}/{key}", record))
+        except queue.Full:
+            # คิวเต็มแสดงว่า Firebase ช้ามาก เก็บลง spool แทนการ block request
+            self._spool([(f"{node}/{key}", record)])
+        return key
+
+    def flush(self, timeout=10.0):
+        """รอจนคิวว่าง (ใช้ตอน shutdown หรือทดสอบ) คืนค่า True ถ้าว่างทันเวลา"""
+        if self._queue is None:
+            return True
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self, timeout=10.0):
+        """เรียกตอน shutdown: รอส่งคิวให้หมดภายใน timeout ที่เหลือในคิวเก็บลง spool เพื่อส่งใหม่ภายหลัง"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        if self.flush(timeout):
+            return
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        if items:
+            self._count("failed", len(items))
+            self._spool(items)
+        if self._queue.unfinished_tasks:
+            logger.warning("Firebase writer closed with %d records still in flight", self._queue.unfinished_tasks)
+
+    def stats(self):
+        with self._stats_lock:
+            counters = {"sent": self.sent, "failed": self.failed, "spooled": self.spooled, "dropped": self.dropped}
+        counters["queue_depth"] = self._queue.qsize() if self._queue is not None else 0
+        return counters
+
+    def _count(self, name, n):
+        # write() เรียก _spool จาก request thread พร้อมกับ worker thread จึงต้องนับภายใต้ lock
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=self.spool_retry_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker_loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                if batch:
+                    pending = self._deliver(batch)
+                    if pending:
+                        self._count("failed", len(pending))
+                        self._spool(pending)
+                if time.monotonic() - self._last_spool_attempt >= self.spool_retry_interval:
+                    self._replay_spool()
+            except Exception as e:
+                logger.exception("Firebase writer error: %s", e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _deliver(self, items):
+        """ส่ง items คืนค่า list ของ items ที่ยังส่งไม่ได้และต้อง spool (Firebase ล่มหรือ token ใช้ไม่ได้)"""
+        status = self._patch(items)
+        if status == "ok":
+            self._count("sent", len(items))
+            return []
+        if status == "retry":
+            return items
+        if len(items) == 1:
+            self._count("dropped", 1)
+            return []
+        # PATCH ถูกปฏิเสธทั้งก้อน ส่งทีละ record เพื่อทิ้งเฉพาะ record ที่ผิด
+        for index, item in enumerate(items):
+            pending = self._deliver([item])
+            if pending:
+                return pending + items[index + 1:]
+        return []
+
+    def _patch(self, items):
+        """คืนค่า "ok", "retry" (5xx / 429 / 401 / 403 / network ส่งใหม่ภายหลังได้) หรือ "rejected" (4xx อื่น)"""
+        body = json.dumps(dict(items))
+        for attempt in range(self.max_retries + 1):
+            started = time.perf_counter()
+            try:
+                response = self._session.patch(self.base_url + ".json", data=body, timeout=self.timeout)
+                self._observe(started, response.ok)
+                if response.ok:
+                    return "ok"
+                if response.status_code < 500 and response.status_code not in (401, 403, 429):
+                    # 4xx อื่น ๆ ส่งซ้ำก็ไม่ผ่าน
+                    logger.error("Firebase rejected %d records: %s %s",
+                                 len(items), response.status_code, response.text[:200])
+                    return "rejected"
+                logger.warning("Firebase responded %s, attempt %d", response.status_code, attempt + 1)
+            except requests.exceptions.RequestException as e:
+                self._observe(started, False)
+                logger.warning("Firebase request failed, attempt %d: %s", attempt + 1, e)
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        return "retry"
+
+    def _observe(self, started, ok):
+        if self.on_request is not None:
+            self.on_request(time.perf_counter() - started, ok)
+
+    def _spool(self, items, count=True):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f"firebase-{os.getpid()}.jsonl")
+        lines = "".join(json.dumps({"path": path_key, "record": record}, ensure_ascii=False) + "\n"
+                        for path_key, record in items)
+        with self._spool_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        if count:
+            self._count("spooled", len(items))
+        logger.warning("Spooled %d Firebase records to %s", len(items), path)
+
+    def _recover_orphans(self):
+        # ไฟล์ .replay-<pid> ที่ process เจ้าของตายไปแล้ว (หรือค้างจากรอบก่อนของ process นี้)
+        # ตั้งชื่อใหม่เป็นไฟล์ spool ปกติเพื่อให้ถูก replay ในรอบนี้
+        for claimed in glob.glob(os.path.join(self.spool_dir, "firebase-*.jsonl.replay-*")):
+            try:
+                owner = int(claimed.rsplit(".replay-", 1)[1])
+            except ValueError:
+                continue
+            if owner != os.getpid() and _pid_alive(owner):
+                continue
+            recovered = os.path.join(self.spool_dir, f"firebase-recovered-{owner}-{generate_push_id()}.jsonl")
+            try:
+                os.rename(claimed, recovered)
+            except OSError:
+                continue
+            logger.warning("Recovered orphaned Firebase spool file %s", claimed)
+
+    def _replay_spool(self):
+        self._last_spool_attempt = time.monotonic()
+        self._recover_orphans()
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, "firebase-*.jsonl"))):
+            # rename ก่อนเพื่อไม่ให้ process อื่น replay ไฟล์เดียวกันพร้อมกัน
+            claimed = f"{path}.replay-{os.getpid()}"
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            with open(claimed, encoding="utf-8") as f:
+                items = [(entry["path"], entry["record"]) for entry in map(json.loads, filter(str.strip, f))]
+
+            for start in range(0, len(items), self.max_batch):
+                pending = self._deliver(items[start:start + self.max_batch])
+                if pending:
+                    # Firebase ยังไม่กลับมา เก็บส่วนที่เหลือไว้รอบหน้า
+                    self._spool(pending + items[start + self.max_batch:], count=False)
+                    os.remove(claimed)
+                    return
+            os.remove(claimed)
+            logger.info("Replayed %d spooled Firebase records", len(items))
@@ -0,0 +1,91 @@
+import os
+
+import cv2
+import numpy as np
+
+
+def read_image_bytes(source):
+    """
+    คืนค่า buffer ของไฟล์ภาพโดยไม่เขียนลงดิสก์
+
+    source: FileStorage ของ Flask, file-like object, bytes หรือ path ของไฟล์
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            return f.read()
+
+    stream = getattr(source, "stream", source)
+    # BytesIO (ไฟล์ upload ที่ InMemoryUploadRequest ของ app.py เก็บไว้ในหน่วยความจำ) ใช้ buffer เดิมได้เลยไม่ต้อง copy
+    # stream อื่น (เช่น SpooledTemporaryFile) ต้องอ่านออกมาเป็น bytes ใหม่
+    getbuffer = getattr(stream, "getbuffer", None)
+    if getbuffer is not None:
+        return getbuffer()
+    if hasattr(stream, "seek"):
+        stream.seek(0)
+    return stream.read()
+
+
+# marker SOF ของ JPEG ที่มีขนาดภาพ (ไม่รวม DHT 0xC4, JPG 0xC8, DAC 0xCC)
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# (ตัวหาร, flag) เรียงจากลดขนาดมากไปน้อย
+_REDUCED_COLOR_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+_REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4), (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+def jpeg_size(data):
+    """อ่าน (width, height) จาก header ของ JPEG โดยไม่ decode คืนค่า None ถ้าไม่ใช่ JPEG หรืออ่านไม่ได้"""
+    data = memoryview(data)
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        if marker == 0xD9 or marker == 0xDA:  # EOI / SOS ก่อนเจอ SOF
+            return None
+        pos += 2 + ((data[pos + 2] << 8) | data[pos + 3])
+    return None
+
+
+def reduced_decode_flags(data, min_size, grayscale=False):
+    """
+    flag IMREAD_REDUCED_COLOR_* (หรือ GRAYSCALE_*) ที่ลดขนาดได้มากที่สุดโดยด้านที่สั้นที่สุดยังไม่ต่ำกว่า min_size
+    (libjpeg ลดขนาดระหว่าง decode จึงเร็วกว่าและใช้หน่วยความจำน้อยกว่า decode เต็มแล้ว resize)
+    ใช้กับ JPEG เท่านั้น ไฟล์ชนิดอื่นคืนค่า IMREAD_COLOR / IMREAD_GRAYSCALE
+    """
+    full = cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR
+    size = jpeg_size(data)
+    if size is None:
+        return full
+    shortest = min(size)
+    for factor, flags in (_REDUCED_GRAYSCALE_FLAGS if grayscale else _REDUCED_COLOR_FLAGS):
+        if shortest // factor >= min_size:
+            return flags
+    return full
+
+
+def decode_image(source, flags=cv2.IMREAD_COLOR, min_size=None):
+    """
+    decode ภาพจาก request stream ด้วย cv2.imdecode (คืนค่า BGR เหมือน cv2.imread)
+    min_size: ถ้ากำหนด จะ decode JPEG ขนาดใหญ่แบบลดความละเอียดโดยด้านสั้นยังไม่ต่ำกว่าค่านี้
+    (ใช้กับ flags IMREAD_COLOR หรือ IMREAD_GRAYSCALE)
+    คืนค่า None ถ้า decode ไม่ได้
+    """
+    data = read_image_bytes(source)
+    if len(data) == 0:
+        return None
+    if min_size is not None and flags in (cv2.IMREAD_COLOR, cv2.IMREAD_GRAYSCALE):
+        flags = reduced_decode_flags(data, min_size, grayscale=flags == cv2.IMREAD_GRAYSCALE)
+    return cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
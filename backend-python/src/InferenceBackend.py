@@ -0,0 +1,204 @@
+import hashlib
+import os
+
+import numpy as np
+
+# native = PyTorch (EyeAI.pth) + TensorFlow (FingerAI.h5)
+# onnxruntime = ไฟล์ .onnx จาก export_onnx.py โดยไม่ import torch หรือ tensorflow เลย
+BACKENDS = ("native", "onnxruntime")
+
+EYE_WEIGHTS = "EyeAI.pth"
+FINGER_WEIGHTS = "FingerAI.h5"
+EYE_ONNX = "EyeAI.onnx"
+FINGER_ONNX = "FingerAI.onnx"
+
+# โมเดลที่โหลดใน master process ก่อน fork ได้ (pre-fork server) แยกตาม backend
+# PyTorch ปลอดภัยถ้ายังไม่รัน forward pass; TensorFlow และ onnxruntime สร้าง thread pool ตอนโหลด
+# ซึ่งไม่ข้าม fork (worker จะค้าง) จึงต้องโหลดใน worker แต่ละตัว
+FORK_SAFE_MODELS = {"native": ("eye",), "onnxruntime": ()}
+
+# fp32 = ไฟล์ .onnx ปกติ, int8 = ไฟล์ที่ quantize.py สร้าง (ใช้ได้กับ onnxruntime เท่านั้น)
+PRECISIONS = ("fp32", "int8")
+
+
+def onnx_filename(filename, precision="fp32"):
+    if precision == "fp32":
+        return filename
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{precision}{ext}"
+
+
+def default_thread_budget(cores=None):
+    """
+    แบ่ง core ให้ eye (torch) และ finger (tf) เพื่อให้ทำงานพร้อมกันได้โดยไม่แย่ง core กัน
+    คืนค่า (eye_threads, finger_threads)
+    """
+    cores = cores or os.cpu_count() or 1
+    eye_threads = max(1, cores // 2)
+    finger_threads = max(1, cores - eye_threads)
+    return eye_threads, finger_threads
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def build_eye_network(arch='efficientnet-b4'):
+    from efficientnet_pytorch import EfficientNet
+    import torch
+
+    # ✅ Correct variant: EfficientNet-B4 (arch อื่นใช้กับโมเดล stage 1 ของ cascade)
+    network = EfficientNet.from_name(arch)
+    network._fc = torch.nn.Linear(network._fc.in_features, 5)  # 5 classes
+    return network
+
+
+class TorchEyeModel:
+    """
+    EfficientNet-B4 (PyTorch) รับ batch (N, 3, H, W) float32 คืนค่า softmax (N, 5)
+    weights_path=None ใช้ค่า weight แบบสุ่ม (สำหรับ benchmark ที่ไม่มีไฟล์ weight จริง)
+    """
+
+    def __init__(self, weights_path, num_threads=None, arch='efficientnet-b4'):
+        import torch
+
+        if num_threads:
+            torch.set_num_threads(num_threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # ตั้งได้ครั้งเดียวก่อนเริ่มงาน parallel ครั้งแรก
+        self.torch = torch
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.network = build_eye_network(arch)
+        if weights_path is not None:
+            self.network.load_state_dict(torch.load(weights_path, map_location=self.device))
+        self.network.to(self.device)
+        self.network.eval()
+
+    def __call__(self, batch):
+        torch = self.torch
+        with torch.no_grad():
+            output = self.network(torch.from_numpy(batch).to(self.device))
+            return torch.nn.functional.softmax(output, dim=1).cpu().numpy()
+
+
+class KerasFingerModel:
+    """FingerAI (Keras) รับ batch (N, 150, 150, 3) float32 คืนค่า softmax (N, 3)"""
+
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+
+        if num_threads:
+            # ต้องตั้งก่อน runtime ของ TF เริ่มทำงาน
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        self.network = tf.keras.models.load_model(model_path)
+
+    def __call__(self, batch):
+        # เรียกโมเดลตรง ๆ ครั้งเดียวต่อ batch (ไม่ผ่าน predict())
+        return self.network(batch, training=False).numpy()
+
+
+class OnnxModel:
+    """
+    โมเดล ONNX ผ่าน onnxruntime (CPU)
+    apply_softmax: True สำหรับโมเดลที่ส่งออก logits (EyeAI)
+    """
+
+    def __init__(self, model_path, apply_softmax=False, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.apply_softmax = apply_softmax
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: batch.astype(np.float32, copy=False)})[0]
+        return softmax(output) if self.apply_softmax else output
+
+
+def model_version(backend="native", model_dir="model", precision="fp32"):
+    """
+    เวอร์ชันของโมเดลที่ใช้งานอยู่ (จากชื่อ ขนาด และเวลาแก้ไขของไฟล์โมเดล)
+    ใช้เป็นส่วนหนึ่งของ key ของ PredictionCache เพื่อไม่ให้ใช้ผลจากโมเดลเก่า
+    """
+    if backend == "onnxruntime":
+        filenames = [onnx_filename(EYE_ONNX, precision), onnx_filename(FINGER_ONNX, precision)]
+    else:
+        filenames = [EYE_WEIGHTS, FINGER_WEIGHTS]
+    digest = hashlib.sha1(f"{backend}:{precision}".encode())
+    for filename in filenames:
+        path = os.path.join(model_dir, filename)
+        try:
+            stat = os.stat(path)
+            digest.update(f"{filename}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(f"{filename}:missing".encode())
+    return digest.hexdigest()[:12]
+
+
+def _check_backend(backend, precision):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown model precision '{precision}', expected one of {PRECISIONS}")
+    if precision != "fp32" and backend != "onnxruntime":
+        raise ValueError(f"Model precision '{precision}' requires INFERENCE_BACKEND=onnxruntime")
+
+
+def import_backend(backend="native", kinds=("eye", "finger")):
+    """
+    import framework ของ backend ล่วงหน้า (แยกเวลา import ออกจากเวลาโหลดโมเดล)
+    kinds: โมเดลที่จะโหลด (process ของโมเดลตาไม่ต้อง import tensorflow เป็นต้น)
+    """
+    if backend == "native":
+        if "eye" in kinds:
+            import efficientnet_pytorch  # noqa: F401
+            import torch  # noqa: F401
+        if "finger" in kinds:
+            import tensorflow  # noqa: F401
+    elif backend == "onnxruntime":
+        import onnxruntime  # noqa: F401
+
+
+def load_eye_model(backend="native", model_dir="model", precision="fp32", num_threads=None):
+    _check_backend(backend, precision)
+    if backend == "native":
+        return TorchEyeModel(os.path.join(model_dir, EYE_WEIGHTS), num_threads=num_threads)
+    return OnnxModel(os.path.join(model_dir, onnx_filename(EYE_ONNX, precision)), apply_softmax=True, num_threads=num_threads)
+
+
+def load_eye_cascade_model(filename, backend="native", model_dir="model", arch="efficientnet-b0", num_threads=None):
+    """
+    โมเดล stage 1 แยกของ EyeCascade: ไฟล์ .onnx ใช้ onnxruntime (logits), ไฟล์อื่นเป็น state dict ของ EfficientNet ตาม arch
+    """
+    path = os.path.join(model_dir, filename)
+    if backend == "onnxruntime" or filename.endswith(".onnx"):
+        return OnnxModel(path, apply_softmax=True, num_threads=num_threads)
+    return TorchEyeModel(path, num_threads=num_threads, arch=arch)
+
+
+def load_finger_model(backend="native", model_dir="model", precision="fp32", num_threads=None):
+    _check_backend(backend, precision)
+    if backend == "native":
+        return KerasFingerModel(os.path.join(model_dir, FINGER_WEIGHTS), num_threads=num_threads)
+    return OnnxModel(os.path.join(model_dir, onnx_filename(FINGER_ONNX, precision)), num_threads=num_threads)
+
+
+def load_models(backend="native", model_dir="model", precision="fp32", eye_threads=None, finger_threads=None):
+    """
+    คืนค่า (eye_model, finger_model) ของ backend ที่เลือก
+    eye_threads / finger_threads: จำนวน intra-op thread ของแต่ละโมเดล (None = ค่าเริ่มต้นของ framework)
+    """
+    return (
+        load_eye_model(backend, model_dir, precision, num_threads=eye_threads),
+        load_finger_model(backend, model_dir, precision, num_threads=finger_threads),
+    )
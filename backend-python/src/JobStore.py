@@ -0,0 +1,124 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+JOB_STATES = ("queued", "running", "done", "failed")
+TERMINAL_STATES = ("done", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+class JobStore:
+    """
+    เก็บสถานะของ job (/jobs) และ event ของแต่ละ job ใน SQLite ไฟล์เดียว
+    ทุก worker process ของ gunicorn ใช้ไฟล์เดียวกัน จึง poll / stream job จาก worker ไหนก็ได้
+    job ที่เกิน ttl วินาทีหลังสร้างจะถือว่าไม่มีอยู่ และถูกลบเมื่อมีการสร้าง job ใหม่
+    """
+
+    def __init__(self, path="jobs.sqlite3", ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(_SCHEMA)
+
+    def _connect(self):
+        # หนึ่ง connection ต่อ thread ต่อ process (connection ของ sqlite3 ไม่ข้าม fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def create(self):
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        connection = self._connect()
+        connection.execute("DELETE FROM job_events WHERE job_id IN (SELECT id FROM jobs WHERE expires_at < ?)", (now,))
+        connection.execute("DELETE FROM jobs WHERE expires_at < ?", (now,))
+        connection.execute(
+            "INSERT INTO jobs (id, state, created_at, updated_at, expires_at) VALUES (?, 'queued', ?, ?, ?)",
+            (job_id, now, now, now + self.ttl),
+        )
+        return job_id
+
+    def set_state(self, job_id, state, result=None, error=None):
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state '{state}'")
+        self._connect().execute(
+            "UPDATE jobs SET state = ?, updated_at = ?, result = COALESCE(?, result), error = COALESCE(?, error) "
+            "WHERE id = ?",
+            (state, time.time(), json.dumps(result, ensure_ascii=False) if result is not None else None, error, job_id),
+        )
+
+    def add_event(self, job_id, event_type, data):
+        connection = self._connect()
+        # seq ต่อเนื่องภายใน job (ใช้เป็น id ของ SSE event สำหรับ Last-Event-ID)
+        connection.execute(
+            "INSERT INTO job_events (job_id, seq, created_at, type, data) "
+            "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ?, ? FROM job_events WHERE job_id = ?",
+            (job_id, time.time(), event_type, json.dumps(data, ensure_ascii=False), job_id),
+        )
+
+    def get(self, job_id):
+        """คืนค่า dict ของ job หรือ None ถ้าไม่มี / หมดอายุแล้ว"""
+        row = self._connect().execute(
+            "SELECT id, state, created_at, updated_at, expires_at, result, error FROM jobs "
+            "WHERE id = ? AND expires_at >= ?",
+            (job_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row[0],
+            "state": row[1],
+            "created_at": row[2],
+            "updated_at": row[3],
+            "expires_at": row[4],
+            "result": json.loads(row[5]) if row[5] is not None else None,
+            "error": row[6],
+        }
+
+    def events(self, job_id, after_seq=0, event_type=None):
+        query = "SELECT seq, type, data FROM job_events WHERE job_id = ? AND seq > ?"
+        params = [job_id, after_seq]
+        if event_type is not None:
+            query += " AND type = ?"
+            params.append(event_type)
+        rows = self._connect().execute(query + " ORDER BY seq", params).fetchall()
+        return [{"seq": seq, "type": kind, "data": json.loads(data)} for seq, kind, data in rows]
+
+    def stats(self):
+        rows = self._connect().execute(
+            "SELECT state, COUNT(*) FROM jobs WHERE expires_at >= ? GROUP BY state", (time.time(),)
+        ).fetchall()
+        counts = dict(rows)
+        return {state: counts.get(state, 0) for state in JOB_STATES}
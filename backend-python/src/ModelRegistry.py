@@ -0,0 +1,147 @@
+import logging
+import threading
+import time
+
+import numpy as np
+
+from src.InferenceBackend import FORK_SAFE_MODELS, import_backend, load_eye_cascade_model, load_eye_model, load_finger_model
+from src.Preprocess import EYE_SIZE, FINGER_SIZE
+
+logger = logging.getLogger(__name__)
+
+# โหมดการโหลดโมเดล
+# eager = โหลดทันทีตอน import app.py, background = โหลดใน thread แยก, lazy = โหลดเมื่อ request แรกต้องใช้
+# (หรือเมื่อ /readyz ถูกเรียกครั้งแรก เพื่อให้ orchestrator ที่รอ readiness ไม่รอตลอดไป)
+# preload = โหลดเฉพาะส่วนที่ข้าม fork ได้ใน master ของ gunicorn แล้วให้ worker โหลดส่วนที่เหลือ (gunicorn.conf.py)
+LOADING_MODES = ("eager", "background", "lazy", "preload")
+
+
+class ModelRegistry:
+    """
+    โหลดโมเดลตาและนิ้ว แล้ว warm-up ด้วย tensor ว่าง ก่อนรับ request จริง
+    เก็บเวลาของแต่ละขั้น (import, load, warm-up) ไว้ใน timings สำหรับ /readyz
+    cascade_size: ถ้าใช้ EyeCascade จะ warm-up stage 1 ที่ขนาดนี้ด้วย
+    cascade_model: ไฟล์โมเดล stage 1 แยกใน model_dir (None = ใช้โมเดลตาตัวเดิมที่ cascade_size)
+    """
+
+    def __init__(self, backend="native", model_dir="model", precision="fp32",
+                 eye_threads=None, finger_threads=None, eye_warmup_batch=2, finger_warmup_batch=10,
+                 cascade_size=None, cascade_model=None, cascade_arch="efficientnet-b0"):
+        self.backend = backend
+        self.model_dir = model_dir
+        self.precision = precision
+        self.eye_threads = eye_threads
+        self.finger_threads = finger_threads
+        self.eye_warmup_batch = eye_warmup_batch
+        self.finger_warmup_batch = finger_warmup_batch
+        self.cascade_size = cascade_size
+        self.cascade_model = cascade_model
+        self.cascade_arch = cascade_arch
+
+        self.state = "not_started"
+        self.error = None
+        self.timings = {}
+        self._models = None
+        self._preloaded_eye = None
+        self.eye_stage1 = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def _phase(self, name, func):
+        started = time.perf_counter()
+        result = func()
+        self.timings[name] = round(time.perf_counter() - started, 3)
+        return result
+
+    def preload(self):
+        """
+        โหลด weight ที่ใช้ร่วมกันข้าม fork ได้ (FORK_SAFE_MODELS) ใน master process ก่อน fork worker
+        worker ได้ weight ชุดเดียวกันแบบ copy-on-write แล้วเรียก load() เพื่อโหลดส่วนที่เหลือและ warm-up
+        ไม่รัน forward pass ที่นี่ เพราะ thread pool ของ OpenMP ที่สร้างแล้วจะทำให้ worker ค้าง
+        """
+        with self._lock:
+            if self.state != "not_started":
+                return
+            try:
+                if "eye" in FORK_SAFE_MODELS.get(self.backend, ()):
+                    self._preloaded_eye = self._phase("preload_eye", lambda: load_eye_model(
+                        self.backend, self.model_dir, self.precision, num_threads=self.eye_threads))
+                self.state = "preloaded"
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                self._ready.set()
+                logger.exception("Model preloading failed: %s", e)
+
+    def load(self):
+        """โหลดและ warm-up โมเดล (เรียกซ้ำได้ จะโหลดแค่ครั้งเดียว)"""
+        with self._lock:
+            if self._models is not None or self.state == "failed":
+                return
+            self.state = "loading"
+            try:
+                self._phase("import", lambda: import_backend(self.backend))
+                eye = self._preloaded_eye or self._phase("load_eye", lambda: load_eye_model(
+                    self.backend, self.model_dir, self.precision, num_threads=self.eye_threads))
+                finger = self._phase("load_finger", lambda: load_finger_model(
+                    self.backend, self.model_dir, self.precision, num_threads=self.finger_threads))
+                stage1 = self._phase("load_eye_cascade", lambda: load_eye_cascade_model(
+                    self.cascade_model, self.backend, self.model_dir, self.cascade_arch,
+                    num_threads=self.eye_threads)) if self.cascade_model else None
+
+                self._warmup(eye, finger, stage1)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.exception("Model loading failed: %s", e)
+            finally:
+                self._ready.set()
+
+    def _warmup(self, eye, finger, stage1=None):
+        self.state = "warming_up"
+        # รันครั้งแรกด้วย tensor ว่าง เพื่อให้ graph / kernel ถูกเตรียมก่อน request จริง
+        self._phase("warmup_eye", lambda: eye(
+            np.zeros((self.eye_warmup_batch, 3, EYE_SIZE, EYE_SIZE), dtype=np.float32)))
+        self._phase("warmup_finger", lambda: finger(
+            np.zeros((self.finger_warmup_batch, FINGER_SIZE, FINGER_SIZE, 3), dtype=np.float32)))
+        if self.cascade_size:
+            # ตรวจด้วยว่าโมเดลรับ input ขนาดนี้ได้ (ไฟล์ ONNX ต้อง export แบบ spatial axes เป็น dynamic)
+            self._phase("warmup_eye_cascade", lambda: (stage1 or eye)(
+                np.zeros((self.eye_warmup_batch, 3, self.cascade_size, self.cascade_size), dtype=np.float32)))
+
+        self.eye_stage1 = stage1 or eye
+        self._models = (eye, finger)
+        self.state = "ready"
+        logger.info("Models ready (%s/%s): %s", self.backend, self.precision, self.timings)
+
+    def set_models(self, eye, finger, stage1=None):
+        """ใช้โมเดลที่สร้างไว้แล้วแทนการโหลดจากไฟล์ (เช่น stand-in models ของ benchmark)"""
+        with self._lock:
+            self._warmup(eye, finger, stage1)
+            self._ready.set()
+
+    def start_background(self):
+        threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+
+    def get(self, timeout=None):
+        """คืนค่า (eye_model, finger_model) รอจนโหลดเสร็จถ้ายังไม่พร้อม"""
+        if self._models is None and self.state in ("not_started", "preloaded"):
+            self.load()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Models are still loading")
+        if self._models is None:
+            raise RuntimeError(f"Models failed to load: {self.error}")
+        return self._models
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        return {
+            "state": self.state,
+            "backend": self.backend,
+            "precision": self.precision,
+            "error": self.error,
+            "timings_s": dict(self.timings),
+        }
@@ -0,0 +1,435 @@
+"""
+โมเดลตา (PyTorch) และโมเดลนิ้ว (TensorFlow) ใน process แยกของตัวเอง (INFERENCE_MODE=workers)
+
+web process ไม่ import torch / tensorflow เลย แต่ละ framework มี thread pool และหน่วยความจำของตัวเอง
+ไม่แย่ง core กันและถ้า framework ใด crash จะเสียแค่ process นั้น (ถูก restart) ไม่ใช่ทั้ง service
+
+    python -m src.ModelWorkers --fd <socket fd> --kind eye --spec '<json>'   (ถูกเรียกโดย ModelWorker เท่านั้น)
+
+batch ที่ preprocess แล้วถูกเขียนลง multiprocessing.shared_memory ของแต่ละ worker ครั้งเดียว (ไม่ pickle tensor)
+socket ส่งแค่ข้อความควบคุม (ชื่อ shared memory, shape) และผล softmax ที่มีขนาดเล็ก
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+from src.InferenceBackend import import_backend, load_eye_cascade_model, load_eye_model, load_finger_model
+from src.Observability import MODEL_WORKER_RESTARTS, configure_logging
+from src.Preprocess import EYE_SIZE, FINGER_SIZE
+
+logger = logging.getLogger(__name__)
+
+# inprocess = โหลดโมเดลใน web process (ModelRegistry), workers = WorkerModelRegistry
+INFERENCE_MODES = ("inprocess", "workers")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# รอก่อน restart worker ที่ตาย เพิ่มเป็นสองเท่าถ้าตายซ้ำภายใน _STABLE_SECONDS
+_RESTART_BACKOFF = 1.0
+_RESTART_BACKOFF_MAX = 30.0
+_STABLE_SECONDS = 60.0
+
+
+def _attach(name):
+    """เปิด shared memory ที่ web process สร้างไว้ โดยไม่ให้ resource tracker ของ worker ลบทิ้งตอน worker ออก"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class ModelWorker:
+    """
+    หนึ่ง process ต่อโมเดล (kind = eye หรือ finger) ที่ supervisor thread restart ให้เมื่อ process ตาย
+    run(model, batch) รันทีละ batch (process เดียวรันได้ครั้งละ batch อยู่แล้ว)
+    spec: ค่าที่ส่งให้ worker (backend, model_dir, precision, num_threads, cascade_*, warmup shapes)
+    """
+
+    def __init__(self, kind, spec, start_timeout=300.0, call_timeout=120.0):
+        self.kind = kind
+        self.spec = spec
+        self.start_timeout = start_timeout
+        self.call_timeout = call_timeout
+
+        self.state = "not_started"
+        self.error = None
+        self.timings = {}
+        self.restarts = 0
+        self.batches = 0
+        self.failures = 0
+        self._process = None
+        self._conn = None
+        self._shm = None
+        self._started_at = 0.0
+        self._stopping = False
+        self._lock = threading.Lock()
+        self._supervisor = None
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process is not None else None
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def _spawn(self):
+        parent, child = socket.socketpair()
+        command = [sys.executable, "-m", "src.ModelWorkers", "--fd", str(child.fileno()),
+                   "--kind", self.kind, "--spec", json.dumps(self.spec)]
+        started = time.perf_counter()
+        try:
+            # session ใหม่: Ctrl-C ของ terminal ไม่ไปถึง worker (worker ออกเองเมื่อ socket ถูกปิด)
+            process = subprocess.Popen(command, cwd=ROOT, pass_fds=(child.fileno(),), start_new_session=True)
+        finally:
+            child.close()
+        conn = Connection(parent.detach())
+        try:
+            if not conn.poll(self.start_timeout):
+                raise TimeoutError(f"{self.kind} model worker did not start within {self.start_timeout:.0f}s")
+            status, payload = conn.recv()
+        except Exception:
+            conn.close()
+            process.kill()
+            process.wait()
+            raise
+        if status != "ready":
+            conn.close()
+            process.wait()
+            raise RuntimeError(payload)
+
+        self._process, self._conn = process, conn
+        self._started_at = time.monotonic()
+        self.timings = {f"start_{self.kind}_worker": round(time.perf_counter() - started, 3), **payload}
+        self.state = "ready"
+        self.error = None
+        logger.info("%s model worker ready (pid %s): %s", self.kind, process.pid, self.timings)
+
+    def start(self):
+        """เริ่ม process แล้วรอจนโหลดและ warm-up เสร็จ raise ถ้าไม่สำเร็จ"""
+        with self._lock:
+            if self._process is not None:
+                return
+            self.state = "starting"
+            try:
+                self._spawn()
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                raise
+        self._supervisor = threading.Thread(target=self._supervise, name=f"model-worker-{self.kind}", daemon=True)
+        self._supervisor.start()
+
+    def _supervise(self):
+        backoff = _RESTART_BACKOFF
+        while not self._stopping:
+            process = self._process
+            code = process.wait()
+            if self._stopping:
+                return
+            logger.error("%s model worker (pid %s) exited with code %s, restarting", self.kind, process.pid, code)
+            with self._lock:
+                self._close_conn()
+                self.state = "restarting"
+            if time.monotonic() - self._started_at > _STABLE_SECONDS:
+                backoff = _RESTART_BACKOFF
+            while not self._stopping:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, _RESTART_BACKOFF_MAX)
+                with self._lock:
+                    if self._stopping:
+                        return
+                    try:
+                        self._spawn()
+                        break
+                    except Exception as e:
+                        self.error = str(e)
+                        logger.error("Cannot restart %s model worker: %s", self.kind, e)
+            self.restarts += 1
+            MODEL_WORKER_RESTARTS.labels(self.kind).inc()
+
+    def _close_conn(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _buffer(self, nbytes):
+        # ขยายเมื่อ batch ใหญ่กว่าเดิม worker เปิด buffer ใหม่ตามชื่อที่ส่งไปกับ request
+        if self._shm is None or self._shm.size < nbytes:
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        return self._shm
+
+    def run(self, model, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if not self._lock.acquire(timeout=self.call_timeout):
+            raise TimeoutError(f"{self.kind} model worker is busy")
+        try:
+            if self._conn is None:
+                raise RuntimeError(f"{self.kind} model worker is {self.state}: {self.error}")
+            shm = self._buffer(batch.nbytes)
+            np.ndarray(batch.shape, dtype=np.float32, buffer=shm.buf)[...] = batch
+            try:
+                self._conn.send(("run", model, shm.name, batch.shape))
+                if not self._conn.poll(self.call_timeout):
+                    raise TimeoutError(f"no response within {self.call_timeout:.0f}s")
+                status, payload = self._conn.recv()
+            except (OSError, EOFError, TimeoutError) as e:
+                # process ตายหรือค้าง: ฆ่าทิ้งแล้วให้ supervisor เริ่มใหม่ batch นี้ถือว่า error
+                self.failures += 1
+                self._close_conn()
+                self.state = "restarting"
+                self._process.kill()
+                raise RuntimeError(f"{self.kind} model worker failed: {e}") from e
+            if status != "ok":
+                self.failures += 1
+                raise RuntimeError(payload)
+            self.batches += 1
+            return payload
+        finally:
+            self._lock.release()
+
+    def stop(self, timeout=5.0):
+        self._stopping = True
+        with self._lock:
+            self._close_conn()  # worker ออกเองเมื่ออ่านได้ EOF
+            if self._process is not None:
+                try:
+                    self._process.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    self._process.kill()
+                    self._process.wait()
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+                self._shm = None
+            self.state = "stopped"
+
+    def stats(self):
+        return {
+            "kind": self.kind,
+            "state": self.state,
+            "pid": self.pid,
+            "restarts": self.restarts,
+            "batches": self.batches,
+            "failures": self.failures,
+            "buffer_bytes": self._shm.size if self._shm is not None else 0,
+            "error": self.error,
+        }
+
+
+class RemoteModel:
+    """callable แบบเดียวกับโมเดลใน process (batch -> softmax) แต่รันใน ModelWorker"""
+
+    def __init__(self, worker, name):
+        self.worker = worker
+        self.name = name
+
+    def __call__(self, batch):
+        return self.worker.run(self.name, batch)
+
+
+class WorkerModelRegistry:
+    """
+    interface เดียวกับ ModelRegistry (load / start_background / get / ready / status) ยกเว้น set_models
+    (โมเดลที่สร้างใน web process ส่งเข้า worker ไม่ได้) โหลดโมเดลใน ModelWorker สองตัว (eye, finger) พร้อมกัน
+    get() คืนค่า RemoteModel
+    process ของโมเดลเป็นของแต่ละ web process: ภายใต้ gunicorn preload() ไม่ทำอะไร แล้วแต่ละ worker
+    เริ่ม process ของตัวเองหลัง fork (post_fork)
+    """
+
+    def __init__(self, backend="native", model_dir="model", precision="fp32",
+                 eye_threads=None, finger_threads=None, eye_warmup_batch=2, finger_warmup_batch=10,
+                 cascade_size=None, cascade_model=None, cascade_arch="efficientnet-b0",
+                 start_timeout=300.0, call_timeout=120.0):
+        self.backend = backend
+        self.precision = precision
+        common = {"backend": backend, "model_dir": model_dir, "precision": precision}
+        eye_warmup = {"eye": [eye_warmup_batch, 3, EYE_SIZE, EYE_SIZE]}
+        if cascade_size:
+            eye_warmup["eye_stage1"] = [eye_warmup_batch, 3, cascade_size, cascade_size]
+        self.workers = {
+            "eye": ModelWorker("eye", dict(common, num_threads=eye_threads, cascade_model=cascade_model,
+                                           cascade_arch=cascade_arch, warmup=eye_warmup),
+                               start_timeout, call_timeout),
+            "finger": ModelWorker("finger", dict(common, num_threads=finger_threads,
+                                                 warmup={"finger": [finger_warmup_batch, FINGER_SIZE, FINGER_SIZE, 3]}),
+                                  start_timeout, call_timeout),
+        }
+
+        self.state = "not_started"
+        self.error = None
+        self._models = None
+        self.eye_stage1 = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    @property
+    def timings(self):
+        timings = {}
+        for worker in self.workers.values():
+            timings.update(worker.timings)
+        return timings
+
+    def preload(self):
+        # ไม่มีอะไรให้ใช้ร่วมกันข้าม fork: process ของโมเดลต้องเริ่มหลัง fork
+        with self._lock:
+            if self.state == "not_started":
+                self.state = "preloaded"
+
+    def load(self):
+        """เริ่ม worker ทั้งสองพร้อมกันแล้วรอจน warm-up เสร็จ (เรียกซ้ำได้ จะเริ่มแค่ครั้งเดียว)"""
+        with self._lock:
+            if self._models is not None or self.state == "failed":
+                return
+            self.state = "loading"
+            try:
+                with ThreadPoolExecutor(len(self.workers)) as pool:
+                    for future in [pool.submit(worker.start) for worker in self.workers.values()]:
+                        future.result()
+                eye, finger = self.workers["eye"], self.workers["finger"]
+                self.eye_stage1 = RemoteModel(eye, "eye_stage1")
+                self._models = (RemoteModel(eye, "eye"), RemoteModel(finger, "finger"))
+                self.state = "ready"
+                atexit.register(self.close)
+                logger.info("Model workers ready (%s/%s): %s", self.backend, self.precision, self.timings)
+            except Exception as e:
+                self.state = "failed"
+                self.error = str(e)
+                logger.exception("Model workers failed to start: %s", e)
+                self.close()
+            finally:
+                self._ready.set()
+
+    def start_background(self):
+        threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+
+    def get(self, timeout=None):
+        """คืนค่า (eye_model, finger_model) รอจนเริ่มเสร็จถ้ายังไม่พร้อม"""
+        if self._models is None and self.state in ("not_started", "preloaded"):
+            self.load()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("Models are still loading")
+        if self._models is None:
+            raise RuntimeError(f"Models failed to load: {self.error}")
+        return self._models
+
+    @property
+    def ready(self):
+        # worker ที่กำลัง restart ทำให้ /readyz เป็น 503 จนกว่าจะกลับมา
+        return self.state == "ready" and all(worker.ready for worker in self.workers.values())
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.stop()
+
+    def stats(self):
+        stats = {}
+        for kind, worker in self.workers.items():
+            stats[f"{kind}_ready"] = int(worker.ready)
+            stats[f"{kind}_restarts"] = worker.restarts
+            stats[f"{kind}_batches"] = worker.batches
+            stats[f"{kind}_failures"] = worker.failures
+        return stats
+
+    def status(self):
+        return {
+            "state": self.state if self.state != "ready" or self.ready else "degraded",
+            "mode": "workers",
+            "backend": self.backend,
+            "precision": self.precision,
+            "error": self.error,
+            "timings_s": self.timings,
+            "workers": [worker.stats() for worker in self.workers.values()],
+        }
+
+
+def _load_models(kind, spec, timings):
+    def phase(name, func):
+        started = time.perf_counter()
+        result = func()
+        timings[name] = round(time.perf_counter() - started, 3)
+        return result
+
+    backend, model_dir, precision, threads = spec["backend"], spec["model_dir"], spec["precision"], spec["num_threads"]
+    phase(f"import_{kind}", lambda: import_backend(backend, kinds=(kind,)))
+    if kind == "finger":
+        return {"finger": phase("load_finger", lambda: load_finger_model(backend, model_dir, precision, num_threads=threads))}
+    eye = phase("load_eye", lambda: load_eye_model(backend, model_dir, precision, num_threads=threads))
+    stage1 = phase("load_eye_cascade", lambda: load_eye_cascade_model(
+        spec["cascade_model"], backend, model_dir, spec["cascade_arch"],
+        num_threads=threads)) if spec.get("cascade_model") else None
+    return {"eye": eye, "eye_stage1": stage1 or eye}
+
+
+def _run(model, shm, shape):
+    # view ของ shared memory อยู่แค่ใน function นี้ ปิด shm เดิมได้เมื่อ web process ขยาย buffer
+    batch = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    return np.asarray(model(batch), dtype=np.float32)
+
+
+def serve(conn, kind, spec):
+    """ฝั่ง worker: โหลด + warm-up แล้วรัน batch จาก shared memory จนกว่า socket จะถูกปิด"""
+    timings = {}
+    try:
+        models = _load_models(kind, spec, timings)
+        for name, shape in spec["warmup"].items():
+            started = time.perf_counter()
+            models[name](np.zeros(shape, dtype=np.float32))
+            timings[f"warmup_{name.replace('_stage1', '_cascade')}"] = round(time.perf_counter() - started, 3)
+    except Exception as e:
+        logger.exception("Cannot load %s model: %s", kind, e)
+        conn.send(("failed", f"{type(e).__name__}: {e}"))
+        return 1
+    conn.send(("ready", timings))
+
+    shm = None
+    while True:
+        try:
+            _, name, shm_name, shape = conn.recv()
+        except (EOFError, OSError):
+            break
+        try:
+            if shm is None or shm.name != shm_name:
+                if shm is not None:
+                    shm.close()
+                shm = _attach(shm_name)
+            reply = ("ok", _run(models[name], shm, shape))
+        except Exception as e:
+            logger.exception("%s model failed: %s", kind, e)
+            reply = ("error", f"{type(e).__name__}: {e}")
+        conn.send(reply)
+    if shm is not None:
+        shm.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Model worker process (started by ModelWorker)")
+    parser.add_argument("--fd", type=int, required=True)
+    parser.add_argument("--kind", required=True, choices=("eye", "finger"))
+    parser.add_argument("--spec", required=True)
+    args = parser.parse_args()
+
+    configure_logging()
+    sys.exit(serve(Connection(args.fd), args.kind, json.loads(args.spec)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 12, 16, 24, 32, 48, 64)
+
+registry = CollectorRegistry()
+
+REQUESTS = Counter(
+    "biotrace_requests_total", "HTTP requests by endpoint and status code",
+    ["endpoint", "status"], registry=registry,
+)
+REQUEST_LATENCY = Histogram(
+    "biotrace_request_seconds", "End-to-end request latency",
+    ["endpoint"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+IMAGES = Counter(
+    "biotrace_images_total", "Images received for prediction",
+    ["kind"], registry=registry,
+)
+ERRORS = Counter(
+    "biotrace_errors_total", "Errors by pipeline stage",
+    ["stage"], registry=registry,
+)
+STAGE_LATENCY = Histogram(
+    "biotrace_stage_seconds", "Latency of each pipeline stage (per image for decode/preprocess, per batch for inference)",
+    ["stage"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+MODEL_BATCH_SIZE = Histogram(
+    "biotrace_model_batch_size", "Number of images per model forward pass",
+    ["model"], buckets=BATCH_SIZE_BUCKETS, registry=registry,
+)
+EYE_CASCADE_IMAGES = Counter(
+    "biotrace_eye_cascade_images_total", "Eye images answered by cascade stage 1 or escalated to the full model",
+    ["outcome"], registry=registry,
+)
+QUALITY_IMAGES = Counter(
+    "biotrace_quality_images_total", "Images checked by the quality gate by outcome (passed / rejected)",
+    ["kind", "outcome"], registry=registry,
+)
+QUALITY_REJECTIONS = Counter(
+    "biotrace_quality_rejections_total", "Quality gate failures by reason (an image can fail several checks)",
+    ["kind", "reason"], registry=registry,
+)
+QUALITY_SKIPPED_IMAGES = Counter(
+    "biotrace_quality_skipped_images_total", "Images not sent to the models because their request failed the quality gate",
+    ["kind"], registry=registry,
+)
+MODEL_WORKER_RESTARTS = Counter(
+    "biotrace_model_worker_restarts_total", "Model worker processes restarted after exiting or hanging",
+    ["kind"], registry=registry,
+)
+BATCH_QUEUE_WAIT = Histogram(
+    "biotrace_batch_queue_wait_seconds", "Time an image waited in the batching queue",
+    ["model"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+
+
+@contextmanager
+def timed(stage):
+    """วัดเวลาของ stage ลง STAGE_LATENCY และนับ error ของ stage นั้นถ้ามี exception"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.labels(stage).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+
+
+def observe_stage(stage, seconds, ok=True):
+    """บันทึกเวลาของ stage ที่วัดจากที่อื่น (เช่น callback ของ FirebaseWriter)"""
+    STAGE_LATENCY.labels(stage).observe(seconds)
+    if not ok:
+        ERRORS.labels(stage).inc()
+
+
+def observe_batch(model, size, queue_waits):
+    MODEL_BATCH_SIZE.labels(model).observe(size)
+    for wait in queue_waits:
+        BATCH_QUEUE_WAIT.labels(model).observe(wait)
+
+
+class StatsCollector:
+    """ส่งค่าจาก stats() ของ component ต่าง ๆ (cache, Firebase writer, ...) ออกเป็น gauge"""
+
+    def __init__(self, prefix, stats_func):
+        self.prefix = prefix
+        self.stats_func = stats_func
+
+    def collect(self):
+        stats = self.stats_func() or {}
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            yield GaugeMetricFamily(f"biotrace_{self.prefix}_{key}", f"{self.prefix} {key}", value=value)
+
+
+def register_stats(prefix, stats_func):
+    registry.register(StatsCollector(prefix, stats_func))
+
+
+def exposition_registry():
+    """
+    registry สำหรับ /metrics
+    ถ้ารันหลาย worker (ตั้ง PROMETHEUS_MULTIPROC_DIR ก่อน import) จะรวม counter / histogram จากไฟล์ของทุก worker
+    ส่วน gauge จาก register_stats เป็นค่าของแต่ละ process จึงไม่รวมในโหมดนี้ (ดูได้ที่ /cache-stats ฯลฯ)
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return registry
+    combined = CollectorRegistry()
+    multiprocess.MultiProcessCollector(combined)
+    return combined
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in getattr(record, "fields", {}).items():
+            entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging():
+    """
+    LOG_LEVEL: DEBUG / INFO / WARNING / ERROR (ค่าเริ่มต้น INFO)
+    LOG_FORMAT: text หรือ json (หนึ่งบรรทัดต่อหนึ่ง log สำหรับเก็บรวมใน log pipeline)
+    """
+    handler = logging.StreamHandler()
+    if os.environ.get("LOG_FORMAT", "text") == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
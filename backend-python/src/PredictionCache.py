@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+logger = logging.getLogger("biotrace")
+
+
+class PredictionCache:
+    """
+    cache ผลทำนายโดยใช้ hash ของ bytes ภาพ + เวอร์ชันโมเดลเป็น key
+
+    - ชั้นแรกเป็น LRU ในหน่วยความจำ (max_entries)
+    - ชั้นที่สองเป็นไฟล์ JSON ใน disk_dir (ถ้ากำหนด) มี TTL และจำกัดจำนวนไฟล์
+    - request ที่ส่งภาพเดียวกันเข้ามาพร้อมกันจะรอผลจากตัวที่คำนวณอยู่ ไม่คำนวณซ้ำ
+    """
+
+    def __init__(self, model_version, max_entries=4096, disk_dir=None, disk_ttl=7 * 86400, disk_max_entries=100000):
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_ttl = disk_ttl
+        self.disk_max_entries = disk_max_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._disk_writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.coalesced = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, kind, data):
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{kind}-{self.model_version}-{digest}"
+
+    def get_or_compute_many(self, kind, datas, compute):
+        """
+        datas: list ของ bytes ภาพ
+        compute: ฟังก์ชันรับ list ของ bytes ที่ยังไม่มีใน cache แล้วคืน list ผลลัพธ์ตามลำดับ
+        คืนค่า list ผลลัพธ์ตามลำดับของ datas
+        """
+        keys = [self.key(kind, data) for data in datas]
+        results = [None] * len(keys)
+        waiting = []
+        owned = {}
+
+        with self._lock:
+            for index, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[index] = self._memory[key]
+                    self.memory_hits += 1
+                elif key in self._inflight:
+                    waiting.append((index, self._inflight[key]))
+                    self.coalesced += 1
+                elif key in owned:
+                    # ภาพเดียวกันซ้ำใน request เดียวกัน
+                    waiting.append((index, owned[key]))
+                    self.coalesced += 1
+                else:
+                    future = Future()
+                    self._inflight[key] = future
+                    owned[key] = future
+
+        to_compute = []
+        for key, future in owned.items():
+            value = self._read_disk(key)
+            if value is not None:
+                self._finish(key, future, value)
+                with self._lock:
+                    self.disk_hits += 1
+            else:
+                to_compute.append(key)
+
+        if to_compute:
+            with self._lock:
+                self.misses += len(to_compute)
+            first_index = {}
+            for index, key in enumerate(keys):
+                first_index.setdefault(key, index)
+            try:
+                values = compute([datas[first_index[key]] for key in to_compute])
+            except Exception as e:
+                with self._lock:
+                    for key in to_compute:
+                        self._inflight.pop(key, None)
+                for key in to_compute:
+                    owned[key].set_exception(e)
+                raise
+            for key, value in zip(to_compute, values):
+                self._finish(key, owned[key], value)
+                try:
+                    self._write_disk(key, value)
+                except OSError as e:
+                    # ผลทำนายได้แล้ว เขียน cache ลง disk ไม่ได้ไม่ควรทำให้ request ล้มเหลว
+                    logger.warning("Prediction cache disk write failed for %s: %s", key, e)
+
+        for index, key in enumerate(keys):
+            if results[index] is None and key in owned:
+                results[index] = owned[key].result()
+        for index, future in waiting:
+            results[index] = future.result()
+        return results
+
+    def _finish(self, key, future, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key[-2:], f"{key}.json")
+
+    def _read_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl:
+                os.remove(path)
+                return None
+            with open(path, encoding="utf-8") as f:
+                return tuple(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def _write_disk(self, key, value):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(list(value), f)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_writes += 1
+            should_evict = self._disk_writes % 1000 == 0
+        if should_evict:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        # ลบไฟล์ที่หมดอายุ แล้วลบไฟล์เก่าสุดจนเหลือไม่เกิน disk_max_entries
+        entries = []
+        removed = 0
+        now = time.time()
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                    if now - mtime > self.disk_ttl:
+                        os.remove(path)
+                        removed += 1
+                    else:
+                        entries.append((mtime, path))
+                except OSError:
+                    continue
+        entries.sort()
+        for _, path in entries[:max(0, len(entries) - self.disk_max_entries)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.evictions += removed
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.coalesced + self.misses
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "coalesced": self.coalesced,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+            }
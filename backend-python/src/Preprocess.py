@@ -0,0 +1,155 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from src.ImageIO import decode_image
+
+EYE_SIZE = 456
+FINGER_SIZE = 150
+
+# ค่าเดียวกับ torchvision Normalize ที่ใช้ตอนเทรน EfficientNet-B4
+EYE_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+EYE_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+# (x / 255 - mean) / std = x * EYE_SCALE + EYE_OFFSET (ลำดับช่องสี RGB)
+EYE_SCALE = (1.0 / (255.0 * EYE_STD)).astype(np.float32)
+EYE_OFFSET = (-EYE_MEAN / EYE_STD).astype(np.float32)
+
+# decode JPEG ขนาดใหญ่แบบลดความละเอียด (IMREAD_REDUCED_COLOR_*) ก่อน resize
+# ผลต่างจาก decode เต็มขนาดเฉลี่ยประมาณ 1 ระดับสีต่อ pixel ตั้ง REDUCED_DECODE=0 ถ้าต้องการผลตรงกับแบบเดิม
+REDUCED_DECODE = os.environ.get("REDUCED_DECODE", "1") == "1"
+
+# เพิ่มเลขนี้เมื่อแก้ขั้นตอน preprocess ที่ทำให้ input ของโมเดลเปลี่ยน (cache ผลทำนายเก่าจะไม่ถูกใช้)
+PREPROCESS_VERSION = 1
+
+
+def preprocess_signature():
+    """
+    ส่วนของ key ของ PredictionCache ที่มาจากการตั้งค่า preprocess (เช่น REDUCED_DECODE)
+    flag ใหม่ที่เปลี่ยน input ของโมเดลต้องเพิ่มในนี้ด้วย
+    """
+    return f"pp{PREPROCESS_VERSION}{'r' if REDUCED_DECODE else 'f'}"
+
+
+def decode_eye(image_source, reduced=False):
+    image = decode_image(image_source, min_size=EYE_SIZE if reduced else None)
+    if image is None:
+        raise ValueError("Cannot read eye image")
+    return image
+
+
+def prepare_eye(image):
+    """ภาพ BGR ที่ decode แล้ว -> RGB uint8 ขนาด 456x456"""
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = cv2.resize(image, (EYE_SIZE, EYE_SIZE))
+    return image
+
+
+def preprocess_image_eye(image_source):
+    return prepare_eye(decode_eye(image_source))
+
+
+def transform_eye(image):
+    """
+    เทียบเท่า transforms.ToTensor() + transforms.Normalize(...) แต่ใช้ NumPy
+    รับภาพ RGB uint8 (H, W, 3) คืนค่า float32 (3, H, W)
+    """
+    tensor = (image.astype(np.float32) / 255.0 - EYE_MEAN) / EYE_STD
+    return np.ascontiguousarray(tensor.transpose(2, 0, 1))
+
+
+def decode_finger(image_source, reduced=False):
+    image = decode_image(image_source, min_size=FINGER_SIZE if reduced else None)
+    if image is None:
+        raise ValueError("Cannot read finger image")
+    return image
+
+
+def prepare_finger(image):
+    """ภาพ BGR ที่ decode แล้ว -> RGB float32 (0-1) ขนาด 150x150"""
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = cv2.resize(image, (FINGER_SIZE, FINGER_SIZE))
+    image = image.astype(np.float32) / 255.0
+    return image
+
+
+def preprocess_image_finger(image_source):
+    return prepare_finger(decode_finger(image_source))
+
+
+# ---------------------------------------------------------------------------
+# fast path: เก็บภาพที่ resize แล้วเป็น BGR uint8 (เล็กกว่า float32 4 เท่า) แล้วแปลงสี + normalize
+# ทีละ batch ครั้งเดียวลง buffer ที่ใช้ซ้ำ ผลตรงกับ transform_eye(preprocess_image_eye(...)) /
+# preprocess_image_finger(...) ภายใน 1e-5 เมื่อไม่ใช้ reduced decode
+# ---------------------------------------------------------------------------
+
+def resize_eye(image):
+    """ภาพ BGR ที่ decode แล้ว -> BGR uint8 ขนาด 456x456 (ยังไม่แปลงสี)"""
+    return cv2.resize(image, (EYE_SIZE, EYE_SIZE))
+
+
+def resize_finger(image):
+    """ภาพ BGR ที่ decode แล้ว -> BGR uint8 ขนาด 150x150 (ยังไม่แปลงสี)"""
+    return cv2.resize(image, (FINGER_SIZE, FINGER_SIZE))
+
+
+def load_eye(image_source, reduced=REDUCED_DECODE):
+    return resize_eye(decode_eye(image_source, reduced))
+
+
+def load_finger(image_source, reduced=REDUCED_DECODE):
+    return resize_finger(decode_finger(image_source, reduced))
+
+
+class BatchBuffer:
+    """
+    buffer float32 สำหรับ input ของโมเดลที่ใช้ซ้ำระหว่าง batch (แยกต่อ thread)
+    ขยายเมื่อ batch ใหญ่กว่าเดิม คืนค่า view ของ N แถวแรก
+    """
+
+    def __init__(self, item_shape, dtype=np.float32):
+        self.item_shape = tuple(item_shape)
+        self.dtype = dtype
+        self._local = threading.local()
+
+    def get(self, n):
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or len(buffer) < n:
+            buffer = np.empty((n,) + self.item_shape, dtype=self.dtype)
+            self._local.buffer = buffer
+        return buffer[:n]
+
+
+_eye_buffer = BatchBuffer((3, EYE_SIZE, EYE_SIZE))
+_finger_buffer = BatchBuffer((FINGER_SIZE, FINGER_SIZE, 3))
+
+
+def normalize_eye_batch(images, out=None):
+    """
+    list ของภาพ BGR uint8 (456, 456, 3) -> float32 (N, 3, 456, 456) RGB ที่ normalize แล้ว
+    out=None ใช้ buffer ของ thread นี้ (ค่าจะถูกเขียนทับใน batch ถัดไปของ thread เดียวกัน)
+    """
+    if out is None:
+        out = _eye_buffer.get(len(images))
+    for i, image in enumerate(images):
+        planes = cv2.split(image)
+        for c in range(3):
+            # BGR -> RGB, scale และ normalize ในคำสั่งเดียว เขียนลง out โดยตรง
+            plane = planes[2 - c]
+            cv2.addWeighted(plane, float(EYE_SCALE[c]), plane, 0.0, float(EYE_OFFSET[c]),
+                            dst=out[i, c], dtype=cv2.CV_32F)
+    return out
+
+
+def normalize_finger_batch(images, out=None):
+    """
+    list ของภาพ BGR uint8 (150, 150, 3) -> float32 (N, 150, 150, 3) RGB ช่วง 0-1
+    out=None ใช้ buffer ของ thread นี้ (ค่าจะถูกเขียนทับใน batch ถัดไปของ thread เดียวกัน)
+    """
+    if out is None:
+        out = _finger_buffer.get(len(images))
+    for i, image in enumerate(images):
+        np.multiply(image[:, :, ::-1], np.float32(1.0 / 255.0), out=out[i], dtype=np.float32)
+    return out
@@ -0,0 +1,202 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from src.ImageIO import decode_image
+from src.Observability import QUALITY_IMAGES, QUALITY_REJECTIONS, STAGE_LATENCY
+
+# off = ไม่ตรวจ, shadow = ตรวจและนับ / log แต่ยังทำนายตามปกติ, enforce = ภาพไม่ผ่านตอบ 400 โดยไม่รันโมเดล
+QUALITY_GATE_MODES = ("off", "shadow", "enforce")
+
+# ขนาดของภาพ grayscale ที่ใช้ตรวจ (decode แบบลดความละเอียดแล้ว resize)
+EYE_QUALITY_SIZE = 256
+FINGER_QUALITY_SIZE = 150
+
+DEFAULT_THRESHOLDS = {
+    # ความคมชัด: variance ของ Laplacian (ตาวัดเฉพาะในวงจอประสาทตา ไม่รวมขอบวง)
+    "eye_min_sharpness": 8.0,
+    "finger_min_sharpness": 30.0,
+    # ความสว่างเฉลี่ย (0-255) และสัดส่วน pixel ที่สว่างจนล้น (>= 250)
+    "eye_min_brightness": 25.0,
+    "eye_max_brightness": 215.0,
+    "finger_min_brightness": 30.0,
+    "finger_max_brightness": 235.0,
+    "max_clipped_fraction": 0.25,
+    # fundus: วงสว่างบนพื้นมืด มุมภาพมืดอย่างน้อย 3 มุม และวงเต็มวงกลมที่ล้อมรอบพอสมควร
+    "eye_min_foreground": 0.2,
+    "eye_min_dark_corners": 3,
+    "eye_min_circle_fill": 0.55,
+    # ลายนิ้วมือ: สัดส่วน block ที่มีเส้นขนานทิศทางเดียวกัน (orientation coherence สูง)
+    "finger_min_ridge_fraction": 0.5,
+}
+
+_DARK_LEVEL = 20
+_RIDGE_BLOCK = 15
+_RIDGE_MIN_COHERENCE = 0.45
+_RIDGE_MIN_ENERGY = 2000.0
+# สัดส่วนของ gradient เฉลี่ยต่อพลังงาน gradient: เส้นลายนิ้วมือ gradient กลับทิศไปมา (ค่าต่ำ)
+# ส่วนภาพที่ไล่ระดับสีเรียบ ๆ gradient ไปทางเดียว (ค่าสูง) แม้ coherence จะสูงเหมือนกัน
+_RIDGE_MAX_RAMP = 0.3
+
+
+def sharpness(gray, mask=None):
+    laplacian = cv2.Laplacian(gray, cv2.CV_32F)
+    if mask is None:
+        return float(laplacian.var())
+    values = laplacian[mask > 0]
+    return float(values.var()) if values.size else 0.0
+
+
+def exposure(gray, mask=None):
+    """คืนค่า (ความสว่างเฉลี่ย, สัดส่วน pixel ที่สว่างล้น) ภายใน mask"""
+    values = gray[mask > 0] if mask is not None else gray.ravel()
+    if not values.size:
+        return 0.0, 0.0
+    return float(values.mean()), float(np.count_nonzero(values >= 250) / values.size)
+
+
+def fundus_shape(gray):
+    """
+    คืนค่า (mask ของวงจอประสาทตา (ย่อขอบเข้า), สัดส่วนพื้นที่สว่าง, จำนวนมุมที่มืด, fill ของวงกลมที่ล้อมรอบ)
+    """
+    _, mask = cv2.threshold(cv2.GaussianBlur(gray, (5, 5), 0), _DARK_LEVEL, 255, cv2.THRESH_BINARY)
+    height, width = gray.shape
+    patch = max(2, min(height, width) // 10)
+    corners = (gray[:patch, :patch], gray[:patch, -patch:], gray[-patch:, :patch], gray[-patch:, -patch:])
+    dark_corners = sum(int(corner.mean() < _DARK_LEVEL) for corner in corners)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    fill = 0.0
+    if contours:
+        largest = max(contours, key=cv2.contourArea)
+        _, radius = cv2.minEnclosingCircle(largest)
+        if radius > 0:
+            fill = float(cv2.contourArea(largest) / (np.pi * radius * radius))
+    # ตัดขอบวงออก เพื่อไม่ให้ขอบวงที่คมถูกนับเป็นความคมของภาพ
+    inner = cv2.erode(mask, np.ones((7, 7), np.uint8))
+    return inner, float(np.count_nonzero(mask) / mask.size), dark_corners, fill
+
+
+def ridge_fraction(gray):
+    """สัดส่วน block ที่มี gradient พอและทิศทางสอดคล้องกัน (ลักษณะของเส้นลายนิ้วมือ)"""
+    image = gray.astype(np.float32)
+    gx = cv2.Sobel(image, cv2.CV_32F, 1, 0, ksize=3)
+    gy = cv2.Sobel(image, cv2.CV_32F, 0, 1, ksize=3)
+    gxx = cv2.boxFilter(gx * gx, -1, (_RIDGE_BLOCK, _RIDGE_BLOCK))
+    gyy = cv2.boxFilter(gy * gy, -1, (_RIDGE_BLOCK, _RIDGE_BLOCK))
+    gxy = cv2.boxFilter(gx * gy, -1, (_RIDGE_BLOCK, _RIDGE_BLOCK))
+    mean_gx = cv2.boxFilter(gx, -1, (_RIDGE_BLOCK, _RIDGE_BLOCK))
+    mean_gy = cv2.boxFilter(gy, -1, (_RIDGE_BLOCK, _RIDGE_BLOCK))
+    # ค่ากลางของแต่ละ block
+    step = _RIDGE_BLOCK
+    centers = slice(step // 2, None, step)
+    gxx, gyy, gxy = gxx[centers, centers], gyy[centers, centers], gxy[centers, centers]
+    mean_gx, mean_gy = mean_gx[centers, centers], mean_gy[centers, centers]
+    energy = np.maximum(gxx + gyy, 1e-6)
+    coherence = np.sqrt((gxx - gyy) ** 2 + 4 * gxy ** 2) / energy
+    ramp = (mean_gx ** 2 + mean_gy ** 2) / energy
+    ridges = (energy > _RIDGE_MIN_ENERGY) & (coherence > _RIDGE_MIN_COHERENCE) & (ramp < _RIDGE_MAX_RAMP)
+    return float(ridges.mean()) if ridges.size else 0.0
+
+
+class QualityGate:
+    """
+    ตรวจคุณภาพภาพตา / นิ้วแบบเร็ว (OpenCV บนภาพ grayscale ขนาดเล็ก) ก่อนส่งเข้าโมเดล
+    check(kind, source) คืนค่า dict {"ok", "reasons", "metrics"}
+    reasons: unreadable, blurry, underexposed, overexposed, not_fundus, no_ridges
+    เวลาของแต่ละขั้นอยู่ใน biotrace_stage_seconds (stage quality_*) และจำนวนภาพที่ไม่ผ่านแยกตามเหตุผล
+
+    DEFAULT_THRESHOLDS ปรับจากภาพสังเคราะห์ (benchmarks/synthetic.py) เท่านั้น ต้องปรับกับภาพ fundus / ลายนิ้วมือจริง
+    ในโหมด shadow ก่อนเปิด enforce ไม่งั้นอาจปฏิเสธภาพจริงที่ใช้ได้
+    """
+
+    def __init__(self, mode="off", thresholds=None):
+        if mode not in QUALITY_GATE_MODES:
+            raise ValueError(f"Unknown QUALITY_GATE '{mode}', expected one of {QUALITY_GATE_MODES}")
+        self.mode = mode
+        self.thresholds = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+        self._lock = threading.Lock()
+        self._counts = {}
+        self.seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.mode != "off"
+
+    @property
+    def enforcing(self):
+        return self.mode == "enforce"
+
+    def _timed(self, check, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        STAGE_LATENCY.labels(f"quality_{check}").observe(time.perf_counter() - started)
+        return result
+
+    def _check_eye(self, gray, reasons, metrics):
+        t = self.thresholds
+        mask, foreground, dark_corners, fill = self._timed("shape", fundus_shape, gray)
+        metrics.update(foreground=round(foreground, 3), dark_corners=dark_corners, circle_fill=round(fill, 3))
+        is_fundus = (foreground >= t["eye_min_foreground"] and dark_corners >= t["eye_min_dark_corners"]
+                     and fill >= t["eye_min_circle_fill"])
+        if not is_fundus:
+            reasons.append("not_fundus")
+            mask = None  # วัดทั้งภาพแทน
+        brightness, clipped = self._timed("exposure", exposure, gray, mask)
+        sharp = self._timed("blur", sharpness, gray, mask)
+        metrics.update(brightness=round(brightness, 1), clipped=round(clipped, 3), sharpness=round(sharp, 1))
+        if brightness < t["eye_min_brightness"]:
+            reasons.append("underexposed")
+        elif brightness > t["eye_max_brightness"] or clipped > t["max_clipped_fraction"]:
+            reasons.append("overexposed")
+        if sharp < t["eye_min_sharpness"]:
+            reasons.append("blurry")
+
+    def _check_finger(self, gray, reasons, metrics):
+        t = self.thresholds
+        brightness, clipped = self._timed("exposure", exposure, gray)
+        sharp = self._timed("blur", sharpness, gray)
+        ridges = self._timed("ridges", ridge_fraction, gray)
+        metrics.update(brightness=round(brightness, 1), clipped=round(clipped, 3), sharpness=round(sharp, 1),
+                       ridge_fraction=round(ridges, 3))
+        if brightness < t["finger_min_brightness"]:
+            reasons.append("underexposed")
+        elif brightness > t["finger_max_brightness"] or clipped > t["max_clipped_fraction"]:
+            reasons.append("overexposed")
+        if sharp < t["finger_min_sharpness"]:
+            reasons.append("blurry")
+        if ridges < t["finger_min_ridge_fraction"]:
+            reasons.append("no_ridges")
+
+    def check(self, kind, source):
+        started = time.perf_counter()
+        size = EYE_QUALITY_SIZE if kind == "eye" else FINGER_QUALITY_SIZE
+        reasons, metrics = [], {}
+        gray = self._timed("decode", decode_image, source, cv2.IMREAD_GRAYSCALE, size)
+        if gray is None:
+            reasons.append("unreadable")
+        else:
+            gray = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA)
+            if kind == "eye":
+                self._check_eye(gray, reasons, metrics)
+            else:
+                self._check_finger(gray, reasons, metrics)
+        elapsed = time.perf_counter() - started
+        STAGE_LATENCY.labels("quality").observe(elapsed)
+
+        QUALITY_IMAGES.labels(kind, "rejected" if reasons else "passed").inc()
+        for reason in reasons:
+            QUALITY_REJECTIONS.labels(kind, reason).inc()
+        with self._lock:
+            self.seconds += elapsed
+            key = f"{kind}_{'rejected' if reasons else 'passed'}"
+            self._counts[key] = self._counts.get(key, 0) + 1
+            for reason in reasons:
+                self._counts[f"{kind}_{reason}"] = self._counts.get(f"{kind}_{reason}", 0) + 1
+        return {"ok": not reasons, "reasons": reasons, "metrics": metrics}
+
+    def stats(self):
+        with self._lock:
+            return {"mode": self.mode, "seconds": round(self.seconds, 3), **self._counts}
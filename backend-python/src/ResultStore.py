@@ -0,0 +1,123 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+from zoneinfo import ZoneInfo
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+TIMEZONE = ZoneInfo("Asia/Bangkok")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_user_timestamp ON results (user_email, timestamp, id);
+"""
+
+
+def sortable_timestamp(value):
+    """
+    timestamp ของ record -> "YYYY-MM-DD HH:MM:SS.fff" (เวลาไทย) ที่เรียงแบบ string ได้ถูกต้อง
+    record ของ /upload อยู่ในรูปนี้อยู่แล้ว รูปแบบ ISO อื่น ๆ (เช่นจากข้อมูลเก่า) จะถูกแปลง
+    """
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return str(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(TIMEZONE)
+    return parsed.strftime(TIMESTAMP_FORMAT)[:-3]
+
+
+class ResultStore:
+    """
+    เก็บผลลัพธ์ของ /upload (node "results" ของ Firebase) ใน SQLite พร้อม index (user_email, timestamp)
+    ผลล่าสุดและประวัติของผู้ใช้หนึ่งคนจึงอ่านได้จาก index โดยไม่ต้องโหลดผลของทุกคน
+    id ของแต่ละ record คือ push id เดียวกับใน Firebase เขียนซ้ำ (เช่น import ซ้ำ) จะไม่เกิด record ซ้ำ
+    """
+
+    def __init__(self, path="results.sqlite3"):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        # หนึ่ง connection ต่อ thread ต่อ process (connection ของ sqlite3 ไม่ข้าม fork)
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @staticmethod
+    def _row(key, record):
+        return key, record["userEmail"], sortable_timestamp(record["timestamp"]), json.dumps(record, ensure_ascii=False)
+
+    def add(self, key, record):
+        """บันทึก record (ต้องมี userEmail และ timestamp) คืนค่า True ถ้าเป็น record ใหม่"""
+        cursor = self._connect().execute(
+            "INSERT OR IGNORE INTO results (id, user_email, timestamp, record) VALUES (?, ?, ?, ?)",
+            self._row(key, record),
+        )
+        return cursor.rowcount == 1
+
+    def add_many(self, items):
+        """items: iterable ของ (key, record) บันทึกใน transaction เดียว คืนค่าจำนวน record ใหม่"""
+        connection = self._connect()
+        rows = [self._row(key, record) for key, record in items]
+        connection.execute("BEGIN")
+        try:
+            before = connection.total_changes
+            connection.executemany(
+                "INSERT OR IGNORE INTO results (id, user_email, timestamp, record) VALUES (?, ?, ?, ?)", rows)
+            added = connection.total_changes - before
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return added
+
+    @staticmethod
+    def _decode(key, record):
+        return {"id": key, **json.loads(record)}
+
+    def latest(self, user_email):
+        """ผลล่าสุดของผู้ใช้ หรือ None"""
+        row = self._connect().execute(
+            "SELECT id, record FROM results WHERE user_email = ? ORDER BY timestamp DESC, id DESC LIMIT 1",
+            (user_email,),
+        ).fetchone()
+        return self._decode(*row) if row is not None else None
+
+    def history(self, user_email, limit=20, before=None):
+        """
+        ประวัติของผู้ใช้จากใหม่ไปเก่า ทีละหน้า (keyset pagination ไม่ช้าลงเมื่อเลื่อนไปหน้าท้าย ๆ)
+        before: cursor ที่ได้จากหน้าก่อน คืนค่า (results, next_cursor) next_cursor เป็น None เมื่อหมดแล้ว
+        """
+        query = "SELECT id, record, timestamp FROM results WHERE user_email = ?"
+        params = [user_email]
+        if before:
+            timestamp, _, key = before.rpartition("|")
+            query += " AND (timestamp < ? OR (timestamp = ? AND id < ?))"
+            params += [timestamp, timestamp, key]
+        rows = self._connect().execute(
+            query + " ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit + 1]
+        ).fetchall()
+        next_cursor = f"{rows[limit - 1][2]}|{rows[limit - 1][0]}" if len(rows) > limit else None
+        return [self._decode(key, record) for key, record, _ in rows[:limit]], next_cursor
+
+    def count(self, user_email=None):
+        if user_email is None:
+            return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM results WHERE user_email = ?", (user_email,)).fetchone()[0]
@@ -1,3 +1,10 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
 def calculate_diabetes_risk_from_DR_stage(stage):
     """
     คำนวณความเสี่ยงเบาหวานชนิดที่ 2 จากระยะ DR (ค่าระหว่าง 1-5)
@@ -5,7 +12,7 @@ def calculate_diabetes_risk_from_DR_stage(stage):
     if 1 <= stage <= 5:
         return 20 + (stage - 1) * 15
     else:
-        print("⚠️ ค่า Stage ไม่ถูกต้อง (ต้องเป็น 1 ถึง 5)")
+        logger.warning("⚠️ ค่า Stage ไม่ถูกต้อง (ต้องเป็น 1 ถึง 5)")
         return None
 
 def adjust_risk_by_age_and_gender(base_risk, age, gender):
@@ -33,6 +40,43 @@ def calculate_diabetes_risk_from_eyes(dr_stage_R1, dr_stageL1, age, gender):
         total_risk = adjust_risk_by_age_and_gender(avg_risk, age, gender)
         return total_risk
 
+
+def calculate_diabetes_risk_from_DR_stage_batch(stages):
+    """calculate_diabetes_risk_from_DR_stage แบบ vectorized (NaN ถ้า stage ไม่อยู่ใน 1-5)"""
+    stages = np.asarray(stages, dtype=np.float64)
+    valid = (1 <= stages) & (stages <= 5)
+    return np.where(valid, 20 + (stages - 1) * 15, np.nan)
+
+
+def adjust_risk_by_age_and_gender_batch(base_risk, ages, genders):
+    """adjust_risk_by_age_and_gender แบบ vectorized (gender = 'ชาย' หรือ 'หญิง')"""
+    base_risk = np.asarray(base_risk, dtype=np.float64)
+    ages = np.asarray(ages, dtype=np.float64)
+    genders = np.asarray(genders, dtype=str)
+
+    old_age = ages >= 65
+    middle_age = (45 <= ages) & (ages <= 64)
+    male = genders == 'ชาย'
+    female = genders == 'หญิง'
+    adjustment = np.select(
+        [old_age & male, old_age & female, middle_age & male, middle_age & female],
+        [29.2, 26.0, 18.0, 13.7],
+        default=0.0,
+    )
+    # อายุน้อยกว่า 45 หรือเพศไม่ตรง บวก 0.0 ซึ่งได้ค่าเดิมเหมือน scalar
+    return base_risk + adjustment
+
+
+def calculate_diabetes_risk_from_eyes_batch(dr_stages_R1, dr_stages_L1, ages, genders):
+    """
+    calculate_diabetes_risk_from_eyes แบบ vectorized สำหรับทั้ง cohort
+    คืนค่า array ความเสี่ยง (NaN ถ้า stage ข้างใดข้างหนึ่งไม่ถูกต้อง)
+    """
+    risk_R1 = calculate_diabetes_risk_from_DR_stage_batch(dr_stages_R1)
+    risk_L1 = calculate_diabetes_risk_from_DR_stage_batch(dr_stages_L1)
+    avg_risk = (risk_R1 + risk_L1) / 2
+    return adjust_risk_by_age_and_gender_batch(avg_risk, ages, genders)
+
 # # 🔻 ใส่ค่าที่นี่
 # dr_stage_input_R1 = 4
 # dr_stage_input_L1 = 3
@@ -0,0 +1,83 @@
+import logging
+from typing import Optional
+
+import numpy as np
+
+from src.Fingerprint import calculate_diabetes_risk
+from src.Retinal import calculate_diabetes_risk_from_eyes
+from src.SumDiabetes import manual_weighted_risk
+
+logger = logging.getLogger(__name__)
+
+stage_names_eye = [
+    "No DR - Healthy", # index 0 + 1
+    "Mild DR - Early signs", # index 1 + 1
+    "Moderate DR - Some vision impact", # index 2 + 1
+    "Severe DR - High risk of vision loss", # index 3 + 1
+    "Proliferative DR - Advanced stage, possible blindness" # index 4 + 1
+]
+
+stage_names_finger = [
+        "A",    # index 0
+        "W",  # index 1
+        "L"    # index 2
+]
+
+fingerLabels = [
+    "Right Thumb",
+    "Right Index",
+    "Right Middle",
+    "Right Ring",
+    "Right Little",
+    "Left Thumb",
+    "Left Index",
+    "Left Middle",
+    "Left Ring",
+    "Left Little",
+]
+eyeLabels = ["Left Eye", "Right Eye"]
+
+# รหัสนิ้วที่ calculate_diabetes_risk ใช้ ('R1'-'R5', 'L1'-'L5')
+fingerCodes = dict(zip(fingerLabels, ['R1', 'R2', 'R3', 'R4', 'R5', 'L1', 'L2', 'L3', 'L4', 'L5']))
+
+
+def decode_eye_probs(probs):
+    """แปลง softmax (N, 5) เป็น list ของ (stage 1-5, confidence)"""
+    preds = np.argmax(probs, axis=1)
+    return [(int(pred) + 1, float(prob[pred])) for pred, prob in zip(preds, probs)]
+
+
+def decode_finger_probs(probs):
+    """แปลง softmax (N, 3) เป็น list ของ (A/W/L, confidence) หรือ ValueError ถ้าผลเป็น NaN"""
+    preds = np.argmax(probs, axis=1)
+    return [
+        ValueError("Model prediction contains NaN") if np.isnan(prob).any()
+        else (stage_names_finger[pred], float(prob[pred]))
+        for pred, prob in zip(preds, probs)
+    ]
+
+
+def score_patient(results_eye, results_finger, age, gender):
+    """
+    รวมผลทำนายตาและนิ้วของผู้ป่วยหนึ่งคนเป็นความเสี่ยงรวม (ผลจาก manual_weighted_risk)
+
+    results_eye / results_finger: list ของ dict ที่มี "filename" (label) และ "prediction"
+    """
+    eye_risk = 0
+    finger_risk = 0
+
+    eye_left: Optional[dict] = next((r for r in results_eye if r["filename"] == eyeLabels[0]), None)
+    eye_right: Optional[dict] = next((r for r in results_eye if r["filename"] == eyeLabels[1]), None)
+    if eye_left and eye_right:
+        logger.debug("Left Eye Prediction: %s, Right Eye Prediction: %s", eye_left['prediction'], eye_right['prediction'])
+        eye_risk = calculate_diabetes_risk_from_eyes(eye_left['prediction'], eye_right['prediction'], age, gender)
+
+    fingers = {label: next((r for r in results_finger if r["filename"] == label), None) for label in fingerLabels}
+    if all(fingers.values()):
+        fingers_input = {fingerCodes[label]: result['prediction'] for label, result in fingers.items()}
+        finger_risk = calculate_diabetes_risk(
+            fingers_input, gender, age
+        )
+
+    # Combine results
+    return manual_weighted_risk(eye_risk, finger_risk)
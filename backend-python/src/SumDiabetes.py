@@ -1,3 +1,10 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
 def manual_weighted_risk(retina_risk=None, fingerprint_risk=None, retina_weight=0.8, fingerprint_weight=0.2):
     """
     คำนวณความเสี่ยงโรคเบาหวานแบบถ่วงน้ำหนัก (Retina 80%, Fingerprint 20%)
@@ -10,12 +17,12 @@ def manual_weighted_risk(retina_risk=None, fingerprint_risk=None, retina_weight=
 
     # กรณีมีเฉพาะ Fingerprint
     if retina_risk is None:
-        print("⚠️ ใช้เฉพาะ Fingerprint Risk (ไม่พบ Retina)")
+        logger.debug("⚠️ ใช้เฉพาะ Fingerprint Risk (ไม่พบ Retina)")
         total_risk = fingerprint_risk
 
     # กรณีมีเฉพาะ Retina
     elif fingerprint_risk is None:
-        print("⚠️ ใช้เฉพาะ Retina Risk (ไม่พบ Fingerprint)")
+        logger.debug("⚠️ ใช้เฉพาะ Retina Risk (ไม่พบ Fingerprint)")
         total_risk = retina_risk
 
     # กรณีมีทั้งสอง
@@ -55,6 +62,68 @@ def manual_weighted_risk(retina_risk=None, fingerprint_risk=None, retina_weight=
     }
 
 
+RISK_LEVELS = [
+    # (ขอบล่าง, ขอบบน, รวมขอบบน, level, description)
+    (0, 10, False, 'A', 'ปกติ (Normal)'),
+    (10, 25, False, 'B', 'ความเสี่ยงต่ำ (Low Risk)'),
+    (25, 50, False, 'C', 'ความเสี่ยงปานกลาง (Moderate Risk)'),
+    (50, 70, False, 'D', 'ความเสี่ยงสูง (High Risk)'),
+    (70, 90, False, 'E', 'ความเสี่ยงมาก (Very High Risk)'),
+    (90, 100, True, 'F', 'สงสัยว่าจะเป็นเบาหวาน (Likely Diabetic)'),
+]
+
+
+def round_half_even_batch(values, ndigits=2):
+    """
+    np.round คูณ 10**ndigits ก่อนปัด จึงอาจต่างจาก round() ของ Python ที่ค่าใกล้ .5
+    ค่าที่อยู่ใกล้จุดกึ่งกลางจะคำนวณใหม่ด้วย round() ให้ได้ผลตรงกับ scalar
+    """
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for index in np.flatnonzero(near_tie & np.isfinite(values)):
+        rounded[index] = round(float(values[index]), ndigits)
+    return rounded
+
+
+def manual_weighted_risk_batch(retina_risk, fingerprint_risk, retina_weight=0.8, fingerprint_weight=0.2):
+    """
+    manual_weighted_risk แบบ vectorized สำหรับทั้ง cohort (ไม่ log)
+
+    retina_risk, fingerprint_risk: array ความเสี่ยง ใช้ NaN แทน None
+    คืนค่า dict ของ array: total_risk, level, description
+    แถวที่ scalar คืนข้อความ error จะได้ level เป็น '' และ description เป็นข้อความ error เดียวกัน
+    """
+    retina_risk = np.asarray(retina_risk, dtype=np.float64)
+    fingerprint_risk = np.asarray(fingerprint_risk, dtype=np.float64)
+    retina_missing = np.isnan(retina_risk)
+    fingerprint_missing = np.isnan(fingerprint_risk)
+
+    total_risk = np.where(
+        retina_missing, fingerprint_risk,
+        np.where(fingerprint_missing, retina_risk,
+                 (retina_risk * retina_weight) + (fingerprint_risk * fingerprint_weight)),
+    )
+    total_risk = round_half_even_batch(total_risk, 2)
+
+    conditions = [
+        (low <= total_risk) & ((total_risk <= high) if inclusive else (total_risk < high))
+        for low, high, inclusive, _, _ in RISK_LEVELS
+    ]
+    level = np.select(conditions, [row[3] for row in RISK_LEVELS], default='')
+    description = np.select(
+        conditions, [row[4] for row in RISK_LEVELS],
+        default="❌ Error: ค่าความเสี่ยงไม่อยู่ในช่วง 0–100%",
+    ).astype(object)
+    description[retina_missing & fingerprint_missing] = "❌ Error: ไม่มีข้อมูล Retina และ Fingerprint"
+
+    return {
+        'total_risk': total_risk,
+        'level': level,
+        'description': description
+    }
+
+
 # 🔍 ทดสอบทั้ง 3 เงื่อนไข
 
 # # เงื่อนไขที่ 1: มีทั้ง Retina และ Fingerprint
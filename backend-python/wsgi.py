@@ -0,0 +1,4 @@
+"""WSGI entry point สำหรับ production: gunicorn -c gunicorn.conf.py wsgi:app"""
+from app import app
+
+application = app
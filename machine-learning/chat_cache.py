@@ -0,0 +1,163 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form used as the cache key: NFKC, lower case, single spaces, no trailing punctuation."""
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"\s+", " ", query).strip()
+    return query.rstrip(" ?!.。")
+
+
+def index_version(path: str) -> str:
+    """Changes whenever the FAISS index in `path` is rebuilt (based on file names, sizes and mtimes)."""
+    try:
+        entries = sorted(os.scandir(path), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return "missing"
+    parts = []
+    for entry in entries:
+        if entry.is_file():
+            stat = entry.stat()
+            parts.append(f"{entry.name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+class EmbeddingCache:
+    """Normalized query -> embedding vector, LRU bounded by max_entries, entries expire after ttl seconds."""
+
+    def __init__(self, max_entries=1024, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, vector):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (np.asarray(vector, dtype=np.float32), time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+class AnswerCache:
+    """
+    Semantic answer cache: reuses a previous answer when the cosine similarity between the
+    new query embedding and a cached query embedding is at least `threshold`.
+    Bounded by max_entries (oldest answer evicted first), entries expire after ttl seconds.
+    """
+
+    def __init__(self, max_entries=512, ttl=3600, threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._queries = []
+        self._answers = []
+        self._created = []
+        self._vectors = None  # (N, D) unit vectors, one row per cached answer
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _unit(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _drop(self, index):
+        del self._queries[index], self._answers[index], self._created[index]
+        self._vectors = np.delete(self._vectors, index, axis=0) if self._queries else None
+
+    def _expire(self):
+        now = time.time()
+        while self._created and now - self._created[0] > self.ttl:
+            self._drop(0)
+
+    def lookup(self, vector):
+        """Returns (answer, similarity, cached_query) for the closest cached query above threshold, or None."""
+        with self._lock:
+            self._expire()
+            if self._vectors is None:
+                self.misses += 1
+                return None
+            similarities = self._vectors @ self._unit(vector)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return self._answers[best], float(similarities[best]), self._queries[best]
+
+    def put(self, query, vector, answer):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._expire()
+            row = self._unit(vector)[None, :]
+            self._queries.append(query)
+            self._answers.append(answer)
+            self._created.append(time.time())
+            self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+            while len(self._queries) > self.max_entries:
+                self._drop(0)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._queries, self._answers, self._created = [], [], []
+            self._vectors = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._queries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
@@ -1,17 +1,42 @@
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+
+import httpx  # Async, pooled client for the external Ollama API
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware  # Import CORS Middleware
-import requests  # Use requests to talk to external Ollama API
-from langchain_community.vectorstores import FAISS
 from langchain_community.embeddings import OllamaEmbeddings
+from chat_cache import AnswerCache, EmbeddingCache, index_version, normalize_query
+from faiss_store import load_index
+
+# External Ollama API (set OLLAMA_BASE_URL to your actual Ollama instance)
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")  # If Ollama runs on this host
+# OLLAMA_BASE_URL=http://your-external-ollama-server:11434  # If hosted remotely
+# OLLAMA_BASE_URL=http://host.docker.internal:11434  # If Ollama runs in a Docker container
+OLLAMA_MODEL = "deepseek-r1:1.5b"
+OLLAMA_CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_TIMEOUT = float(os.environ.get("OLLAMA_TIMEOUT", "120"))  # per read, a streamed generation may take longer
+OLLAMA_MAX_CONNECTIONS = int(os.environ.get("OLLAMA_MAX_CONNECTIONS", "32"))
 
-# External Ollama API URL (Replace with your actual Ollama instance URL)
-OLLAMA_API_BASE_URL = "http://localhost:11434/api/generate"  # If Ollama runs in a Docker container
-# OLLAMA_API_BASE_URL = "http://your-external-ollama-server:11434/api/generate"  # If hosted remotely
-# OLLAMA_API_BASE_URL = "http://host.docker.internal:11434/api/generate"  # If Ollama runs in a Docker container
+http_client: httpx.AsyncClient = None
+
+# One connection pool for the whole process, closed on shutdown
+@asynccontextmanager
+async def lifespan(app):
+    global http_client
+    http_client = httpx.AsyncClient(
+        base_url=OLLAMA_BASE_URL,
+        timeout=httpx.Timeout(OLLAMA_TIMEOUT, connect=OLLAMA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS, max_keepalive_connections=OLLAMA_MAX_CONNECTIONS),
+    )
+    yield
+    await http_client.aclose()
 
 # Initialize FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,44 +50,178 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     query: str
 
-# Load FAISS database with allow_dangerous_deserialization=True
-vector_db = FAISS.load_local("faiss_db", OllamaEmbeddings(model="deepseek-r1:1.5b"),
-                             allow_dangerous_deserialization=True)
+FAISS_DB_PATH = "faiss_db"
+embeddings = OllamaEmbeddings(model=OLLAMA_MODEL, base_url=OLLAMA_BASE_URL)
+
+# Load FAISS database (memory-mapped; an index saved by an older train.py is unpickled)
+def load_vector_db():
+    return load_index(FAISS_DB_PATH, embeddings)
+
+vector_db = load_vector_db()
+vector_db_version = index_version(FAISS_DB_PATH)
+
+# Two-level cache for repeated (FAQ-style) questions:
+# normalized query -> embedding, and embedding -> answer of a previous, similar enough query
+embedding_cache = EmbeddingCache(
+    max_entries=int(os.environ.get("EMBEDDING_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("EMBEDDING_CACHE_TTL", "86400")),
+)
+answer_cache = AnswerCache(
+    max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("ANSWER_CACHE_TTL", "3600")),
+    threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.95")),
+)
+cache_invalidations = 0
+
+# Reload the index and drop both caches when train.py has rebuilt faiss_db
+def refresh_vector_db():
+    global vector_db, vector_db_version, cache_invalidations
+    version = index_version(FAISS_DB_PATH)
+    if version == vector_db_version:
+        return
+    try:
+        new_db = load_vector_db()
+    except Exception as e:  # index is still being written, try again on the next request
+        print(f"⚠️ Could not reload {FAISS_DB_PATH}, keeping the current index: {e}")
+        return
+    vector_db = new_db
+    vector_db_version = version
+    embedding_cache.clear()
+    answer_cache.clear()
+    cache_invalidations += 1
 
-# Function to retrieve relevant company data
-def retrieve_context(query: str):
-    results = vector_db.similarity_search(query, k=3)  # Get top 3 results
+# Same endpoint, instruction prefix and (default) options as OllamaEmbeddings.embed_query, so query vectors
+# match the document vectors train.py stored, but non-blocking. The normalized query is only the cache key.
+async def embed_query(query: str):
+    key = normalize_query(query)
+    vector = embedding_cache.get(key)
+    if vector is None:
+        payload = {"model": OLLAMA_MODEL, "prompt": f"{embeddings.query_instruction}{query}", "options": {}}
+        response = await http_client.post("/api/embeddings", json=payload)
+        response.raise_for_status()
+        vector = response.json()["embedding"]
+        embedding_cache.put(key, vector)
+    return vector
+
+# Function to retrieve relevant company data (blocking FAISS search, run in a worker thread)
+def retrieve_context(query_vector):
+    results = vector_db.similarity_search_by_vector(list(map(float, query_vector)), k=3)  # Get top 3 results
     return "\n".join([doc.page_content for doc in results])
 
-# Function to generate chatbot response via External Ollama API
-def generate_response(query: str):
+# Returns (prompt, cached_answer, query_vector); prompt is None when a cached answer can be reused
+async def prepare_prompt(query: str):
+    await asyncio.to_thread(refresh_vector_db)
+    query_vector = await embed_query(query)
+
+    # Reuse the answer of a previous, semantically equivalent question
+    cached = answer_cache.lookup(query_vector)
+    if cached is not None:
+        return None, cached[0], query_vector
+
     # Retrieve relevant company knowledge
-    context = retrieve_context(query)
+    context = await asyncio.to_thread(retrieve_context, query_vector)
 
     # Format prompt
     prompt = f"Context:\n{context}\n\nUser: {query}\nDeepSeek AI:"
+    return prompt, None, query_vector
 
-    # Call External Ollama API
-    payload = {
-        "model": "deepseek-r1:1.5b",
-        "prompt": prompt,
-        "stream": False
-    }
-
+# Function to generate chatbot response via External Ollama API
+async def generate_response(query: str):
     try:
-        response = requests.post(OLLAMA_API_BASE_URL, json=payload)
+        prompt, cached, query_vector = await prepare_prompt(query)
+        if cached is not None:
+            return cached
+
+        # Call External Ollama API
+        payload = {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": False
+        }
+        response = await http_client.post("/api/generate", json=payload)
         response.raise_for_status()
-        return response.json().get("response", "Error: No response from Ollama")
-    except requests.exceptions.RequestException as e:
+        answer = response.json().get("response")
+    except httpx.HTTPError as e:
         return f"Error connecting to Ollama: {e}"
+    if not answer:
+        return "Error: No response from Ollama"
+
+    answer_cache.put(normalize_query(query), query_vector, answer)
+    return answer
+
+def sse(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+# Server-sent events: "token" for each piece of the answer as Ollama produces it, then "done" (or "error")
+async def stream_response(query: str):
+    try:
+        prompt, cached, query_vector = await prepare_prompt(query)
+        if cached is not None:
+            yield sse("token", {"token": cached})
+            yield sse("done", {"response": cached, "cached": True})
+            return
+
+        payload = {
+            "model": OLLAMA_MODEL,
+            "prompt": prompt,
+            "stream": True
+        }
+        parts = []
+        finished = False
+        # Leaving this block (including a client disconnect) closes the upstream stream too
+        async with http_client.stream("POST", "/api/generate", json=payload) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                try:
+                    chunk = json.loads(line)
+                except ValueError:
+                    yield sse("error", {"error": f"Invalid response from Ollama: {line[:200]}"})
+                    return
+                if chunk.get("error"):
+                    yield sse("error", {"error": chunk["error"]})
+                    return
+                token = chunk.get("response", "")
+                if token:
+                    parts.append(token)
+                    yield sse("token", {"token": token})
+                if chunk.get("done"):
+                    finished = True
+                    break
+    except httpx.HTTPError as e:
+        yield sse("error", {"error": f"Error connecting to Ollama: {e}"})
+        return
+
+    answer = "".join(parts)
+    if not finished:
+        # Truncated stream: don't cache a partial answer
+        yield sse("error", {"error": "Ollama stream ended before the answer was complete"})
+        return
+    if answer:
+        answer_cache.put(normalize_query(query), query_vector, answer)
+    yield sse("done", {"response": answer, "cached": False})
 
 # API Route
 @app.post("/chat")
 async def chat(request: ChatRequest):
-    response = generate_response(request.query)
+    response = await generate_response(request.query)
     return {"response": response}
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    return StreamingResponse(stream_response(request.query), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "invalidations": cache_invalidations,
+    }
+
 # Run the FastAPI app
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+
+import faiss
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+# Files written by train.py into the index directory (all rows in the same order):
+#   index.faiss    - faiss.write_index of a flat L2 index, memory-mapped by the chatbot
+#   docstore.json  - {"ids": [...], "texts": [...]}, chunk text for each index row
+#   vectors.npy    - float32 embeddings, reused by the next incremental build
+#   manifest.json  - embedding model, splitter settings and {content hash: row}
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.json"
+VECTORS_FILE = "vectors.npy"
+MANIFEST_FILE = "manifest.json"
+LEGACY_DOCSTORE_FILE = "index.pkl"  # pickle written by FAISS.save_local
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def read_manifest(path: str):
+    """Returns (manifest, vectors) of the previous build, or (None, None) if there is none."""
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        vectors = np.load(os.path.join(path, VECTORS_FILE))
+    except (FileNotFoundError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"⚠️ Ignoring unreadable manifest in {path}: {e}")
+        return None, None
+    if len(vectors) != len(manifest.get("chunks", {})):
+        print(f"⚠️ Ignoring manifest in {path}: {len(vectors)} vectors for {len(manifest['chunks'])} chunks")
+        return None, None
+    return manifest, vectors
+
+
+def _replace(path, name, write):
+    # Write next to the target and rename, so a reader never sees a half-written file
+    tmp_path = os.path.join(path, f".{name}.tmp")
+    write(tmp_path)
+    os.replace(tmp_path, os.path.join(path, name))
+
+
+def save_index(path: str, hashes, texts, vectors, manifest: dict):
+    """Writes the index, docstore, vectors and manifest (manifest last, it marks a complete build)."""
+    os.makedirs(path, exist_ok=True)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+
+    def write_json(payload):
+        def write(tmp_path):
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+        return write
+
+    def write_vectors(tmp_path):
+        with open(tmp_path, "wb") as f:
+            np.save(f, vectors)
+
+    manifest = dict(manifest, dim=int(vectors.shape[1]), chunks={h: row for row, h in enumerate(hashes)})
+    _replace(path, VECTORS_FILE, write_vectors)
+    _replace(path, DOCSTORE_FILE, write_json({"ids": list(hashes), "texts": list(texts)}))
+    _replace(path, INDEX_FILE, lambda tmp_path: faiss.write_index(index, tmp_path))
+    _replace(path, MANIFEST_FILE, write_json(manifest))
+
+    # The pickle docstore of an older build no longer matches index.faiss
+    legacy = os.path.join(path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy):
+        os.remove(legacy)
+
+
+def load_index(path: str, embeddings) -> FAISS:
+    """
+    Loads a train.py build without unpickling anything: index.faiss is memory-mapped
+    (pages are shared between processes and read on demand) and the docstore is plain JSON.
+    Falls back to FAISS.load_local for an index saved by an older train.py.
+    """
+    docstore_path = os.path.join(path, DOCSTORE_FILE)
+    if not os.path.exists(docstore_path):
+        return FAISS.load_local(path, embeddings, allow_dangerous_deserialization=True)
+
+    with open(docstore_path, encoding="utf-8") as f:
+        docstore = json.load(f)
+    index_path = os.path.join(path, INDEX_FILE)
+    try:
+        index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+    except RuntimeError:  # index types that cannot be memory-mapped
+        index = faiss.read_index(index_path)
+    ids, texts = docstore["ids"], docstore["texts"]
+    if index.ntotal != len(ids):
+        raise ValueError(f"{index_path} has {index.ntotal} vectors but the docstore has {len(ids)} chunks")
+
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore({doc_id: Document(id=doc_id, page_content=text) for doc_id, text in zip(ids, texts)}),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
@@ -0,0 +1,113 @@
+"""
+Minimal stand-in for the Ollama HTTP API, for exercising chatbot.py / train.py without a model.
+
+    python fake_ollama.py --port 11434 --token-delay 0.05
+    OLLAMA_BASE_URL=http://localhost:11434 uvicorn chatbot:app --port 8000
+
+Embeddings are deterministic bag-of-words vectors (same words -> same vector), so FAISS search
+and the semantic answer cache behave sensibly. /api/generate answers with a fixed sentence,
+streamed as NDJSON chunks (one word per chunk, --token-delay seconds apart) unless "stream" is false.
+GET /stats returns how many embedding / generate calls were served.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ANSWER = ["Depaspace", " helps", " developers", " find", " jobs", " and", " projects."]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    dim = 1536  # Must match the dimension of the vectors stored in faiss_db
+    token_delay = 0.05
+    calls = {"embed": 0, "generate": 0}
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def count(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+
+    def embed(self, text):
+        vector = np.zeros(self.dim)
+        for word in text.lower().split():
+            seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+            vector += np.random.default_rng(seed).normal(size=self.dim)
+        return vector.tolist()
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self.send_json({"models": [{"name": "deepseek-r1:1.5b"}]})
+        elif self.path == "/stats":
+            with self.lock:
+                self.send_json(dict(self.calls))
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/embeddings":
+            self.count("embed")
+            self.send_json({"embedding": self.embed(request["prompt"])})
+        elif self.path == "/api/embed":
+            self.count("embed")
+            inputs = request["input"]
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            self.send_json({"model": request.get("model"), "embeddings": [self.embed(text) for text in inputs]})
+        elif self.path == "/api/generate":
+            self.count("generate")
+            if not request.get("stream", True):
+                time.sleep(self.token_delay * len(ANSWER))
+                self.send_json({"model": request.get("model"), "response": "".join(ANSWER), "done": True})
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(ANSWER + [""]):
+                done = i == len(ANSWER)
+                self.send_chunk((json.dumps({"response": token, "done": done}) + "\n").encode())
+                if not done:
+                    time.sleep(self.token_delay)
+            self.wfile.write(b"0\r\n\r\n")
+        else:
+            self.send_json({"error": "not found"}, 404)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--dim", type=int, default=FakeOllamaHandler.dim, help="Embedding dimension")
+    parser.add_argument("--token-delay", type=float, default=FakeOllamaHandler.token_delay,
+                        help="Seconds between streamed tokens")
+    args = parser.parse_args()
+
+    FakeOllamaHandler.dim = args.dim
+    FakeOllamaHandler.token_delay = args.token_delay
+    server = ThreadingHTTPServer((args.host, args.port), FakeOllamaHandler)
+    print(f"🦙 Fake Ollama listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,30 @@
-import faiss
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
 import numpy as np
-from langchain_community.embeddings import OllamaEmbeddings
-from langchain_community.vectorstores import FAISS
 from langchain.text_splitter import CharacterTextSplitter
-from langchain.docstore.document import Document
+from langchain_community.embeddings import OllamaEmbeddings
+from faiss_store import chunk_hash, read_manifest, save_index
+
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434")
+OLLAMA_MODEL = "deepseek-r1:1.5b"
+FAISS_DB_PATH = "faiss_db"
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 20
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))  # /api/embeddings requests in flight
+# Same document prefix OllamaEmbeddings.embed_documents uses (the chatbot adds the matching "query: " prefix)
+EMBED_INSTRUCTION = OllamaEmbeddings(model=OLLAMA_MODEL).embed_instruction
+
+parser = argparse.ArgumentParser(description="Build (or incrementally update) the FAISS index of company knowledge")
+parser.add_argument("--file", default="company_data.txt")
+parser.add_argument("--output", default=FAISS_DB_PATH)
+parser.add_argument("--rebuild", action="store_true", help="Re-embed every chunk, ignoring the previous build")
+args = parser.parse_args()
 
 # Step 1: Load Company Knowledge
-file_path = "company_data.txt"  # Ensure this file exists in the same directory
+file_path = args.file  # Ensure this file exists in the same directory
 
 try:
     with open(file_path, "r", encoding="utf-8") as f:
@@ -15,14 +33,53 @@ except FileNotFoundError:
     print(f"❌ Error: File '{file_path}' not found.")
     exit(1)
 
-# Step 2: Split Text into Chunks for Better Retrieval
-splitter = CharacterTextSplitter(chunk_size=200, chunk_overlap=20)
-docs = [Document(page_content=chunk) for chunk in splitter.split_text(company_data)]
+# Step 2: Split Text into Chunks for Better Retrieval (identical chunks are stored once)
+splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+chunks = {}
+for chunk in splitter.split_text(company_data):
+    chunks.setdefault(chunk_hash(chunk), chunk)
+hashes = list(chunks)
+if not hashes:
+    print(f"❌ Error: File '{file_path}' is empty.")
+    exit(1)
+
+# Step 3: Reuse embeddings of unchanged chunks from the previous build
+settings = {"model": OLLAMA_MODEL, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+            "endpoint": "/api/embeddings", "instruction": EMBED_INSTRUCTION}
+manifest, old_vectors = (None, None) if args.rebuild else read_manifest(args.output)
+if manifest is not None and any(manifest.get(key) != value for key, value in settings.items()):
+    print("ℹ️ Embedding model or splitter settings changed, re-embedding everything")
+    manifest = None
+known = manifest["chunks"] if manifest is not None else {}
+missing = [h for h in hashes if h not in known]
+removed = len(set(known) - set(hashes))
+print(f"📄 {len(hashes)} chunks: {len(hashes) - len(missing)} unchanged, {len(missing)} to embed, {removed} removed")
+
+# Step 4: Convert new / changed chunks to embeddings, several requests in flight
+# (same endpoint and unnormalized vectors as the chatbot's queries, so the L2 ranking is the baseline's)
+def embed_chunk(client, h):
+    payload = {"model": OLLAMA_MODEL, "prompt": f"{EMBED_INSTRUCTION}{chunks[h]}", "options": {}}
+    response = client.post("/api/embeddings", json=payload)
+    response.raise_for_status()
+    return response.json()["embedding"]
+
+new_vectors = {}
+if missing:
+    try:
+        with httpx.Client(base_url=OLLAMA_BASE_URL, timeout=httpx.Timeout(300, connect=5)) as client, \
+                ThreadPoolExecutor(max_workers=EMBED_CONCURRENCY) as executor:
+            new_vectors.update(zip(missing, executor.map(lambda h: embed_chunk(client, h), missing)))
+    except httpx.HTTPError as e:
+        print(f"❌ Error: Embedding failed, {FAISS_DB_PATH} left unchanged: {e}")
+        exit(1)
+
+if not missing and not removed and manifest is not None:
+    print("✅ FAISS index is already up to date")
+    exit(0)
 
-# Step 3: Convert Text to Embeddings
-embeddings = OllamaEmbeddings(model="deepseek-r1:1.5b")
-vector_db = FAISS.from_documents(docs, embeddings)
+vectors = np.array(
+    [new_vectors[h] if h in new_vectors else old_vectors[known[h]] for h in hashes], dtype=np.float32)
 
-# Step 4: Save FAISS database
-vector_db.save_local("faiss_db")
-print("✅ Company knowledge stored successfully in FAISS!")
\ No newline at end of file
+# Step 5: Save FAISS database (memory-mappable index + JSON docstore, no pickle)
+save_index(args.output, hashes, [chunks[h] for h in hashes], vectors, settings)
+print("✅ Company knowledge stored successfully in FAISS!")